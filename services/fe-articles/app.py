@@ -3,40 +3,71 @@
 import os
 import re
 import json
-import threading
+import time
+import random
+import hashlib
+import sqlite3
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import atexit  # Для обработки выхода/краша
+from contextlib import asynccontextmanager
 import traceback  # Для стека ошибок
 
-from flask import Flask, request, render_template_string
-from bs4 import BeautifulSoup, MarkupResemblesLocatorWarning
-from urllib.parse import urljoin
-import pandas as pd
+STARTUP_STARTED = time.perf_counter()  # Отсюда считаются фазы старта (см. startup_phase)
+
+from flask import Flask, request, render_template_string, redirect, jsonify, Response
+from markupsafe import Markup, escape
+from urllib.parse import urlencode, urlparse
 
 from urllib3.exceptions import InsecureRequestWarning
+import httpx
 import warnings
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.events import EVENT_JOB_ERROR  # Для listener ошибок
-from telegram import Bot
-from telegram.constants import ParseMode
-from telegram.ext import ApplicationBuilder
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_SUBMITTED  # Для listener ошибок и задержки запуска
 
 import logging
 from logging.handlers import TimedRotatingFileHandler
 
-# Async Playwright импорт
-from playwright.async_api import async_playwright
-
-# Fake UA (если не установлен, удалите или pip install)
-from fake_useragent import UserAgent
+# Пул браузеров Playwright (один на процесс)
+from browser_pool import BrowserPool, process_tree_rss_mb
+from request_filter import RequestFilter, split_list
+from extraction import get_extractor
+from article_store import ArticleStore, decode_cursor, HIGHLIGHT_START, HIGHLIGHT_END
+from dedup import SeenSet, canonicalize_url, url_fingerprint
+from telegram_queue import TelegramQueue, split_message
+from preview_jobs import PreviewJobs
+from page_cache import PageCache
+from crawl_workers import CrawlWorkerPool
+from config_store import JsonFile
+from resource_health import CircuitBreaker
+import metrics
+import tracing
+
+from user_agents import random_user_agent
+
+# Тяжёлые модули (Playwright, python-telegram-bot, Hypercorn, bs4) импортируются при первом
+# использовании: воркеры обхода и бенчмарки импортируют app.py, но бот и веб-сервер им не нужны
+
+# ====================== СТАРТ ======================
+startup_phases = []  # [(фаза, секунды)] — в лог при старте и в метрику fe_articles_startup_seconds
+_startup_mark = STARTUP_STARTED
+
+def startup_phase(name):
+    """Закрывает фазу старта: её длительность — время с конца предыдущей."""
+    global _startup_mark
+    now = time.perf_counter()
+    startup_phases.append((name, now - _startup_mark))
+    _startup_mark = now
+
+startup_phase('imports')
 
 # ====================== LOGGING ======================
 def setup_logging():
     os.makedirs('logs', exist_ok=True)
 
-    logger = logging.getLogger(__name__)
+    # Общий логгер сервиса — модули рядом пишут в дочерние 'fe_articles.*'
+    logger = logging.getLogger('fe_articles')
     logger.setLevel(logging.INFO)
 
     formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
@@ -52,7 +83,6 @@ def setup_logging():
     logger.addHandler(handler)
 
     logging.captureWarnings(True)
-    warnings.filterwarnings("always", category=MarkupResemblesLocatorWarning)
     warnings.filterwarnings(
         "ignore",
         message=".*strip_cdata.*",
@@ -72,11 +102,121 @@ TELEGRAM_TOKEN = os.getenv("TG_BOT_TOKEN")
 TELEGRAM_CHANNEL_ID = int(os.getenv("TG_CHAT_ID"))
 PARSER_INTERVAL_MINUTES = int(os.getenv("PARSER_INTERVAL_MINUTES", 10))
 
+# Расписание: у каждого ресурса своя задача с интервалом по частоте изменений (0 = один общий цикл)
+ADAPTIVE_SCHEDULING = os.getenv("ADAPTIVE_SCHEDULING", "1") == "1"
+SCHEDULE_MIN_INTERVAL_MINUTES = int(os.getenv("SCHEDULE_MIN_INTERVAL_MINUTES", PARSER_INTERVAL_MINUTES))
+SCHEDULE_MAX_INTERVAL_MINUTES = int(os.getenv("SCHEDULE_MAX_INTERVAL_MINUTES", 360))
+SCHEDULE_JITTER = float(os.getenv("SCHEDULE_JITTER", 0.1))  # ±10% к интервалу, чтобы разнести нагрузку
+SCHEDULE_EMA_ALPHA = 0.3  # Вес нового промежутка между изменениями
+
+# Параллельный обход ресурсов
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", 4))  # Сколько ресурсов парсим одновременно (1 = по очереди)
+CRAWL_PER_HOST_LIMIT = int(os.getenv("CRAWL_PER_HOST_LIMIT", 1))  # Не больше N запросов к одному домену
+# Бюджет цикла: обход обрывается раньше интервала, чтобы дедуп и отправка успели до следующего запуска (0 = без лимита)
+CRAWL_CYCLE_DEADLINE_SECONDS = int(os.getenv("CRAWL_CYCLE_DEADLINE_SECONDS", PARSER_INTERVAL_MINUTES * 60 * 0.8))
+
+# Здоровье ресурсов: после N ошибок подряд ресурс отключается, пауза до следующей попытки растёт вдвое
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 3))
+CIRCUIT_BASE_DELAY_MINUTES = float(os.getenv("CIRCUIT_BASE_DELAY_MINUTES", PARSER_INTERVAL_MINUTES))
+CIRCUIT_MAX_DELAY_MINUTES = float(os.getenv("CIRCUIT_MAX_DELAY_MINUTES", 360))
+
+# Потоковый режим общего цикла (при ADAPTIVE_SCHEDULING=0): каждый ресурс публикуется, как только обработан
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "0") == "1"
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 4))  # Размер очередей между стадиями
+PIPELINE_EXTRACT_WORKERS = int(os.getenv("PIPELINE_EXTRACT_WORKERS", 2))  # Потоков для извлечения из HTML
+PIPELINE_SUMMARY = os.getenv("PIPELINE_SUMMARY", "1") == "1"  # Короткая сводка в конце цикла
+
+# Кэш загруженных страниц на диске (общий для планировщика, предпросмотра и /debug), 0 = выключен
+PAGE_CACHE_DIR = 'data/page_cache'
+PAGE_CACHE_TTL_SECONDS = int(os.getenv("PAGE_CACHE_TTL_SECONDS", 300))
+PAGE_CACHE_MAX_MB = int(os.getenv("PAGE_CACHE_MAX_MB", 200))
+
+# Предпросмотр «Спарсить сейчас»: сколько секунд отдавать готовый результат для того же определения ресурса
+PREVIEW_CACHE_SECONDS = int(os.getenv("PREVIEW_CACHE_SECONDS", 120))
+
+# Лента статей для внешних потребителей (/api/articles)
+FEED_PAGE_SIZE = int(os.getenv("FEED_PAGE_SIZE", 100))
+FEED_MAX_PAGE_SIZE = int(os.getenv("FEED_MAX_PAGE_SIZE", 1000))
+FEED_STREAM_BATCH = 500  # NDJSON читается из базы порциями, блокировка базы не держится на весь ответ
+
+# Поиск по собранным статьям (/search, /api/search)
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 50))
+SEARCH_MAX_PAGE_SIZE = 200
+
+# Трассировка этапов парсинга (JSON Lines в logs/trace.jsonl) и профилирование одного ресурса по имени
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+TRACE_FILE = 'logs/trace.jsonl'
+PROFILE_RESOURCE = os.getenv("PROFILE_RESOURCE", "")  # Пусто = не профилировать
+PROFILE_ENGINE = os.getenv("PROFILE_ENGINE", "cprofile")  # cprofile или pyinstrument
+
+# Пул браузеров
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 1))
+BROWSER_CONTEXTS_PER_BROWSER = int(os.getenv("BROWSER_CONTEXTS_PER_BROWSER", 2))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", 50))  # Пересоздать браузер после N страниц
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", 1024))  # ...или при превышении памяти
+BROWSER_PRESTART = os.getenv("BROWSER_PRESTART", "0") == "1"  # 1 = поднять Chromium при старте, 0 = при первой странице
+
+# Обход в процессах-воркерах: у каждого свой браузер (0 = всё в этом процессе)
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", 0))
+CRAWL_WORKER_SLOTS = int(os.getenv("CRAWL_WORKER_SLOTS", BROWSER_CONTEXTS_PER_BROWSER))  # Ресурсов одновременно на воркер
+CRAWL_WORKER_MAX_TASKS = int(os.getenv("CRAWL_WORKER_MAX_TASKS", 200))  # Перезапустить воркер после N ресурсов
+CRAWL_WORKER_TASK_TIMEOUT_SECONDS = int(os.getenv("CRAWL_WORKER_TASK_TIMEOUT_SECONDS", 300))  # Зависший воркер убивается
+
+# Загрузка в браузере: таймаут одного goto, повторы с паузой 2, 4, 8… сек и общий бюджет ресурса
+BROWSER_GOTO_TIMEOUT_SECONDS = float(os.getenv("BROWSER_GOTO_TIMEOUT_SECONDS", 45))
+BROWSER_GOTO_ATTEMPTS = int(os.getenv("BROWSER_GOTO_ATTEMPTS", 3))
+BROWSER_RETRY_BACKOFF_SECONDS = float(os.getenv("BROWSER_RETRY_BACKOFF_SECONDS", 2))
+BROWSER_BUDGET_SECONDS = float(os.getenv("BROWSER_BUDGET_SECONDS", 120))  # goto + повторы + ожидание; для ресурса — browser_budget_seconds
+
+# Ожидание после domcontentloaded (для ресурса — поле wait_policy):
+#   selector    — пока item_selector не найдёт wait_min_items элементов;
+#   networkidle — пока не затихнет сеть;
+#   delay       — фиксированная пауза (как раньше).
+# Первые два ждут не дольше BROWSER_WAIT_TIMEOUT_SECONDS (поле wait_timeout_seconds) и не считаются ошибкой по таймауту
+BROWSER_WAIT_POLICY = os.getenv("BROWSER_WAIT_POLICY", "selector")
+BROWSER_WAIT_TIMEOUT_SECONDS = float(os.getenv("BROWSER_WAIT_TIMEOUT_SECONDS", 10))
+BROWSER_WAIT_DELAY_SECONDS = float(os.getenv("BROWSER_WAIT_DELAY_SECONDS", 3))  # Для delay; поле wait_delay_seconds
+
+# Блокировка лишних запросов при рендере (типы Playwright и подстроки URL, через запятую)
+BLOCK_RESOURCE_TYPES = split_list(os.getenv("BLOCK_RESOURCE_TYPES", "image,media,font"))
+BLOCK_URL_PATTERNS = split_list(os.getenv(
+    "BLOCK_URL_PATTERNS",
+    "google-analytics.com,googletagmanager.com,doubleclick.net,googlesyndication.com,adservice.google,"
+    "mc.yandex.ru,an.yandex.ru,top-fwz1.mail.ru,facebook.net,connect.facebook.net,hotjar.com,vk.com/rtrg"
+))
+
+# Извлекать статьи внутри страницы (только {title, href}) вместо page.content() + BeautifulSoup.
+# Можно переопределить для ресурса полем extract_in_browser
+EXTRACT_IN_BROWSER = os.getenv("EXTRACT_IN_BROWSER", "1") == "1"
+
+# Движок извлечения из HTML: stream (разбор до первых limit статей), lxml (весь документ) или soup (эталон).
+# Для ресурса — поле extract_engine
+EXTRACT_ENGINE = os.getenv("EXTRACT_ENGINE", "stream")
+MAX_DOCUMENT_KB = int(os.getenv("MAX_DOCUMENT_KB", 5120))  # Дальше страницу не качаем и не разбираем (0 = без лимита)
+
+# HTTP-клиент (быстрый путь без браузера)
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", 30))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 10))  # Сколько соединений держим открытыми между циклами
+
+# Очередь отправки в Telegram (лимиты чата: ~1 сообщение в секунду, ~20 в минуту для групп/каналов)
+TG_RATE_PER_MINUTE = int(os.getenv("TG_RATE_PER_MINUTE", 20))
+TG_MIN_INTERVAL_SECONDS = float(os.getenv("TG_MIN_INTERVAL_SECONDS", 1.0))
+TG_BATCH_SECONDS = float(os.getenv("TG_BATCH_SECONDS", 2.0))  # Склеивать сообщения, пришедшие за это время
+
 DATA_FILE = 'data/resources.json'
-LAST_RESULTS_FILE = 'data/last_results.json'
+LAST_RESULTS_FILE = 'data/last_results.json'  # Старый формат, читается один раз при миграции в SQLite
+ARTICLES_DB_FILE = 'data/articles.db'
+ARTICLE_RETENTION_DAYS = int(os.getenv("ARTICLE_RETENTION_DAYS", 0))  # 0 = хранить всё
+
+# Дедуп: сколько последних отпечатков URL держать в памяти и Bloom-фильтр перед ними (бит на URL, 0 = выкл)
+SEEN_SET_CAPACITY = int(os.getenv("SEEN_SET_CAPACITY", 200000))
+SEEN_SET_BLOOM_BITS = int(os.getenv("SEEN_SET_BLOOM_BITS", 10))
+CANONICAL_VERSION = 2  # Поднять при изменении правил канонизации — база пересчитает canonical_url
+RESOURCE_STATE_FILE = 'data/resource_state.json'  # ETag / Last-Modified / хэш HTML по ресурсам
+
+tracing.setup(TRACE_FILE, enabled=TRACE_ENABLED, profile_resource=PROFILE_RESOURCE, profile_engine=PROFILE_ENGINE)
 
-# Lock для файлов
-file_lock = threading.Lock()
 
 # ====================== ИНИЦИАЛИЗАЦИЯ БОТА ======================
 bot_app = None
@@ -84,6 +224,7 @@ bot = None
 
 async def init_bot():
     global bot_app, bot
+    from telegram.ext import ApplicationBuilder
     try:
         logger.info("Инициализация Telegram бота...")
         bot_app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
@@ -95,115 +236,395 @@ async def init_bot():
         raise
 
 # ====================== ОТПРАВКА В ТГ ======================
-async def send_telegram_message(text: str):
+async def deliver_telegram_message(text: str):
+    started = time.perf_counter()
     try:
         await bot.send_message(
             chat_id=TELEGRAM_CHANNEL_ID,
             text=text,
-            parse_mode=ParseMode.HTML,
+            parse_mode='HTML',
             disable_web_page_preview=True
         )
-        logger.info("Сообщение успешно отправлено в Telegram канал")
     except Exception as e:
-        logger.error(f"НЕ УДАЛОСЬ отправить сообщение в Telegram: {e}")
+        metrics.TELEGRAM_SEND_FAILURES.labels(type(e).__name__).inc()
+        raise
+    finally:
+        metrics.TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - started)
+    logger.info("Сообщение успешно отправлено в Telegram канал")
+
+telegram_queue = TelegramQueue(
+    deliver_telegram_message,
+    per_minute=TG_RATE_PER_MINUTE,
+    min_interval=TG_MIN_INTERVAL_SECONDS,
+    batch_seconds=TG_BATCH_SECONDS
+)
+
+async def send_telegram_message(text: str):
+    """Ставит сообщение в очередь и сразу возвращается; без очереди (старт, выход) шлёт сам по кускам."""
+    if telegram_queue.running and asyncio.get_running_loop() is main_loop:
+        telegram_queue.put(text)
+        return
+    for chunk in split_message(text):
+        try:
+            await deliver_telegram_message(chunk)
+        except Exception as e:
+            logger.error(f"НЕ УДАЛОСЬ отправить сообщение в Telegram: {e}")
 
 async def send_error_to_telegram(error_msg: str):
     await send_telegram_message(f"<b>🚨 Ошибка в парсере!</b>\n\n{error_msg}\n\nПроверьте логи для деталей.")
 
 # ====================== ФАЙЛЫ ======================
+def normalize_resources(data):
+    for res in data:
+        if 'paused' not in res:
+            res['paused'] = False
+        if 'fetch_mode' not in res:
+            res['fetch_mode'] = 'auto'
+    logger.info(f"Загружено {len(data)} ресурсов из {DATA_FILE}")
+    return data
+
+# Ресурсы в памяти: файл перечитывается, только если его поменяли мимо интерфейса.
+# Каждый вызывающий получает свои копии словарей ресурсов — парсинг дописывает в них resolved_fetch_mode.
+resources_file = JsonFile(DATA_FILE, default=list, normalize=normalize_resources,
+                          clone=lambda data: [dict(r) for r in data], label='resources.json')
+resource_state_file = JsonFile(RESOURCE_STATE_FILE, label='resource_state.json')
+
 def load_resources():
-    with file_lock:
-        try:
-            if os.path.exists(DATA_FILE):
-                with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    for res in data:
-                        if 'paused' not in res:
-                            res['paused'] = False
-                    logger.info(f"Загружено {len(data)} ресурсов из {DATA_FILE}")
-                    return data
-        except Exception as e:
-            logger.error(f"Ошибка загрузки ресурсов: {e}")
-    return []
+    return resources_file.load()
 
 def save_resources(resources):
-    with file_lock:
-        try:
-            os.makedirs('data', exist_ok=True)
-            with open(DATA_FILE, 'w', encoding='utf-8') as f:
-                json.dump(resources, f, ensure_ascii=False, indent=2)
-            logger.info(f"Сохранено {len(resources)} ресурсов")
-        except Exception as e:
-            logger.error(f"Ошибка сохранения ресурсов: {e}")
+    try:
+        resources_file.save(resources)
+        logger.info(f"Сохранено {len(resources)} ресурсов")
+    except Exception as e:
+        logger.error(f"Ошибка сохранения ресурсов: {e}")
+
+def remember_fetch_modes(modes):
+    """Запоминает сработавший режим загрузки ({имя ресурса: 'http'|'browser'}) в resources.json."""
+    if not modes:
+        return
+    current = load_resources()  # Перечитываем: за время цикла ресурсы могли поменять в UI
+    changed = False
+    for res in current:
+        mode = modes.get(res['name'])
+        if mode and res.get('resolved_fetch_mode') != mode:
+            res['resolved_fetch_mode'] = mode
+            changed = True
+    if changed:
+        save_resources(current)
+        logger.info(f"Запомнены режимы загрузки: {modes}")
+
+async def save_resource_state(state):
+    """Снимок делается сразу (state меняется на этом же loop), запись — в потоке."""
+    try:
+        await resource_state_file.save_async(state)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения состояния ресурсов: {e}")
 
-def load_last_results():
-    with file_lock:
-        try:
-            if os.path.exists(LAST_RESULTS_FILE):
-                with open(LAST_RESULTS_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    logger.info(f"Загружены последние результаты ({len(data)} источников)")
-                    return data
-        except Exception as e:
-            logger.error(f"Ошибка загрузки last_results: {e}")
-    return {}
+resources = load_resources()
+resource_state = resource_state_file.load()  # Живёт в памяти главного loop, на диск — после каждого обхода
+circuit_breaker = CircuitBreaker(
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    base_delay=CIRCUIT_BASE_DELAY_MINUTES * 60,
+    max_delay=CIRCUIT_MAX_DELAY_MINUTES * 60,
+    jitter=SCHEDULE_JITTER
+)
 
-def save_last_results(results):
-    with file_lock:
-        try:
-            os.makedirs('data', exist_ok=True)
-            with open(LAST_RESULTS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
-            logger.info("last_results сохранены")
-        except Exception as e:
-            logger.error(f"Ошибка сохранения last_results: {e}")
+# ====================== БАЗА СТАТЕЙ И ДЕДУП ======================
+def canonical_url_for(source, url):
+    """
+    Канонический URL по правилам ресурса (поле url_canonical в resources.json) — для пересчёта
+    и миграции базы; при дедупе ключ считается один раз в dedup_new_articles.
+    """
+    options = next((r.get('url_canonical') for r in resources if r['name'] == source), None)
+    return canonicalize_url(url, options)
+
+article_store = ArticleStore(ARTICLES_DB_FILE, retention_days=ARTICLE_RETENTION_DAYS, canonicalize=canonical_url_for)
+seen_set = SeenSet(SEEN_SET_CAPACITY, bloom_bits_per_item=SEEN_SET_BLOOM_BITS)
+
+def warm_seen_set():
+    """Заполняет SeenSet отпечатками последних статей из базы (при старте)."""
+    for source, canonical in article_store.recent_keys(SEEN_SET_CAPACITY):
+        seen_set.add(url_fingerprint(source, canonical))
+    logger.info(f"SeenSet: {len(seen_set)} отпечатков, {seen_set.memory_bytes() // 1024} КБ")
+
+def dedup_new_articles(resource, items):
+    """
+    Новые статьи ресурса. Уже виденные отсекаются по отпечатку в памяти без обращения к базе,
+    остальные вставляются в SQLite — уникальный индекс окончательно решает, что новое.
+    """
+    name = resource['name']
+    options = resource.get('url_canonical')
+    candidates = []
+    canonical_urls = []
+    fingerprints = []
+    for item in items:
+        canonical = canonicalize_url(item['url'], options)
+        fp = url_fingerprint(name, canonical)
+        if fp not in seen_set:
+            candidates.append(item)
+            canonical_urls.append(canonical)
+            fingerprints.append(fp)
+    new_items = article_store.insert_new(name, candidates, canonical_urls=canonical_urls)
+    for fp in fingerprints:
+        seen_set.add(fp)
+    return new_items
+
+# ====================== ПУЛ БРАУЗЕРОВ ======================
+browser_pool = BrowserPool(
+    size=BROWSER_POOL_SIZE,
+    contexts_per_browser=BROWSER_CONTEXTS_PER_BROWSER,
+    max_pages=BROWSER_MAX_PAGES,
+    max_rss_mb=BROWSER_MAX_RSS_MB,
+    on_launch=lambda seconds: metrics.BROWSER_LAUNCH_SECONDS.observe(seconds)  # В воркере метрика подменяется
+)
 
-resources = load_resources()
-last_results = load_last_results()
+page_cache = PageCache(PAGE_CACHE_DIR, ttl=PAGE_CACHE_TTL_SECONDS, max_bytes=PAGE_CACHE_MAX_MB * 1024 * 1024)
 
-# ====================== ПАРСИНГ ======================
-async def parse_resource(resource, limit=20):
-    try:
-        logger.info(f"Парсим: {resource['name']} → {resource['url']}")
+# Event loop, на котором живут пул, бот и планировщик (заполняется в main)
+main_loop = None
 
-        # Фиксированные headers (как в п1)
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Referer': 'https://www.google.com/',
-            'Sec-CH-UA': '"Not A;Brand";v="99", "Chromium";v="121", "Google Chrome";v="121"',
-            'Sec-CH-UA-Mobile': '?0',
-            'Sec-CH-UA-Platform': '"Windows"'
-        }
-        logger.info(f"Используемые заголовки: {headers}")  # Для отладки
-
-        async with async_playwright() as p:
-            # Запуск с маскировкой (п2)
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-blink-features=AutomationControlled',  # Скрываем автоматизацию
-                    '--disable-infobars',  # Убираем панель "Chrome управляется"
-                    '--window-size=1920,1080'  # Реалистичный размер окна
-                ]
-            )
-            context = await browser.new_context(
-                extra_http_headers=headers,
-                user_agent=headers['User-Agent'],
-                viewport={'width': 1920, 'height': 1080}  # Десктопный вид
+def run_on_main_loop(coro, timeout=None):
+    """Выполнить корутину на главном loop из потока Flask и дождаться результата."""
+    if main_loop is None or not main_loop.is_running():
+        coro.close()
+        raise RuntimeError("Главный event loop не запущен")
+    return asyncio.run_coroutine_threadsafe(coro, main_loop).result(timeout)
+
+# ====================== ПАРСИНГ ======================
+# Фиксированные headers (как в п1) — общие для браузера и HTTP-клиента
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Referer': 'https://www.google.com/',
+    'Sec-CH-UA': '"Not A;Brand";v="99", "Chromium";v="121", "Google Chrome";v="121"',
+    'Sec-CH-UA-Mobile': '?0',
+    'Sec-CH-UA-Platform': '"Windows"'
+}
+
+FETCH_MODES = ('auto', 'http', 'browser')
+WAIT_POLICIES = ('selector', 'networkidle', 'delay')
+
+# ====================== HTTP-КЛИЕНТ ======================
+http_client = None
+
+def get_http_client():
+    """Общий httpx-клиент с пулом keep-alive соединений (живёт на главном loop)."""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        # Accept-Encoding выставит сам httpx — br без brotli он не распакует
+        headers = {k: v for k, v in BROWSER_HEADERS.items() if k != 'Accept-Encoding'}
+        http_client = httpx.AsyncClient(
+            headers=headers,
+            follow_redirects=True,
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=PARSER_INTERVAL_MINUTES * 60 + 60
             )
-            page = await context.new_page()
+        )
+    return http_client
+
+async def close_http_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+async def fetch_html_http(url, state=None):
+    """
+    Условный GET: если в state есть ETag/Last-Modified, отправляем If-None-Match/If-Modified-Since.
+    Возвращает (html, validators); на 304 html = None.
+    """
+    headers = {}
+    if state:
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+
+    async with get_http_client().stream('GET', url, headers=headers) as response:
+        if response.status_code == 304 and headers:
+            return None, {}
+        response.raise_for_status()
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')
+        }
+        content = await read_limited(response, MAX_DOCUMENT_KB * 1024)
+    if MAX_DOCUMENT_KB and len(content) == MAX_DOCUMENT_KB * 1024:
+        logger.warning(f"{url}: страница больше {MAX_DOCUMENT_KB} КБ — разбираем только начало")
+    if response.charset_encoding:
+        html = content.decode(response.charset_encoding, errors='replace')
+    else:
+        # Кодировка не указана в заголовке — доверяем <meta charset> / автоопределению
+        from bs4 import UnicodeDammit
+        html = UnicodeDammit(content, is_html=True).unicode_markup
+    logger.info(f"Длина полученного HTML (HTTP): {len(html)}")
+    return html, validators
+
+async def read_limited(response, max_bytes):
+    """Тело ответа, но не больше max_bytes (0 = целиком): остаток не скачивается."""
+    if not max_bytes:
+        return await response.aread()
+    chunks = []
+    size = 0
+    async for chunk in response.aiter_bytes():
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            break
+    return b''.join(chunks)[:max_bytes]
+
+# Скрипты, стили, комментарии и CSRF/nonce меняются на каждый запрос — в хэш их не берём
+_VOLATILE_HTML_RE = re.compile(
+    r'<script\b.*?</script>|<style\b.*?</style>|<noscript\b.*?</noscript>|<!--.*?-->'
+    r'|<meta[^>]*csrf[^>]*>|<input[^>]*type=["\']?hidden[^>]*>|\snonce="[^"]*"',
+    re.S | re.I
+)
 
+def html_fingerprint(html, resource, limit):
+    """Хэш нормализованного HTML + селекторов (смена селекторов тоже считается изменением)."""
+    normalized = ' '.join(_VOLATILE_HTML_RE.sub('', html).split())  # То же, что re.sub(r'\s+', ' ').strip(), но втрое быстрее
+    key = '\x00'.join([normalized, resource['item_selector'], resource['title_selector'], resource['link_selector'], str(limit)])
+    return hashlib.sha1(key.encode('utf-8', 'replace')).hexdigest()
+
+def selectors_fingerprint(resource, limit):
+    """
+    Хэш селекторов и лимита, при которых сохранены etag/last_modified. 304 говорит только о том,
+    что не изменилась страница: после правки селекторов её надо загрузить и разобрать заново.
+    """
+    key = '\x00'.join([resource['item_selector'], resource['title_selector'], resource['link_selector'], str(limit)])
+    return hashlib.sha1(key.encode('utf-8', 'replace')).hexdigest()[:16]
+
+# ====================== ИЗВЛЕЧЕНИЕ ======================
+def resource_extractor(resource):
+    return get_extractor(resource.get('extract_engine') or EXTRACT_ENGINE)
+
+def extract_articles(html, resource, limit=20, stats=None):
+    return resource_extractor(resource).extract(html, resource, limit, stats)
+
+# Тот же алгоритм, что в extract_articles, но внутри страницы: наружу уходят только {title, href}.
+# Текст собирается как get_text(strip=True): каждый текстовый узел обрезается, склейка без разделителя,
+# текст внутри script/style/template не берётся (bs4 его тоже пропускает).
+IN_PAGE_EXTRACT_JS = """
+([itemSelector, titleSelector, linkSelector, baseUrl, limit]) => {
+    const skip = new Set(['SCRIPT', 'STYLE', 'TEMPLATE']);
+    const textOf = (el) => {
+        const parts = [];
+        const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+        for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+            if (node.parentElement && skip.has(node.parentElement.tagName)) continue;
+            const part = node.nodeValue.trim();
+            if (part) parts.push(part);
+        }
+        return parts.join('');
+    };
+    const records = [];
+    const matched = document.querySelectorAll(itemSelector);
+    const items = Array.from(matched).slice(0, limit);
+    for (const item of items) {
+        const titleTag = item.querySelector(titleSelector);
+        const linkTag = item.querySelector(linkSelector);
+        const rawHref = linkTag ? linkTag.getAttribute('href') : null;
+        if (!rawHref) continue;
+        let href;
+        try { href = new URL(rawHref, baseUrl).href; } catch (e) { continue; }
+        if (!href.startsWith('http')) continue;
+        records.push({title: titleTag ? textOf(titleTag) : '—', href: href});
+    }
+    return {matched: matched.length, records: records};
+}
+"""
+
+def records_fingerprint(records, resource, limit):
+    """Хэш уже извлечённых записей — для режима извлечения в браузере, где HTML не забираем."""
+    key = json.dumps([records, resource['item_selector'], resource['title_selector'], resource['link_selector'], limit],
+                     ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+async def goto_with_retries(page, url, deadline):
+    """
+    goto до domcontentloaded: повтор через 2, 4, 8… сек (±20%), пока есть попытки и бюджет
+    (deadline по time.monotonic). Таймаут каждой попытки — не больше остатка бюджета.
+    """
+    for attempt in range(1, BROWSER_GOTO_ATTEMPTS + 1):
+        remaining = deadline - time.monotonic()
+        try:
+            with tracing.span('goto', attempt=attempt):
+                await page.goto(url, wait_until='domcontentloaded', timeout=max(1.0, min(BROWSER_GOTO_TIMEOUT_SECONDS, remaining)) * 1000)
+            return
+        except Exception as goto_e:
+            metrics.BROWSER_GOTO_FAILURES.labels(type(goto_e).__name__).inc()
+            backoff = BROWSER_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1) * random.uniform(0.8, 1.2)
+            if attempt == BROWSER_GOTO_ATTEMPTS or time.monotonic() + backoff + 1 >= deadline:
+                logger.warning(f"Ошибка goto (попытка {attempt}/{BROWSER_GOTO_ATTEMPTS}) для {url}: {str(goto_e)} — больше не пробуем")
+                raise
+            logger.warning(f"Ошибка goto (попытка {attempt}/{BROWSER_GOTO_ATTEMPTS}) для {url}: {str(goto_e)} — повтор через {backoff:.1f} сек")
+            await asyncio.sleep(backoff)
+
+WAIT_FOR_ITEMS_JS = "([selector, count]) => document.querySelectorAll(selector).length >= count"
+
+async def wait_for_page_ready(page, resource, deadline):
+    """
+    Ожидание по политике ресурса (см. BROWSER_WAIT_POLICY). Не дождались — не ошибка:
+    извлечение само покажет, есть ли статьи. Возвращает исход: ready, idle, delay, timeout, budget или error.
+    """
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError  # Страница открыта — модуль уже загружен
+    policy = resource.get('wait_policy') or BROWSER_WAIT_POLICY
+    if policy not in WAIT_POLICIES:
+        policy = 'selector'
+    remaining = deadline - time.monotonic()
+    started = time.perf_counter()
+    with tracing.span('settle', policy=policy) as sp:
+        if remaining <= 0:
+            outcome = 'budget'
+        elif policy == 'delay':
+            await page.wait_for_timeout(min(float(resource.get('wait_delay_seconds') or BROWSER_WAIT_DELAY_SECONDS), remaining) * 1000)
+            outcome = 'delay'
+        else:
+            cap = min(float(resource.get('wait_timeout_seconds') or BROWSER_WAIT_TIMEOUT_SECONDS), remaining)
+            try:
+                if policy == 'selector':
+                    min_items = max(1, int(resource.get('wait_min_items') or 1))
+                    await page.wait_for_function(WAIT_FOR_ITEMS_JS, arg=[resource['item_selector'], min_items],
+                                                 timeout=cap * 1000, polling=100)
+                    outcome = 'ready'
+                else:
+                    await page.wait_for_load_state('networkidle', timeout=cap * 1000)
+                    outcome = 'idle'
+            except PlaywrightTimeoutError:
+                outcome = 'timeout'
+                logger.info(f"{resource['name']}: не дождались ({policy}) за {cap:.0f} сек — извлекаем что есть")
+            except Exception as e:
+                outcome = 'error'  # Например, селектор не понимает браузер
+                logger.warning(f"{resource['name']}: ошибка ожидания ({policy}): {e}")
+        sp.set(outcome=outcome)
+    metrics.BROWSER_WAIT_SECONDS.labels(policy, outcome).observe(time.perf_counter() - started)
+    return outcome
+
+@asynccontextmanager
+async def open_resource_page(resource):
+    """Страница из пула с маскировкой и фильтром запросов, уже открытая на resource['url']."""
+    logger.debug(f"Используемые заголовки: {BROWSER_HEADERS}")  # Для отладки
+
+    # Спан context: ожидание слота в пуле + новый контекст + скрипты маскировки и фильтр
+    context_span = tracing.start_span('context')
+    try:
+        async with browser_pool.page(
+            extra_http_headers=BROWSER_HEADERS,
+            user_agent=BROWSER_HEADERS['User-Agent'],
+            viewport={'width': 1920, 'height': 1080}  # Десктопный вид
+        ) as page:
             # Добавляем скрипты маскировки (п2)
             await page.add_init_script("""Object.defineProperty(navigator, 'webdriver', { get: () => undefined });""")
             await page.add_init_script("""Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3, 4, 5] });""")  # Фейковые плагины
@@ -211,67 +632,236 @@ async def parse_resource(resource, limit=20):
             await page.add_init_script("""Object.defineProperty(navigator, 'platform', { get: () => 'Win32' });""")  # Фейковая платформа
             await page.add_init_script("""Object.defineProperty(navigator, 'hardwareConcurrency', { get: () => 8 });""")  # Фейковое железо
 
-            # Goto с повтором и задержкой
-            for attempt in range(3):  # Увеличили до 3 попыток
+            request_filter = RequestFilter.for_resource(resource, BLOCK_RESOURCE_TYPES, BLOCK_URL_PATTERNS)
+            if request_filter:
+                await request_filter.install(page)
+            context_span.end()
+
+            deadline = time.monotonic() + float(resource.get('browser_budget_seconds') or BROWSER_BUDGET_SECONDS)
+            await goto_with_retries(page, resource['url'], deadline)
+            await wait_for_page_ready(page, resource, deadline)
+
+            yield page
+
+            if request_filter:
+                await request_filter.finish()
+                logger.info(f"{resource['name']}: {request_filter.describe()}")
+                record_request_filter(resource['name'], request_filter.summary())
+    finally:
+        context_span.end()  # Если не дошли до конца подготовки страницы
+
+def record_request_filter(name, summary):
+    """Итог фильтра запросов страницы (RequestFilter.summary) — в счётчики /metrics."""
+    for resource_type, count in summary['blocked_by_type'].items():
+        metrics.REQUESTS_BLOCKED.labels(name, resource_type).inc(count)
+    metrics.BLOCKED_BYTES_SAVED.labels(name).inc(summary['bytes_saved_estimate'])
+    metrics.BROWSER_BYTES_RECEIVED.labels(name).inc(summary['bytes_received'])
+
+async def fetch_html_browser(resource):
+    async with open_resource_page(resource) as page:
+        with tracing.span('content') as sp:
+            html = await page.content()
+            sp.set(chars=len(html))
+        logger.info(f"Длина полученного HTML (браузер): {len(html)}")
+    if MAX_DOCUMENT_KB and len(html) > MAX_DOCUMENT_KB * 1024:
+        logger.warning(f"{resource['url']}: страница больше {MAX_DOCUMENT_KB} КБ — разбираем только начало")
+        html = html[:MAX_DOCUMENT_KB * 1024]
+    return html
+
+async def fetch_records_browser(resource, limit=20):
+    """
+    Извлечение прямо в странице: вместо всего HTML возвращает до limit записей {title, href}
+    и сколько элементов нашёл item_selector.
+    """
+    async with open_resource_page(resource) as page:
+        with tracing.span('extract_in_page') as sp:
+            result = await page.evaluate(
+                IN_PAGE_EXTRACT_JS,
+                [resource['item_selector'], resource['title_selector'], resource['link_selector'], resource['url'], limit]
+            )
+            sp.set(matched=result['matched'], kept=len(result['records']))
+        records = result['records']
+        logger.info(f"Извлечено в браузере {len(records)} записей из {result['matched']} (лимит: {limit})")
+    return records, result['matched']
+
+def uses_in_browser_extraction(resource):
+    value = resource.get('extract_in_browser')
+    return EXTRACT_IN_BROWSER if value is None else bool(value)
+
+def fetch_plan(resource):
+    """(режим, способы загрузки по порядку) — в режиме auto браузер идёт запасным после HTTP."""
+    mode = resource.get('fetch_mode') or 'auto'
+    if mode not in FETCH_MODES:
+        mode = 'auto'
+    if mode == 'http':
+        return mode, ['http']
+    if mode == 'browser' or resource.get('resolved_fetch_mode') == 'browser':
+        return mode, ['browser']
+    return mode, ['http', 'browser']
+
+async def cached_page_html(url, via, force_refresh=False):
+    """HTML из кэша страниц, если он свежий и обновление не запрошено явно."""
+    if force_refresh or not page_cache.enabled:
+        return None, None
+    cached = await asyncio.to_thread(page_cache.get, url, via)
+    if cached is None:
+        return None, None
+    html, meta = cached
+    logger.info(f"Кэш страниц: {url} ({via}), возраст {time.time() - meta['fetched_at']:.0f} сек")
+    return html, meta
+
+async def fetch_page(resource, limit, state, via, force_refresh=False, prefer_html=False):
+    """
+    Загрузка без извлечения: {'via', 'html' или 'records', 'fingerprint', 'validators', 'selectors'}.
+    Если страница не изменилась (304 или тот же хэш) — None, причина в state['last_outcome'].
+    Свежая страница из кэша заменяет загрузку; force_refresh — загрузить заново в любом случае.
+    prefer_html — в браузере забрать весь HTML (и положить в кэш) вместо извлечения в странице.
+    """
+    url = resource['url']
+    name = resource.get('name') or url
+    with tracing.span('cache_lookup', via=via) as sp:
+        html, meta = await cached_page_html(url, via, force_refresh)
+        sp.set(hit=html is not None)
+    if html is not None:
+        metrics.PAGE_CACHE_HITS.labels(name, via).inc()
+    started = time.perf_counter()
+    if via == 'http':
+        if html is not None:
+            validators = meta.get('validators') or {}
+        else:
+            # При принудительном обновлении или после смены селекторов нужен сам HTML, а не 304
+            conditional = not force_refresh and state is not None and state.get('selectors') == selectors_fingerprint(resource, limit)
+            with tracing.span('http_fetch') as sp:
+                html, validators = await fetch_html_http(url, state if conditional else None)
+                sp.set(not_modified=html is None, chars=len(html) if html else 0)
+            metrics.FETCH_SECONDS.labels(name, via).observe(time.perf_counter() - started)
+            if html is None:
+                logger.info(f"{resource['name']}: 304 Not Modified — пропускаем")
+                state['last_outcome'] = 'not_modified'
+                return None
+            metrics.HTML_BYTES.labels(name, via).observe(len(html.encode('utf-8', 'replace')))
+            if page_cache.enabled:
+                await asyncio.to_thread(page_cache.put, url, via, html, validators=validators)
+        page = {'via': via, 'html': html, 'fingerprint': html_fingerprint(html, resource, limit), 'validators': validators,
+                'selectors': selectors_fingerprint(resource, limit)}
+    else:
+        # У браузера нет условных запросов — валидаторы HTTP тут не актуальны
+        validators = {'etag': None, 'last_modified': None}
+        if html is None and uses_in_browser_extraction(resource) and not prefer_html:
+            records, matched = await fetch_records_browser(resource, limit)
+            metrics.FETCH_SECONDS.labels(name, via).observe(time.perf_counter() - started)
+            page = {'via': via, 'records': records, 'matched': matched,
+                    'fingerprint': records_fingerprint(records, resource, limit), 'validators': validators,
+                    'selectors': selectors_fingerprint(resource, limit)}
+        else:
+            if html is None:
+                html = await fetch_html_browser(resource)
+                metrics.FETCH_SECONDS.labels(name, via).observe(time.perf_counter() - started)
+                metrics.HTML_BYTES.labels(name, via).observe(len(html.encode('utf-8', 'replace')))
+                if page_cache.enabled:
+                    await asyncio.to_thread(page_cache.put, url, via, html)
+            page = {'via': via, 'html': html, 'fingerprint': html_fingerprint(html, resource, limit), 'validators': validators,
+                    'selectors': selectors_fingerprint(resource, limit)}
+
+    if state is not None and state.get('content_hash') == page['fingerprint']:
+        logger.info(f"{resource['name']}: {'HTML' if via == 'http' else 'страница'} не изменилась — пропускаем")
+        state['last_outcome'] = 'unchanged_hash'
+        return None
+    return page
+
+def extract_page(page, resource, limit):
+    if 'records' in page:
+        extractor = resource_extractor(resource)
+        data = [{"title": extractor.clean_title(r['title']), "url": r['href']} for r in page['records']]
+        matched = page['matched']
+    else:
+        stats = {}
+        with tracing.span('extract', engine=resource_extractor(resource).name) as sp:
+            data = extract_articles(page['html'], resource, limit, stats)
+            matched = stats.get('matched', len(data))
+            sp.set(matched=matched, kept=len(data))
+            if 'stopped_early' in stats:
+                sp.set(parsed_chars=stats['parsed_chars'], stopped_early=stats['stopped_early'])
+            if 'parse_seconds' in stats:
+                tracing.record('parse_html', stats['parse_seconds'])
+                tracing.record('select', stats['select_seconds'], matched=matched)
+    name = resource.get('name') or resource['url']
+    metrics.ITEMS_MATCHED.labels(name).observe(matched)
+    metrics.ITEMS_KEPT.labels(name).observe(len(data))
+    return data
+
+def accept_page(page, resource, state, mode):
+    """Страница дала статьи: запоминаем способ загрузки (auto) и валидаторы/хэш для следующего раза."""
+    if mode == 'auto':
+        resource['resolved_fetch_mode'] = page['via']
+    if state is not None:
+        state.update(page['validators'], content_hash=page['fingerprint'], selectors=page['selectors'])
+
+NO_ARTICLES_ERROR = "селекторы не найдены или нет статей на странице"
+
+async def parse_resource(resource, limit=20, state=None, force_refresh=False, prefer_html=False):
+    """
+    Режим загрузки берётся из resource['fetch_mode']:
+      http    — только HTTP-клиент;
+      browser — только Playwright;
+      auto    — сначала HTTP, браузер только если селекторы ничего не нашли.
+    В режиме auto сработавший способ запоминается в resource['resolved_fetch_mode'].
+
+    state — сохранённое состояние ресурса (ETag, Last-Modified, хэш HTML). Если страница
+    не изменилась (304 или тот же хэш), возвращается (None, None) без извлечения,
+    а причина пишется в state['last_outcome'].
+    force_refresh и prefer_html — см. fetch_page.
+    """
+    name = resource.get('name') or resource['url']
+    with tracing.resource(name), tracing.maybe_profile(name), tracing.span('parse') as parse_span:
+        try:
+            logger.info(f"Парсим: {resource['name']} → {resource['url']}")
+
+            mode, vias = fetch_plan(resource)
+            if state is not None:
+                state['last_outcome'] = 'changed'
+
+            data = []
+            for via in vias:
                 try:
-                    await page.goto(resource['url'], wait_until='domcontentloaded', timeout=180000)  # Таймаут 3 мин
-                    await page.wait_for_timeout(3000)  # 3 сек задержки для имитации человека
-                    break
-                except Exception as goto_e:
-                    logger.warning(f"Ошибка goto (попытка {attempt+1}/3) для {resource['url']}: {str(goto_e)}")
-                    if attempt == 2:
+                    page = await fetch_page(resource, limit, state, via, force_refresh, prefer_html)
+                    if page is None:
+                        parse_span.set(outcome=state['last_outcome'] if state is not None else None)
+                        return None, None
+                    data = extract_page(page, resource, limit)
+                except Exception as http_e:
+                    if via != 'http' or mode == 'http':
                         raise
-
-            html = await page.content()
-            logger.info(f"Длина полученного HTML: {len(html)}")
-            await browser.close()
-
-        soup = BeautifulSoup(html, 'lxml')
-        items = soup.select(resource['item_selector'])
-        logger.info(f"Найдено {len(items)} элементов, берём первые {limit}")
-
-        data = []
-        for item in items[:limit]:
-            title_tag = item.select_one(resource['title_selector'])
-            link_tag = item.select_one(resource['link_selector'])
-
-            title = title_tag.get_text(strip=True) if title_tag else "—"
-            link = link_tag['href'] if link_tag and link_tag.has_attr('href') else None
-            if link:
-                link = urljoin(resource['url'], link)
-                if not link.startswith('http'):
+                    logger.warning(f"HTTP-загрузка {resource['url']} не удалась: {http_e} — пробуем браузер")
                     continue
+                if data:
+                    accept_page(page, resource, state, mode)
+                    break
+                if via == 'http' and mode == 'auto':
+                    logger.info(f"HTTP: селекторы ничего не нашли на {resource['name']} — пробуем браузер")
 
-                with warnings.catch_warnings(record=True) as w:
-                    clean_title = BeautifulSoup(title, "lxml").get_text(strip=True)
-                    for warning in w:
-                        msg = str(warning.message)
-                        if "strip_cdata" not in msg:
-                            logger.warning(f"Предупреждение для заголовка '{title}': {msg} (файл: {warning.filename}, строка: {warning.lineno})")
-                if not clean_title:
-                    clean_title = "Без заголовка"
-
-                data.append({
-                    "title": clean_title,
-                    "url": link
-                })
-
-        if not data:
-            return [], "селекторы не найдены или нет статей на странице"
-
-        logger.info(f"Успешно спаршено {len(data)} статей (лимит: {limit}) с {resource['name']}")
-        return data, None
-    except Exception as e:
-        error_msg = f"сайт недоступен: {str(e)}"
-        logger.error(f"ОШИБКА парсинга {resource.get('name', 'unknown')}: {error_msg}")
-        return [], error_msg
+            if not data:
+                parse_span.set(outcome='error', error=NO_ARTICLES_ERROR)
+                return [], NO_ARTICLES_ERROR
+
+            logger.info(f"Успешно спаршено {len(data)} статей (лимит: {limit}) с {resource['name']}")
+            parse_span.set(outcome='changed', via=page['via'], articles=len(data))
+            return data, None
+        except Exception as e:
+            error_msg = f"сайт недоступен: {str(e) or type(e).__name__}"
+            logger.error(f"ОШИБКА парсинга {resource.get('name', 'unknown')}: {error_msg}")
+            parse_span.set(outcome='error', error=error_msg)
+            return [], error_msg
 
 # Новая async функция для получения только HTML (для /debug)
-async def get_page_html(url):
+async def get_page_html(url, force_refresh=False):
     try:
-        ua = UserAgent()
+        html, _ = await cached_page_html(url, 'browser', force_refresh)
+        if html is not None:
+            return html
+
         headers = {
-            'User-Agent': ua.random,
+            'User-Agent': random_user_agent(),
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
             'Referer': 'https://www.google.com/',
@@ -283,114 +873,501 @@ async def get_page_html(url):
             'Sec-Fetch-User': '?1'
         }
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True, args=['--no-sandbox', '--disable-setuid-sandbox'])
-            context = await browser.new_context(extra_http_headers=headers)
-            page = await context.new_page()
-
-            for attempt in range(2):
-                try:
-                    await page.goto(url, wait_until='domcontentloaded', timeout=120000)
-                    break
-                except Exception as goto_e:
-                    if 'Timeout' in str(goto_e):
-                        logger.warning(f"Timeout на goto (попытка {attempt+1}/2) для {url}")
-                        if attempt == 1:
-                            raise
-                    else:
-                        raise
+        async with browser_pool.page(extra_http_headers=headers) as page:
+            await RequestFilter(BLOCK_RESOURCE_TYPES, BLOCK_URL_PATTERNS).install(page)
+            await goto_with_retries(page, url, time.monotonic() + BROWSER_BUDGET_SECONDS)
 
             html = await page.content()
-            await browser.close()
 
+        if page_cache.enabled:
+            await asyncio.to_thread(page_cache.put, url, 'browser', html)
         return html
     except Exception as e:
         logger.error(f"ОШИБКА получения HTML для {url}: {e}")
         return f"Ошибка: {str(e)}"
 
+# ====================== ВОРКЕРЫ ОБХОДА ======================
+# Три функции ниже выполняются в процессах-воркерах: там app.py импортирован заново, свои пул браузеров,
+# HTTP-клиент и кэш; логи, спаны и метрики пересылаются сюда. Дедуп, база и Telegram — только в главном процессе.
+def init_crawl_worker(worker_id):
+    tracing.set_process(worker=worker_id)
+    metrics.record_for_parent()
+    logger.info(f"Воркер {worker_id}: app.py загружен за {sum(s for _, s in startup_phases):.2f} сек")
+
+async def parse_resource_in_worker(resource, limit, state, force_refresh, prefer_html, cycle_id):
+    with tracing.join_cycle(cycle_id), metrics.task_events() as metric_events:
+        try:
+            items, error_msg = await parse_resource(resource, limit, state, force_refresh, prefer_html)
+        except Exception as e:
+            # Ошибкой ресурса, а не исключением задачи: иначе метрики, набранные до сбоя, не дойдут до родителя
+            items, error_msg = [], f"воркер обхода: {type(e).__name__}: {e}"
+            logger.error(f"ОШИБКА парсинга {resource.get('name', 'unknown')}: {error_msg}")
+    return items, error_msg, state, resource.get('resolved_fetch_mode'), metric_events + metrics.take_events()
+
+async def close_crawl_worker():
+    await close_http_client()
+    await browser_pool.stop()
+
+crawl_workers = CrawlWorkerPool(
+    parse_resource_in_worker,
+    initializer=init_crawl_worker,
+    teardown=close_crawl_worker,
+    processes=CRAWL_WORKERS,
+    slots=CRAWL_WORKER_SLOTS,
+    max_tasks=CRAWL_WORKER_MAX_TASKS,
+    task_timeout=CRAWL_WORKER_TASK_TIMEOUT_SECONDS,
+    on_restart=lambda reason: metrics.CRAWL_WORKER_RESTARTS.labels(reason).inc()
+)
+
+async def parse_resource_remote(resource, limit=20, state=None, force_refresh=False, prefer_html=False):
+    """
+    parse_resource в воркере с тем же контрактом: (статьи, ошибка), state и resolved_fetch_mode
+    обновляются на месте. Падение или зависание воркера — ошибка ресурса, а не исключение.
+    """
+    try:
+        items, error_msg, new_state, resolved_mode, metric_events = await crawl_workers.run(
+            resource, limit, state, force_refresh, prefer_html, tracing.current_cycle()
+        )
+    except Exception as e:
+        error_msg = f"воркер обхода: {str(e)}"
+        logger.error(f"ОШИБКА парсинга {resource.get('name', 'unknown')}: {error_msg}")
+        return [], error_msg
+    metrics.apply_events(metric_events)  # Время загрузки, размеры, запуски браузера — посчитаны в воркере
+    if state is not None and new_state is not None:
+        state.clear()
+        state.update(new_state)
+    if resolved_mode:
+        resource['resolved_fetch_mode'] = resolved_mode
+    return items, error_msg
+
+# ====================== ПРЕДПРОСМОТР ======================
+async def preview_parse(resource, force_refresh=False):
+    """
+    Парсинг для веб-интерфейса — в общих лимитах обхода, чтобы не плодить браузеры рядом с планировщиком.
+    Браузер отдаёт полный HTML в кэш страниц: при подборе селекторов страница не рендерится заново.
+    """
+    global_sem, host_sem = crawl_limits(resource['url'])
+    with tracing.cycle('preview', resources=1):
+        async with host_sem:
+            async with global_sem:
+                parse = parse_resource_remote if crawl_workers.started else parse_resource
+                return await parse(resource, limit=20, force_refresh=force_refresh, prefer_html=True)
+
+preview_jobs = PreviewJobs(preview_parse, ttl=PREVIEW_CACHE_SECONDS)
+
+def articles_table(data):
+    """Таблица статей для предпросмотра (та же разметка, что давал pandas.DataFrame.to_html)."""
+    rows = "".join(
+        f"    <tr>\n      <td>{escape(art['title'])}</td>\n"
+        f"      <td><a href='{escape(art['url'])}'>{escape(art['url'])}</a></td>\n    </tr>\n"
+        for art in data
+    )
+    return ('<table border="1" class="dataframe">\n  <thead>\n    <tr style="text-align: right;">\n'
+            '      <th>Заголовок</th>\n      <th>Ссылка</th>\n    </tr>\n  </thead>\n'
+            f'  <tbody>\n{rows}  </tbody>\n</table>')
+
+# ====================== ПАРАЛЛЕЛЬНЫЙ ОБХОД ======================
+# Лимиты общие для всех задач: цикл целиком и задачи отдельных ресурсов делят одни семафоры
+_crawl_sem = None
+_host_sems = {}
+
+def crawl_limits(url):
+    global _crawl_sem
+    if _crawl_sem is None:
+        _crawl_sem = asyncio.Semaphore(max(1, CRAWL_CONCURRENCY))
+    host = urlparse(url).hostname or url
+    if host not in _host_sems:
+        _host_sems[host] = asyncio.Semaphore(max(1, CRAWL_PER_HOST_LIMIT))
+    return _crawl_sem, _host_sems[host]
+
+async def crawl_resources(active_resources, limit=20, states=None, deadline=None):
+    """
+    Парсит ресурсы параллельно с глобальным лимитом, лимитом на домен и дедлайном цикла.
+    Возвращает список (items, error_msg) в том же порядке, что и active_resources.
+    states — {имя ресурса: состояние} для условных запросов (см. parse_resource).
+    """
+    async def crawl_one(resource):
+        global_sem, host_sem = crawl_limits(resource['url'])
+        # Сначала ждём свой домен, чтобы не занимать глобальный слот в очереди к нему
+        async with host_sem:
+            async with global_sem:
+                state = states.setdefault(resource['name'], {}) if states is not None else None
+                parse = parse_resource_remote if crawl_workers.started else parse_resource
+                return await parse(resource, limit=limit, state=state)
+
+    tasks = [asyncio.create_task(crawl_one(r)) for r in active_resources]
+    if not tasks:
+        return []
+
+    deadline = deadline or CRAWL_CYCLE_DEADLINE_SECONDS or None
+    _, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.warning(f"Дедлайн цикла {deadline} сек: не успели {len(pending)} из {len(tasks)} ресурсов")
+
+    results = []
+    for resource, task in zip(active_resources, tasks):
+        if task in pending:
+            results.append(([], f"не уложились в лимит цикла ({deadline} сек)"))
+        elif task.exception() is not None:
+            error_msg = f"сайт недоступен: {str(task.exception())}"
+            logger.error(f"ОШИБКА парсинга {resource.get('name', 'unknown')}: {error_msg}")
+            results.append(([], error_msg))
+        else:
+            results.append(task.result())
+    return results
+
 # ====================== АВТОПАРСИНГ ======================
+def new_report():
+    return {
+        'lines': [],
+        'articles': [],
+        'new_articles': [],
+        'new_by_resource': {},
+        'errors': {},
+        'recovered': [],
+        'stats': {'not_modified': 0, 'unchanged_hash': 0, 'circuit_open': 0, 'repeated_errors': 0},
+    }
+
+def merge_report(report, part):
+    """Дописывает отчёт по части ресурсов в общий (порядок — порядок вызовов)."""
+    for key in ('lines', 'articles', 'new_articles', 'recovered'):
+        report[key].extend(part[key])
+    for key in ('new_by_resource', 'errors'):
+        report[key].update(part[key])
+    for key, value in part['stats'].items():
+        report['stats'][key] += value
+    return report
+
+async def collect_resource_result(report, resource, current_items, error_msg):
+    """Дедуп и раскладка результата одного ресурса в отчёт."""
+    name = resource['name']
+    lines = report['lines']
+    state = resource_state.setdefault(name, {})
+
+    if error_msg:
+        report['errors'][name] = error_msg
+        metrics.FETCH_OUTCOMES.labels(name, 'error').inc()
+        logger.info(f"Ошибка для {name}: {error_msg}")
+        event = circuit_breaker.record_failure(state, error_msg)
+        if event is None:
+            report['stats']['repeated_errors'] += 1
+            return  # Та же ошибка, что и в прошлый раз, — в Telegram не повторяем
+        lines.append(f"\n<b>📍 {name}</b>\n")
+        lines.append(f"🚨 {error_msg}")
+        health = state['health']
+        if event == 'open':
+            retry_at = datetime.fromtimestamp(health['retry_at']).strftime('%d.%m %H:%M')
+            lines.append(f"⏸ ошибок подряд: {health['consecutive_failures']} — отключён, следующая попытка {retry_at}")
+            logger.warning(f"{name}: {health['consecutive_failures']} ошибок подряд ({health['error_class']}) — отключён до {retry_at}")
+        return
+
+    lines.append(f"\n<b>📍 {name}</b>\n")
+    if circuit_breaker.record_success(state) == 'recovered':
+        report['recovered'].append(name)
+        lines.append(f"✅ снова доступен (ошибок подряд было: {state['health']['recovered_after']})")
+        logger.info(f"{name}: снова доступен")
+
+    if current_items is None:
+        # 304 или тот же хэш — ни извлечения, ни дедупа
+        outcome = resource_state.get(name, {}).get('last_outcome')
+        if outcome in report['stats']:
+            report['stats'][outcome] += 1
+            metrics.FETCH_OUTCOMES.labels(name, outcome).inc()
+        lines.append("💤 без изменений с прошлой проверки")
+        report['new_by_resource'][name] = []
+        return
+
+    resource_articles = []
+
+    logger.info(f"\n=== {name.upper()} ===")
+    for item in current_items:
+        clean_title = item['title']
+        url = item['url']
+
+        logger.info(f"• {clean_title}")
+        logger.info(f"  → {url}\n")
+
+        resource_articles.append({"title": clean_title, "url": url})
+        report['articles'].append({"Источник": name, "title": clean_title, "url": url})
+
+    # Дедуп по каноническому URL: отпечатки в памяти, затем вставка в SQLite одной транзакцией
+    with tracing.resource(name), tracing.span('dedup', candidates=len(resource_articles)) as sp:
+        new_items = await asyncio.to_thread(dedup_new_articles, resource, resource_articles)
+        sp.set(new=len(new_items))
+    report['new_by_resource'][name] = new_items
+    metrics.FETCH_OUTCOMES.labels(name, 'changed').inc()
+    metrics.NEW_ARTICLES.labels(name).inc(len(new_items))
+    if new_items:
+        report['new_articles'].extend({"Источник": name, "title": art['title'], "url": art['url']} for art in new_items)
+        logger.info(f"Добавлено {len(new_items)} новых статей в базу для {name}")
+
+    logger.info(f"Спаршено {len(resource_articles)} статей с {name} (из них новых: {len(new_items)})")
+
+    for art in resource_articles:
+        lines.append(f"• <a href='{art['url']}'>{art['title']}</a>")
+
+async def process_crawl_results(active_resources, results):
+    """Дедуп и раскладка результатов по ресурсам — строго в порядке ресурсов."""
+    report = new_report()
+    for resource, (current_items, error_msg) in zip(active_resources, results):
+        await collect_resource_result(report, resource, current_items, error_msg)
+    return report
+
+async def crawl_and_collect(active_resources, deadline=None):
+    """Обход + запоминание режимов загрузки + дедуп + сохранение состояния ресурсов."""
+    known_modes = {r['name']: r.get('resolved_fetch_mode') for r in active_resources}
+    results = await crawl_resources(active_resources, limit=20, states=resource_state, deadline=deadline)
+    report = await process_crawl_results(active_resources, results)
+    await finish_crawl(active_resources, known_modes)
+    return report
+
+async def finish_crawl(active_resources, known_modes):
+    """После обхода: сохранить новые режимы загрузки и состояние ресурсов."""
+    await asyncio.to_thread(remember_fetch_modes, {
+        r['name']: r['resolved_fetch_mode'] for r in active_resources
+        if r.get('resolved_fetch_mode') and r['resolved_fetch_mode'] != known_modes[r['name']]
+    })
+    # Состояние только для живых ресурсов — удалённые из базы не копим
+    names = {r['name'] for r in resources}
+    for name in [n for n in resource_state if n not in names]:
+        del resource_state[name]
+    await save_resource_state(resource_state)
+
+def format_new_articles(new_articles):
+    new_lines = []
+    current_source = None
+    for art in new_articles:
+        if art["Источник"] != current_source:
+            current_source = art["Источник"]
+            new_lines.append(f"\n<b>📍 {current_source}</b>\n")
+        new_lines.append(f"• <a href='{art['url']}'>{art['title']}</a>")
+    return "\n".join(new_lines)
+
+def build_digest(report):
+    """Сводка цикла; None — сказать нечего (все ресурсы повторили известную ошибку или отключены)."""
+    stats = report['stats']
+    skipped = stats['not_modified'] + stats['unchanged_hash']
+    quiet = stats['circuit_open'] + stats['repeated_errors']
+    if not report['lines']:
+        return None if quiet else "Ничего не спарсили 😔"
+
+    message = f"<b>🔥 Свежие статьи ({len(report['articles'])} шт.)</b>\n"
+    message += "\n".join(report['lines'])
+
+    if report['new_articles']:
+        message += f"\n\n<b>Среди них новые ({len(report['new_articles'])} шт.):</b>\n"
+        message += format_new_articles(report['new_articles'])
+
+    if skipped:
+        message += (f"\n\n<i>Без изменений: {skipped} "
+                    f"(304: {stats['not_modified']}, тот же хэш: {stats['unchanged_hash']})</i>")
+    if quiet:
+        message += (f"\n<i>Отключены после ошибок: {stats['circuit_open']}, "
+                    f"ошибка повторилась: {stats['repeated_errors']}</i>")
+    return message
+
+# ====================== ПОТОКОВЫЙ РЕЖИМ ======================
+async def run_pipeline_cycle(active_resources, limit=20, deadline=None):
+    """
+    Загрузка → извлечение → дедуп → отправка; стадии связаны очередями ограниченного размера.
+    Новые статьи ресурса уходят в Telegram сразу после его обработки, не дожидаясь остальных.
+    Загрузка держит слот обхода, пока страницу не заберёт извлечение, — при отставании
+    следующих стадий она притормаживает, и в памяти не копятся страницы.
+    Возвращает общий отчёт в порядке ресурсов (для сводки в конце цикла).
+    """
+    queue_size = max(1, PIPELINE_QUEUE_SIZE)
+    pages = asyncio.Queue(maxsize=queue_size)     # (resource, mode, vias, page)
+    results = asyncio.Queue(maxsize=queue_size)   # (resource, items, error_msg)
+    messages = asyncio.Queue(maxsize=queue_size)  # Готовые сообщения по ресурсам
+    known_modes = {r['name']: r.get('resolved_fetch_mode') for r in active_resources}
+    parts = {}
+    done = asyncio.Event()
+    fetchers = set()
+
+    def start_fetch(resource, mode, vias):
+        task = asyncio.create_task(fetch_stage(resource, mode, vias))
+        fetchers.add(task)
+        task.add_done_callback(fetchers.discard)
+
+    def fall_back(resource, mode, vias, reason):
+        # Сюда попадаем только в режиме auto после HTTP: дальше — браузер
+        logger.info(f"HTTP: {reason} на {resource['name']} — пробуем браузер")
+        start_fetch(resource, mode, vias[1:])
+
+    async def fetch_stage(resource, mode, vias):
+        logger.info(f"Парсим: {resource['name']} → {resource['url']} ({vias[0]})")
+        state = resource_state.setdefault(resource['name'], {})
+        state['last_outcome'] = 'changed'
+        global_sem, host_sem = crawl_limits(resource['url'])
+        async with host_sem:
+            async with global_sem:
+                if crawl_workers.started:
+                    # Загрузка и извлечение (с запасным браузером) целиком в воркере
+                    items, error_msg = await parse_resource_remote(resource, limit, state)
+                    await results.put((resource, items, error_msg))
+                    return
+                try:
+                    with tracing.resource(resource['name']), tracing.maybe_profile(resource['name']):
+                        with tracing.span('fetch', via=vias[0]):
+                            page = await fetch_page(resource, limit, state, vias[0])
+                except Exception as e:
+                    if len(vias) > 1:
+                        fall_back(resource, mode, vias, f"загрузка не удалась ({e})")
+                        return
+                    error_msg = f"сайт недоступен: {str(e) or type(e).__name__}"
+                    logger.error(f"ОШИБКА парсинга {resource['name']}: {error_msg}")
+                    await results.put((resource, [], error_msg))
+                    return
+                if page is None:
+                    await results.put((resource, None, None))
+                else:
+                    await pages.put((resource, mode, vias, page))
+
+    async def extract_stage():
+        while True:
+            resource, mode, vias, page = await pages.get()
+            try:
+                with tracing.resource(resource['name']):
+                    data = await asyncio.to_thread(extract_page, page, resource, limit)
+            except Exception as e:
+                if len(vias) > 1:
+                    fall_back(resource, mode, vias, f"ошибка извлечения ({e})")
+                    continue
+                await results.put((resource, [], f"сайт недоступен: {str(e)}"))
+                continue
+            if data:
+                accept_page(page, resource, resource_state.get(resource['name']), mode)
+                logger.info(f"Успешно спаршено {len(data)} статей (лимит: {limit}) с {resource['name']}")
+                await results.put((resource, data, None))
+            elif len(vias) > 1:
+                fall_back(resource, mode, vias, "селекторы ничего не нашли")
+            else:
+                await results.put((resource, [], NO_ARTICLES_ERROR))
+
+    async def dedup_stage():
+        while True:
+            resource, items, error_msg = await results.get()
+            name = resource['name']
+            part = new_report()
+            try:
+                await collect_resource_result(part, resource, items, error_msg)
+                message = build_resource_message(name, part)
+                if message:
+                    await messages.put(message)
+            except Exception as e:
+                logger.error(f"Ошибка обработки результатов {name}: {e}")
+                part = new_report()
+                await collect_resource_result(part, resource, [], f"ошибка обработки: {str(e)}")
+            parts[name] = part
+            if len(parts) >= len(known_modes):
+                done.set()
+
+    async def notify_stage():
+        while True:
+            message = await messages.get()
+            try:
+                await send_telegram_message(message)
+            except Exception as e:
+                logger.error(f"Ошибка отправки сообщения по ресурсу: {e}")
+            finally:
+                messages.task_done()
+
+    for resource in active_resources:
+        start_fetch(resource, *fetch_plan(resource))
+    if not active_resources:
+        done.set()
+    workers = [asyncio.create_task(extract_stage()) for _ in range(max(1, PIPELINE_EXTRACT_WORKERS))]
+    workers.append(asyncio.create_task(dedup_stage()))
+    notifier = asyncio.create_task(notify_stage())
+
+    deadline = deadline or CRAWL_CYCLE_DEADLINE_SECONDS or None
+    try:
+        await asyncio.wait_for(done.wait(), deadline)
+    except asyncio.TimeoutError:
+        logger.warning(f"Дедлайн цикла {deadline} сек: не успели {len(known_modes) - len(parts)} из {len(known_modes)} ресурсов")
+    finally:
+        stages = list(fetchers) + workers
+        for task in stages:
+            task.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
+        # То, что уже готово к отправке, досылаем
+        await messages.join()
+        notifier.cancel()
+        await asyncio.gather(notifier, return_exceptions=True)
+
+    report = new_report()
+    for resource in active_resources:
+        part = parts.get(resource['name'])
+        if part is None:
+            part = new_report()
+            await collect_resource_result(part, resource, [], f"не уложились в лимит цикла ({deadline} сек)")
+        merge_report(report, part)
+    await finish_crawl(active_resources, known_modes)
+    return report
+
+def build_cycle_summary(report):
+    stats = report['stats']
+    skipped = stats['not_modified'] + stats['unchanged_hash']
+    checked = len(report['new_by_resource']) + len(report['errors'])
+    message = (f"<b>📊 Цикл завершён</b>\n"
+               f"Ресурсов: {checked}, новых статей: {len(report['new_articles'])}, "
+               f"без изменений: {skipped}, ошибок: {len(report['errors'])}, "
+               f"отключено: {stats['circuit_open']}")
+    if report['errors']:
+        message += "\n<i>С ошибками: " + ", ".join(report['errors']) + "</i>"
+    return message
+
 async def send_new_articles_async():
     try:
-        global resources, last_results
+        global resources
         logger.info("Запуск автопарсинга — проверяем на новые статьи")
 
-        resources = load_resources()
-        last_results = load_last_results()
+        resources = await asyncio.to_thread(load_resources)
         if not resources:
             await send_telegram_message("База ресурсов пуста")
             return
 
-        all_articles = []
-        all_new_articles = []
-        updated_last_results = last_results.copy()
-        lines = []
-
+        active_resources = []
+        circuit_open = 0
         for resource in resources:
             if resource.get('paused', False):
                 logger.info(f"Ресурс {resource['name']} на паузе — пропускаем")
                 continue
-            name = resource['name']
-            current_items, error_msg = await parse_resource(resource, limit=20)
-
-            lines.append(f"\n<b>📍 {name}</b>\n")
-
-            if error_msg:
-                lines.append(f"🚨 {error_msg}")
-                logger.info(f"Ошибка для {name}: {error_msg}")
+            state = resource_state.get(resource['name'])
+            if not circuit_breaker.allows(state):
+                logger.info(f"Ресурс {resource['name']} отключён после ошибок ещё на "
+                            f"{circuit_breaker.retry_delay(state) / 60:.0f} мин — пропускаем")
+                metrics.CIRCUIT_SKIPS.labels(resource['name']).inc()
+                circuit_open += 1
                 continue
-
-            resource_articles = []
-            new_items = []
-
-            logger.info(f"\n=== {name.upper()} ===")
-            for item in current_items:
-                clean_title = item['title']
-                url = item['url']
-
-                logger.info(f"• {clean_title}")
-                logger.info(f"  → {url}\n")
-
-                resource_articles.append({"title": clean_title, "url": url})
-                all_articles.append({"Источник": name, "title": clean_title, "url": url})
-
-                known_articles = updated_last_results.get(name, [])
-                known_urls = {art['url'] for art in known_articles}
-
-                if url not in known_urls:
-                    new_items.append({"title": clean_title, "url": url})
-                    all_new_articles.append({"Источник": name, "title": clean_title, "url": url})
-
-            if new_items:
-                known_articles.extend(new_items)
-                updated_last_results[name] = known_articles
-                logger.info(f"Добавлено {len(new_items)} новых статей в базу для {name}")
-
-            logger.info(f"Спаршено {len(resource_articles)} статей с {name} (из них новых: {len(new_items)})")
-
-            for art in resource_articles:
-                lines.append(f"• <a href='{art['url']}'>{art['title']}</a>")
-
-        save_last_results(updated_last_results)
-
-        if lines:
-            message = f"<b>🔥 Свежие статьи ({len(all_articles)} шт.)</b>\n"
-            message += "\n".join(lines)
-
-            if all_new_articles:
-                new_lines = []
-                current_source = None
-                for art in all_new_articles:
-                    if art["Источник"] != current_source:
-                        current_source = art["Источник"]
-                        new_lines.append(f"\n<b>📍 {current_source}</b>\n")
-                    new_lines.append(f"• <a href='{art['url']}'>{art['title']}</a>")
-
-                message += f"\n\n<b>Среди них новые ({len(all_new_articles)} шт.):</b>\n"
-                message += "\n".join(new_lines)
-        else:
-            message = "Ничего не спарсили 😔"
-
-        await send_telegram_message(message)
+            active_resources.append(resource)
+        # Ресурсы с ошибками — в конец очереди: в бюджет цикла первыми укладываются рабочие
+        active_resources.sort(key=lambda r: circuit_breaker.status(resource_state.get(r['name'])) != 'ok')
+
+        started = time.perf_counter()
+        with tracing.cycle('pipeline' if PIPELINE_MODE else 'full', resources=len(active_resources)):
+            if PIPELINE_MODE:
+                report = await run_pipeline_cycle(active_resources)
+            else:
+                report = await crawl_and_collect(active_resources)
+        metrics.CYCLE_SECONDS.labels('pipeline' if PIPELINE_MODE else 'full').observe(time.perf_counter() - started)
+        report['stats']['circuit_open'] = circuit_open
+        await asyncio.to_thread(article_store.purge_expired)
+
+        stats = report['stats']
+        logger.info(f"Пропущено без изменений: {stats['not_modified'] + stats['unchanged_hash']} "
+                    f"(304: {stats['not_modified']}, тот же хэш: {stats['unchanged_hash']}) из {len(active_resources)}")
+
+        if not PIPELINE_MODE:
+            digest = build_digest(report)
+            if digest:
+                await send_telegram_message(digest)
+        elif PIPELINE_SUMMARY:
+            # Статьи уже ушли по ресурсам — в конце только сводка
+            await send_telegram_message(build_cycle_summary(report))
         logger.info("Цикл автопарсинга отработал")
     except Exception as e:
         error_msg = f"Ошибка в автопарсинге: {str(e)}\n{traceback.format_exc()}"
@@ -406,6 +1383,170 @@ async def run_auto_parse():
         logger.error(error_msg)
         await send_error_to_telegram(error_msg)
 
+# ====================== АДАПТИВНОЕ РАСПИСАНИЕ ======================
+def resource_interval_bounds(resource):
+    """(мин, макс) интервал опроса ресурса в секундах: поля ресурса или значения из env."""
+    min_minutes = float(resource.get('min_interval_minutes') or SCHEDULE_MIN_INTERVAL_MINUTES)
+    max_minutes = float(resource.get('max_interval_minutes') or SCHEDULE_MAX_INTERVAL_MINUTES)
+    return min_minutes * 60, max(min_minutes, max_minutes) * 60
+
+def update_adaptive_interval(state, resource, changed, now=None):
+    """
+    Интервал подстраивается под наблюдаемую частоту изменений источника: храним EMA промежутка
+    между появлениями новых статей и опрашиваем примерно дважды за этот промежуток.
+    Пока изменений нет, интервал только растёт; changed=None (ошибка) — интервал не трогаем.
+    """
+    now = now or time.time()
+    min_s, max_s = resource_interval_bounds(resource)
+    schedule = state.setdefault('schedule', {})
+    interval = schedule.get('interval') or min_s
+
+    if changed:
+        last_change = schedule.get('last_change_at')
+        if last_change:
+            gap = now - last_change
+            ema = schedule.get('change_gap_ema')
+            schedule['change_gap_ema'] = gap if ema is None else ema * (1 - SCHEDULE_EMA_ALPHA) + gap * SCHEDULE_EMA_ALPHA
+        schedule['last_change_at'] = now
+        ema = schedule.get('change_gap_ema')
+        interval = ema / 2 if ema else min_s
+    elif changed is False:
+        estimates = [v for v in (schedule.get('change_gap_ema'),
+                                 now - schedule['last_change_at'] if schedule.get('last_change_at') else None) if v]
+        interval = max(interval, max(estimates) / 2 if estimates else interval * 1.5)
+
+    interval = min(max(interval, min_s), max_s)
+    schedule['interval'] = interval
+    return interval
+
+def with_jitter(seconds):
+    return seconds * (1 + random.uniform(-SCHEDULE_JITTER, SCHEDULE_JITTER))
+
+def resource_job_id(name):
+    return f"resource:{name}"
+
+def schedule_resource_job(name, delay_seconds):
+    run_at = datetime.now() + timedelta(seconds=delay_seconds)
+    scheduler.add_job(
+        run_resource_job,
+        trigger='date',
+        run_date=run_at,
+        args=[name],
+        id=resource_job_id(name),
+        name=f"Парсинг {name}",
+        replace_existing=True,
+        max_instances=1,
+        misfire_grace_time=None  # Опоздавший запуск всё равно выполняем
+    )
+    resource_state.setdefault(name, {}).setdefault('schedule', {})['next_run_at'] = run_at.timestamp()
+
+def build_resource_message(name, report):
+    """Сообщение по одному ресурсу: только новые статьи или ошибка — без повторов старого."""
+    if name in report['errors']:
+        # Строки есть, только если ошибка новая (первая, сменила класс или ресурс отключён)
+        return "\n".join(report['lines']) or None
+    message = f"✅ {name} снова доступен\n\n" if name in report['recovered'] else ""
+    if report['new_articles']:
+        message += f"<b>🆕 Новые статьи ({len(report['new_articles'])} шт.)</b>\n" + format_new_articles(report['new_articles'])
+    return message.strip() or None
+
+async def run_resource_job(name):
+    global resources
+    try:
+        resources = await asyncio.to_thread(load_resources)
+        resource = next((r for r in resources if r['name'] == name), None)
+        if resource is None or resource.get('paused', False):
+            logger.info(f"Ресурс {name} удалён или на паузе — задача снята")
+            return
+
+        started = time.perf_counter()
+        with tracing.cycle('resource', resources=1):
+            report = await crawl_and_collect([resource])
+        metrics.CYCLE_SECONDS.labels('resource').observe(time.perf_counter() - started)
+        if name in report['errors']:
+            changed = None
+        else:
+            changed = bool(report['new_by_resource'].get(name))
+        state = resource_state.setdefault(name, {})
+        interval = update_adaptive_interval(state, resource, changed)
+        # Отключённый после ошибок ресурс ждёт, пока не выйдет пауза (у неё свой разброс)
+        delay = max(with_jitter(interval), circuit_breaker.retry_delay(state))
+        schedule_resource_job(name, delay)
+        await save_resource_state(resource_state)
+        logger.info(f"{name}: {'есть новые' if changed else 'без новых'}, следующий запуск через {delay / 60:.1f} мин")
+
+        message = build_resource_message(name, report)
+        if message:
+            await send_telegram_message(message)
+    except Exception as e:
+        error_msg = f"Ошибка в задаче ресурса {name}: {str(e)}\n{traceback.format_exc()}"
+        logger.error(error_msg)
+        await send_error_to_telegram(error_msg)
+        # Задача не должна пропасть из расписания из-за ошибки
+        if scheduler.get_job(resource_job_id(name)) is None:
+            schedule_resource_job(name, with_jitter(SCHEDULE_MIN_INTERVAL_MINUTES * 60))
+
+async def sync_resource_jobs():
+    """Сверяет задачи планировщика с resources.json: новые ресурсы ставит, удалённые/на паузе снимает."""
+    global resources
+    resources = await asyncio.to_thread(load_resources)
+    active = {r['name'] for r in resources if not r.get('paused', False)}
+
+    for job in scheduler.get_jobs():
+        if job.id.startswith('resource:') and job.id[len('resource:'):] not in active:
+            job.remove()
+            logger.info(f"Снята задача {job.id}")
+
+    now = time.time()
+    new_count = 0
+    for name in sorted(active):
+        if scheduler.get_job(resource_job_id(name)) is not None:
+            continue
+        next_run_at = resource_state.get(name, {}).get('schedule', {}).get('next_run_at')
+        if next_run_at and next_run_at > now:
+            delay = next_run_at - now
+        else:
+            # Первые запуски разносим по времени, чтобы не стартовать всё разом
+            delay = 30 + random.uniform(0, min(120, 5 * len(active)))
+        schedule_resource_job(name, delay)
+        new_count += 1
+    if new_count:
+        logger.info(f"Запланировано задач ресурсов: {new_count}")
+
+def resource_health_view():
+    """{имя ресурса: здоровье для веб-интерфейса}; ресурсы, которые ещё не проверялись, не попадают."""
+    def fmt(ts):
+        return datetime.fromtimestamp(ts).strftime('%d.%m %H:%M') if ts else None
+
+    view = {}
+    for name, state in list(resource_state.items()):
+        health = state.get('health')
+        if health is None:
+            continue
+        view[name] = {
+            'status': circuit_breaker.status(state),
+            'failures': health.get('consecutive_failures', 0),
+            'error_class': health.get('error_class'),
+            'last_error': health.get('last_error'),
+            'last_success': fmt(health.get('last_success_at')),
+            'retry_at': fmt(health.get('retry_at')),
+        }
+    return view
+
+def resource_next_runs():
+    """{имя ресурса: (время следующего запуска, текущий интервал в минутах)} для веб-интерфейса."""
+    runs = {}
+    if not ADAPTIVE_SCHEDULING:
+        job = scheduler.get_job('auto_parse_job')
+        next_time = job.next_run_time if job else None
+        return {r['name']: (next_time, PARSER_INTERVAL_MINUTES) for r in resources}
+    for job in scheduler.get_jobs():
+        if job.id.startswith('resource:'):
+            name = job.id[len('resource:'):]
+            interval = resource_state.get(name, {}).get('schedule', {}).get('interval')
+            runs[name] = (job.next_run_time, round(interval / 60) if interval else None)
+    return runs
+
 # ====================== ПЛАНИРОВЩИК ======================
 scheduler = AsyncIOScheduler()
 
@@ -418,38 +1559,114 @@ def job_error_listener(event):
 
 scheduler.add_listener(job_error_listener, EVENT_JOB_ERROR)
 
-scheduler.add_job(
-    run_auto_parse,
-    trigger='interval',
-    minutes=PARSER_INTERVAL_MINUTES,
-    next_run_time=datetime.now() + timedelta(seconds=30),
-    id='auto_parse_job',
-    max_instances=1,
-    coalesce=True
-)
+def job_submitted_listener(event):
+    # Насколько позже запланированного стартовала задача (занятый loop, misfire и т.п.)
+    for run_time in event.scheduled_run_times:
+        metrics.SCHEDULER_LAG_SECONDS.observe(max(0.0, (datetime.now(run_time.tzinfo) - run_time).total_seconds()))
+
+scheduler.add_listener(job_submitted_listener, EVENT_JOB_SUBMITTED)
+
+# ====================== МЕТРИКИ ======================
+# Состояние процесса, читается при каждом сборе /metrics
+metrics.gauge('fe_articles_browsers_alive', 'Живых браузеров в пуле', lambda: browser_pool.stats()['browsers_alive'])
+metrics.gauge('fe_articles_browser_contexts_active', 'Открытых контекстов браузера', lambda: browser_pool.stats()['contexts_active'])
+metrics.gauge('fe_articles_browser_tree_rss_mb', 'Память процесса вместе с браузерами, МБ', process_tree_rss_mb)
+metrics.gauge('fe_articles_telegram_queue_size', 'Сообщений в очереди Telegram', telegram_queue.qsize)
+metrics.gauge('fe_articles_telegram_dropped', 'Сообщений, которые так и не удалось отправить', lambda: telegram_queue.failed)
+metrics.gauge('fe_articles_seen_set_size', 'Отпечатков URL в памяти', lambda: len(seen_set))
+metrics.gauge('fe_articles_page_cache_bytes', 'Объём кэша страниц на диске', lambda: page_cache.stats()['bytes'])
+metrics.gauge('fe_articles_resources_active', 'Ресурсов не на паузе', lambda: sum(1 for r in resources if not r.get('paused', False)))
+metrics.gauge('fe_articles_crawl_workers_alive', 'Живых процессов-воркеров обхода', lambda: crawl_workers.stats()['workers_alive'])
+metrics.gauge('fe_articles_crawl_worker_tasks', 'Ресурсов в работе у воркеров', lambda: crawl_workers.stats()['tasks_in_flight'])
+metrics.labeled_gauge('fe_articles_startup_seconds', 'Длительность фаз старта процесса', ['phase'],
+                      lambda: [((name,), seconds) for name, seconds in startup_phases])
+
+def resource_health_values(field):
+    """[(имя ресурса,), значение] для метрик здоровья; читается из потока /metrics, поэтому через копию."""
+    values = []
+    for name, state in list(resource_state.items()):
+        health = state.get('health')
+        if health is None:
+            continue
+        if field == 'circuit_open':
+            values.append(((name,), 1 if circuit_breaker.status(state) == 'open' else 0))
+        elif health.get(field) is not None:
+            values.append(((name,), health[field]))
+    return values
+
+metrics.labeled_gauge('fe_articles_resource_consecutive_failures', 'Ошибок подряд у ресурса', ['resource'],
+                      lambda: resource_health_values('consecutive_failures'))
+metrics.labeled_gauge('fe_articles_resource_last_success_timestamp', 'Время последней успешной проверки ресурса (unix)', ['resource'],
+                      lambda: resource_health_values('last_success_at'))
+metrics.labeled_gauge('fe_articles_resource_circuit_open', '1 — ресурс отключён после ошибок подряд', ['resource'],
+                      lambda: resource_health_values('circuit_open'))
+
+if ADAPTIVE_SCHEDULING:
+    # У каждого ресурса своя задача; эта только сверяет их список с базой ресурсов
+    scheduler.add_job(
+        sync_resource_jobs,
+        trigger='interval',
+        seconds=60,
+        next_run_time=datetime.now() + timedelta(seconds=5),
+        id='sync_resource_jobs',
+        max_instances=1,
+        coalesce=True
+    )
+else:
+    scheduler.add_job(
+        run_auto_parse,
+        trigger='interval',
+        minutes=PARSER_INTERVAL_MINUTES,
+        next_run_time=datetime.now() + timedelta(seconds=30),
+        id='auto_parse_job',
+        max_instances=1,
+        coalesce=True
+    )
 
 # ====================== СТАРТОВОЕ СООБЩЕНИЕ ======================
+def report_startup():
+    """Разбивка времени старта по фазам и память процесса — в лог (и в метрику через startup_phases)."""
+    import psutil
+    process = psutil.Process()
+    since_exec = time.time() - process.create_time()  # Вместе с запуском интерпретатора
+    phases = ", ".join(f"{name} {seconds:.2f}" for name, seconds in startup_phases)
+    logger.info(f"Старт за {sum(s for _, s in startup_phases):.2f} сек (с запуска процесса {since_exec:.2f}): {phases}; "
+                f"RSS {process.memory_info().rss / 1048576:.0f} МБ")
+
 async def send_startup_message():
+    if ADAPTIVE_SCHEDULING:
+        # Первые запуски sync_resource_jobs разносит на 30–150 сек, ресурсы с сохранённым расписанием продолжают его
+        schedule_text = ("Первые проверки ресурсов — в течение 2–3 минут, у каждого ресурса отдельно; "
+                         "новые статьи приходят по ресурсам, без общей сводки\n"
+                         f"Далее каждый ресурс по своему расписанию: от {SCHEDULE_MIN_INTERVAL_MINUTES} "
+                         f"до {SCHEDULE_MAX_INTERVAL_MINUTES} минут, в зависимости от частоты публикаций ✅")
+    else:
+        schedule_text = ("Первое сообщение — через 30 секунд\n"
+                         f"Далее — каждые {PARSER_INTERVAL_MINUTES} минут ✅")
     await send_telegram_message(
         "<b>Парсер запущен!</b>\n\n"
-        "Первое сообщение — через 30 секунд\n"
-        f"Далее — каждые {PARSER_INTERVAL_MINUTES} минут ✅"
+        f"{schedule_text}"
     )
     logger.info("Стартовое сообщение отправлено")
 
 # ====================== ASGI + Hypercorn ======================
-from hypercorn.config import Config
-from hypercorn.asyncio import serve
-
 async def run_scheduler_and_bot():
     try:
         await init_bot()
+        startup_phase('telegram')
+
+        telegram_queue.start()
 
         logger.info("Запуск планировщика APScheduler...")
         scheduler.start()
+        startup_phase('scheduler')
+        report_startup()
 
         await send_startup_message()
-        logger.info(f"Планировщик активен: первое сообщение через 30 сек, потом каждые {PARSER_INTERVAL_MINUTES} мин")
+        if ADAPTIVE_SCHEDULING:
+            logger.info(f"Планировщик активен: задачи по ресурсам, интервал {SCHEDULE_MIN_INTERVAL_MINUTES}–{SCHEDULE_MAX_INTERVAL_MINUTES} мин")
+        else:
+            logger.info(f"Планировщик активен: первое сообщение через 30 сек, потом каждые {PARSER_INTERVAL_MINUTES} мин")
 
         while True:
             await asyncio.sleep(3600)
@@ -465,10 +1682,31 @@ def on_exit():
     asyncio.set_event_loop(loop)
     loop.run_until_complete(send_error_to_telegram(error_msg))
 
-atexit.register(on_exit)
-
 async def main():
+    global main_loop
     try:
+        main_loop = asyncio.get_running_loop()
+        try:
+            await asyncio.to_thread(article_store.migrate_from_json, LAST_RESULTS_FILE, DATA_FILE)
+            await asyncio.to_thread(article_store.recanonicalize, CANONICAL_VERSION)
+            await asyncio.to_thread(warm_seen_set)
+        except Exception as e:
+            logger.error(f"Ошибка подготовки базы статей: {e}")
+        startup_phase('article_store')
+        if CRAWL_WORKERS > 0:
+            # Браузеры у воркеров; здесь пул поднимется сам, только если понадобится /debug
+            await crawl_workers.start()
+            startup_phase('crawl_workers')
+        elif BROWSER_PRESTART:
+            try:
+                await browser_pool.start()
+            except Exception as e:
+                # Не валим UI и бота: пул попробует подняться при первом запросе страницы
+                logger.error(f"Не удалось запустить пул браузеров: {e}")
+            startup_phase('browsers')
+
+        from hypercorn.config import Config
+        from hypercorn.asyncio import serve
         config = Config()
         config.bind = ["0.0.0.0:5000"]
         config.use_reloader = False
@@ -483,6 +1721,12 @@ async def main():
         error_msg = f"Критическая ошибка в main: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_msg)
         await send_error_to_telegram(error_msg)
+    finally:
+        await telegram_queue.stop()
+        await crawl_workers.stop()
+        await close_http_client()
+        await browser_pool.stop()
+        article_store.close()
 
 # ==================== HTML + РОУТ ====================
 HTML = '''
@@ -497,7 +1741,7 @@ HTML = '''
         .container { display: flex; gap: 20px; flex-wrap: wrap; }
         .left { flex: 1; min-width: 300px; background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
         .right { flex: 2; min-width: 300px; background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
-        input, button { width: 100%; padding: 12px; margin: 10px 0; font-size: 16px; border: 1px solid #ccc; border-radius: 4px; box-sizing: border-box; }
+        input, select, button { width: 100%; padding: 12px; margin: 10px 0; font-size: 16px; border: 1px solid #ccc; border-radius: 4px; box-sizing: border-box; }
         button { background: #007bff; color: white; cursor: pointer; }
         button:hover { background: #0056b3; }
         .btn-small { padding: 8px 12px; font-size: 14px; width: auto; display: inline-block; margin: 0 5px; }
@@ -520,11 +1764,23 @@ HTML = '''
         <div class="left">
             <h2>Сохранённые ресурсы</h2>
             <button onclick="location.href='/?new=1'">+ Новый ресурс</button>
+            <button onclick="location.href='/search'" style="background: #6c757d;">Поиск по статьям</button>
             {% if resources %}
                 {% for r in resources %}
                 <div class="resource-item">
                     <strong>{{ r.name }}</strong><br>
-                    <small>{{ r.url }}</small>
+                    <small>{{ r.url }}</small><br>
+                    <small>Загрузка: {{ r.fetch_mode or 'auto' }}{% if r.fetch_mode == 'auto' and r.resolved_fetch_mode %} → {{ r.resolved_fetch_mode }}{% endif %}</small><br>
+                    {% set run = next_runs.get(r.name) %}
+                    <small>{% if r.paused %}Не запускается (пауза){% elif run and run[0] %}Следующий запуск: {{ run[0].strftime('%d.%m %H:%M') }}{% if run[1] %} · раз в ~{{ run[1] }} мин{% endif %}{% else %}Ещё не запланирован{% endif %}</small><br>
+                    {% set h = health.get(r.name) %}
+                    {% if h %}
+                    <small{% if h.status != 'ok' %} style="color: #c82333;" title="{{ h.last_error }}"{% endif %}>
+                        {% if h.status == 'ok' %}✅ Работает{% elif h.status == 'open' %}⛔ Отключён до {{ h.retry_at }}{% elif h.status == 'probing' %}⏳ Отключение истекло, ждёт проверки{% else %}⚠️ Ошибки{% endif %}
+                        {% if h.failures %} · ошибок подряд: {{ h.failures }} ({{ h.error_class }}){% endif %}
+                        {% if h.last_success %} · успех: {{ h.last_success }}{% endif %}
+                    </small>
+                    {% endif %}
                     <div style="margin-top: 8px;">
                         <button class="btn-small" onclick="parseSaved({{ loop.index0 }})">Спарсить</button>
                         <button class="btn-small" onclick="editResource({{ loop.index0 }})">Редактировать</button>
@@ -552,6 +1808,22 @@ HTML = '''
                 <input type="text" name="item_selector" placeholder="Селектор айтема" value="{{ resource.item_selector if resource else '' }}" required>
                 <input type="text" name="title_selector" placeholder="Селектор заголовка" value="{{ resource.title_selector if resource else '' }}" required>
                 <input type="text" name="link_selector" placeholder="Селектор ссылки" value="{{ resource.link_selector if resource else '' }}" required>
+                {% set fetch_mode = resource.fetch_mode if resource and resource.fetch_mode else 'auto' %}
+                <select name="fetch_mode" title="Способ загрузки страницы">
+                    <option value="auto" {% if fetch_mode == 'auto' %}selected{% endif %}>Авто: HTTP, браузер если не нашли статьи</option>
+                    <option value="http" {% if fetch_mode == 'http' %}selected{% endif %}>Только HTTP (без браузера)</option>
+                    <option value="browser" {% if fetch_mode == 'browser' %}selected{% endif %}>Только браузер</option>
+                </select>
+                {% set wait_policy = resource.wait_policy if resource and resource.wait_policy else '' %}
+                <select name="wait_policy" title="Чего ждать в браузере после загрузки страницы">
+                    <option value="" {% if not wait_policy %}selected{% endif %}>Ожидание в браузере: по умолчанию ({{ default_wait_policy }})</option>
+                    <option value="selector" {% if wait_policy == 'selector' %}selected{% endif %}>Пока не появятся статьи (item_selector)</option>
+                    <option value="networkidle" {% if wait_policy == 'networkidle' %}selected{% endif %}>Пока не затихнет сеть</option>
+                    <option value="delay" {% if wait_policy == 'delay' %}selected{% endif %}>Фиксированная пауза</option>
+                </select>
+                <input type="text" name="allow_url_patterns" placeholder="Не блокировать URL, содержащие (через запятую) — для сайтов, которым нужен свой JS" value="{{ resource.allow_url_patterns|join(', ') if resource and resource.allow_url_patterns else '' }}">
+
+                <label style="display: block; margin: 10px 0;"><input type="checkbox" name="force_refresh" value="1" style="width: auto; margin-right: 8px;">Загрузить заново (без кэша страниц)</label>
 
                 <div style="margin: 15px 0; display: flex; gap: 10px; flex-wrap: wrap;">
                     <button type="submit" name="action" value="parse" style="background: #28a745;">Парсить сейчас</button>
@@ -562,6 +1834,21 @@ HTML = '''
 
             {% if error %}<div class="error">{{ error }}</div>{% endif %}
             {% if success %}<div class="success">{{ success }}</div>{% endif %}
+            {% if job and job.status == 'pending' %}
+                <div class="success" id="previewStatus">Парсинг выполняется в фоне… <span id="previewElapsed"></span></div>
+                <script>
+                    (function poll() {
+                        fetch('/preview/{{ job.id }}').then(r => r.json()).then(j => {
+                            if (j.status === 'pending') {
+                                document.getElementById('previewElapsed').textContent = j.elapsed + ' сек';
+                                setTimeout(poll, 2000);
+                            } else {
+                                location.reload();
+                            }
+                        }).catch(() => setTimeout(poll, 5000));
+                    })();
+                </script>
+            {% endif %}
 
             {% if table %}
                 <h3>Результат парсинга ({{ count }} статей)</h3>
@@ -605,15 +1892,39 @@ DEBUG_HTML = '''
     <h2>Debug: Введите URL для получения HTML</h2>
     <form method="post">
         <input type="text" name="url" placeholder="URL страницы" value="{{ url if url else '' }}" required>
-        <button type="submit">Получить HTML</button>
+        <label><input type="checkbox" name="force_refresh" value="1" style="width: auto; margin-right: 8px;">Загрузить заново (без кэша страниц)</label>
+        <button type="submit" name="action" value="fetch">Получить HTML</button>
+
+        <h3>Проверка селекторов на сохранённом снимке</h3>
+        <input type="text" name="item_selector" placeholder="Селектор элемента" value="{{ selectors.item_selector }}">
+        <input type="text" name="title_selector" placeholder="Селектор заголовка" value="{{ selectors.title_selector }}">
+        <input type="text" name="link_selector" placeholder="Селектор ссылки" value="{{ selectors.link_selector }}">
+        <button type="submit" name="action" value="test" style="background: #007bff;">Проверить селекторы (без загрузки)</button>
     </form>
 
     {% if error %}<div class="error">{{ error }}</div>{% endif %}
 
+    {% if snapshot %}
+        <div class="success">Снимок: {{ snapshot.via }}, {{ ((now - snapshot.fetched_at) / 60)|round(1) }} мин назад, {{ html_length }} символов</div>
+    {% endif %}
+    {% if table %}
+        <h3>Найдено {{ count }} статей</h3>
+        {{ table|safe }}
+    {% endif %}
+
     {% if html %}
         <h3>HTML код страницы ({{ html_length }} символов)</h3>
         <pre>{{ html }}</pre>
     {% endif %}
+
+    {% if snapshots %}
+        <h3>Кэш страниц ({{ cache_stats.entries }} шт., {{ (cache_stats.bytes / 1048576)|round(1) }} МБ, попаданий {{ cache_stats.hits }}, промахов {{ cache_stats.misses }})</h3>
+        <ul>
+            {% for s in snapshots %}
+                <li><small>{{ s.via }} · {{ ((now - s.fetched_at) / 60)|round(1) }} мин назад · {{ s.length }} символов</small> — {{ s.url }}</li>
+            {% endfor %}
+        </ul>
+    {% endif %}
 </body>
 </html>
 '''
@@ -626,19 +1937,46 @@ def debug():
     html = None
     html_length = 0
 
+    selectors = {key: '' for key in ('item_selector', 'title_selector', 'link_selector')}
+    snapshot = table = count = None
+
     if request.method == 'POST':
         url = request.form['url'].strip()
-        try:
-            html = asyncio.run(get_page_html(url))
-            if 'Ошибка' in html:
-                error = html
-                html = None
+        selectors = {key: request.form.get(key, '').strip() for key in selectors}
+        if request.form.get('action') == 'test':
+            # Селекторы проверяются на последнем сохранённом снимке — страница не загружается
+            cached = page_cache.latest(url)
+            if cached is None:
+                error = "Нет сохранённого снимка этой страницы — сначала получите HTML"
+            elif not all(selectors.values()):
+                error = "Укажите все три селектора"
             else:
+                html, snapshot = cached
                 html_length = len(html)
-        except Exception as e:
-            error = f"Ошибка получения HTML: {str(e)}"
+                try:
+                    data = extract_articles(html, {"url": url, **selectors}, limit=20)
+                    count = len(data)
+                    if data:
+                        table = articles_table(data)
+                    else:
+                        error = "Ничего не найдено по указанным селекторам"
+                except Exception as e:
+                    error = f"Ошибка извлечения: {str(e)}"
+                html = None
+        else:
+            try:
+                html = run_on_main_loop(get_page_html(url, force_refresh=bool(request.form.get('force_refresh'))))
+                if 'Ошибка' in html:
+                    error = html
+                    html = None
+                else:
+                    html_length = len(html)
+            except Exception as e:
+                error = f"Ошибка получения HTML: {str(e)}"
 
-    return render_template_string(DEBUG_HTML, url=url, error=error, html=html, html_length=html_length)
+    return render_template_string(DEBUG_HTML, url=url, error=error, html=html, html_length=html_length,
+                                  selectors=selectors, snapshot=snapshot, table=table, count=count,
+                                  snapshots=page_cache.snapshots(20), cache_stats=page_cache.stats(), now=time.time())
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -678,6 +2016,9 @@ def index():
             "item_selector": request.form['item_selector'].strip(),
             "title_selector": request.form['title_selector'].strip(),
             "link_selector": request.form['link_selector'].strip(),
+            "fetch_mode": request.form.get('fetch_mode', 'auto') if request.form.get('fetch_mode') in FETCH_MODES else 'auto',
+            "allow_url_patterns": split_list(request.form.get('allow_url_patterns', '')),
+            "wait_policy": request.form.get('wait_policy') if request.form.get('wait_policy') in WAIT_POLICIES else None,
             "paused": False
         }
 
@@ -685,8 +2026,13 @@ def index():
 
         if action == "save":
             if edit_idx and edit_idx.isdigit() and int(edit_idx) < len(resources):
-                old_name = resources[int(edit_idx)]['name']
-                resources[int(edit_idx)] = current_form
+                old = resources[int(edit_idx)]
+                old_name = old['name']
+                # Поля, которых нет в форме (ручные настройки из resources.json), не теряем
+                merged = {**old, **current_form}
+                if old.get('url') != current_form['url'] or old.get('fetch_mode') != current_form['fetch_mode']:
+                    merged.pop('resolved_fetch_mode', None)
+                resources[int(edit_idx)] = merged
                 save_resources(resources)
                 success = f"Обновлён: {old_name} → {current_form['name']}"
             else:
@@ -696,30 +2042,285 @@ def index():
 
         elif action == "parse":
             resource = current_form
-
-            try:
-                data, parse_error = asyncio.run(parse_resource(current_form, limit=20))
-                if parse_error:
-                    error = f"Ошибка парсинга: {parse_error}"
-                elif not data:
+            if main_loop is None or not main_loop.is_running():
+                error = "Ошибка парсинга: главный event loop не запущен"
+            else:
+                # Парсинг идёт в фоне на главном loop, страница опрашивает /preview/<id>
+                job_id = preview_jobs.submit(current_form, main_loop, force=bool(request.form.get('force_refresh')))
+                return redirect(f"/?job={job_id}")
+
+    job = None
+    job_id = request.args.get('job')
+    if job_id and request.method == 'GET':
+        job = preview_jobs.get(job_id)
+        if job is None:
+            error = "Результат предпросмотра устарел — запустите парсинг ещё раз"
+        else:
+            resource = job['resource']
+            if job['status'] == 'error':
+                error = f"Ошибка парсинга: {job['error']}"
+            elif job['status'] == 'done':
+                if not job['data']:
                     error = "Ничего не найдено по указанным селекторам"
                 else:
-                    df = pd.DataFrame([{"Заголовок": art['title'], "Ссылка": f"<a href='{art['url']}'>{art['url']}</a>"} for art in data])
-                    table = df.to_html(escape=False, index=False)
-                    count = len(data)
-                    success = f"Успешно спаршено {len(data)} статей!"
-            except Exception as e:
-                error = f"Ошибка парсинга: {str(e)}"
+                    table = articles_table(job['data'])
+                    count = len(job['data'])
+                    success = f"Успешно спаршено {count} статей!"
 
     return render_template_string(HTML,
                                   resources=resources,
+                                  next_runs=resource_next_runs(),
+                                  health=resource_health_view(),
                                   resource=resource,
                                   edit_index=edit_index if 'edit_index' in locals() else None,
                                   error=error,
                                   success=success,
                                   table=table,
-                                  count=count)
+                                  count=count,
+                                  job=job,
+                                  default_wait_policy=BROWSER_WAIT_POLICY)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.route('/preview/<job_id>')
+def preview_status(job_id):
+    job = preview_jobs.get(job_id)
+    if job is None:
+        return jsonify({"id": job_id, "status": "unknown"}), 404
+    return jsonify({
+        "id": job['id'],
+        "status": job['status'],
+        "error": job['error'],
+        "count": len(job['data'] or []),
+        "articles": job['data'] or [],
+        "elapsed": round((job['finished_at'] or time.time()) - job['created_at'], 1),
+    })
+
+# ====================== ПОИСК ======================
+SEARCH_HTML = '''
+<!DOCTYPE html>
+<html lang="ru">
+<head>
+    <meta charset="UTF-8">
+    <title>Поиск по статьям</title>
+    <style>
+        body { font-family: Arial, sans-serif; max-width: 1200px; margin: 0 auto; padding: 20px; background: #f5f5f5; }
+        h2 { color: #333; }
+        form { display: flex; gap: 10px; flex-wrap: wrap; }
+        input, select, button { padding: 12px; margin: 10px 0; font-size: 16px; border: 1px solid #ccc; border-radius: 4px; box-sizing: border-box; }
+        input[name=q] { flex: 3; min-width: 300px; }
+        select { flex: 1; min-width: 150px; }
+        button { background: #007bff; color: white; cursor: pointer; }
+        button:hover { background: #0056b3; }
+        table { width: 100%; border-collapse: collapse; margin-top: 20px; background: white; }
+        th, td { padding: 12px; text-align: left; border-bottom: 1px solid #ddd; }
+        th { background: #007bff; color: white; }
+        mark { background: #fff3a3; }
+        .error { color: red; background: #ffe6e6; padding: 15px; border-radius: 5px; margin: 10px 0; }
+        .hint { color: #666; }
+    </style>
+</head>
+<body>
+    <h2>Поиск по собранным статьям</h2>
+    <form method="get">
+        <input type="text" name="q" placeholder='Слова, "точная фраза", префикс*' value="{{ params.q }}" autofocus>
+        <select name="source">
+            <option value="">Все источники</option>
+            {% for name in sources %}<option value="{{ name }}" {% if name == params.source %}selected{% endif %}>{{ name }}</option>{% endfor %}
+        </select>
+        <select name="order">
+            <option value="rank" {% if params.order == 'rank' %}selected{% endif %}>По релевантности</option>
+            <option value="recent" {% if params.order == 'recent' %}selected{% endif %}>Сначала новые</option>
+        </select>
+        <button type="submit">Найти</button>
+    </form>
+    <p class="hint"><a href="/">← К ресурсам</a> · JSON: <code>/api/search?q=...</code></p>
+
+    {% if error %}<div class="error">{{ error }}</div>{% endif %}
+    {% if params.q and not error %}
+        <p>Найдено на странице: {{ results|length }} ({{ took_ms }} мс)</p>
+        {% if results %}
+        <table>
+            <tr><th>Заголовок</th><th>Источник</th><th>Добавлена</th></tr>
+            {% for r in results %}
+            <tr>
+                <td><a href="{{ r.url }}" target="_blank">{{ r.highlighted|highlight }}</a></td>
+                <td>{{ r.source }}</td>
+                <td><small>{{ r.added }}</small></td>
+            </tr>
+            {% endfor %}
+        </table>
+        {% endif %}
+        <p>
+            {% if params.offset > 0 %}<a href="?{{ page_args(params.offset - params.limit) }}">← Назад</a>{% endif %}
+            {% if has_more %}<a href="?{{ page_args(params.offset + params.limit) }}">Дальше →</a>{% endif %}
+        </p>
+    {% endif %}
+</body>
+</html>
+'''
+
+@app.template_filter('highlight')
+def highlight_filter(text):
+    """Подсветка из ArticleStore.search: сначала экранирование, потом маркеры → <mark>."""
+    return Markup(str(escape(text)).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+def run_search(args):
+    """Общая часть /search и /api/search: (параметры, результаты, есть ли ещё, мс)."""
+    params = {
+        'q': args.get('q', '').strip(),
+        'source': args.get('source') or None,
+        'order': 'recent' if args.get('order') == 'recent' else 'rank',
+        'limit': min(max(1, args.get('limit', type=int) or SEARCH_PAGE_SIZE), SEARCH_MAX_PAGE_SIZE),
+        'offset': max(0, args.get('offset', type=int) or 0),
+    }
+    started = time.perf_counter()
+    results = article_store.search(params['q'], limit=params['limit'] + 1, offset=params['offset'],
+                                   source=params['source'], order=params['order'])
+    took_ms = round((time.perf_counter() - started) * 1000, 1)
+    return params, results[:params['limit']], len(results) > params['limit'], took_ms
+
+@app.route('/search')
+def search():
+    error = None
+    try:
+        params, results, has_more, took_ms = run_search(request.args)
+    except sqlite3.OperationalError as e:
+        params, results, has_more, took_ms = run_search({})
+        error = f"Не удалось разобрать запрос: {e}"
+    for r in results:
+        r['added'] = datetime.fromtimestamp(r['first_seen']).strftime('%d.%m.%Y %H:%M')
+
+    def page_args(offset):
+        return urlencode({**{k: v for k, v in params.items() if k in ('q', 'source', 'order') and v}, 'offset': offset})
+
+    return render_template_string(SEARCH_HTML, results=results, has_more=has_more, took_ms=took_ms, error=error,
+                                  sources=sorted(r['name'] for r in resources), page_args=page_args, params=params)
+
+@app.route('/api/search')
+def search_api():
+    """?q= (слова, "фраза", префикс*), source, order=rank|recent, limit, offset."""
+    try:
+        params, results, has_more, took_ms = run_search(request.args)
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": f"не удалось разобрать запрос: {e}"}), 400
+    return jsonify({
+        "query": params['q'],
+        "results": [
+            feed_article({k: r[k] for k in ('id', 'source', 'title', 'url', 'first_seen')}) for r in results
+        ],
+        "has_more": has_more,
+        "took_ms": took_ms,
+    })
+
+# ====================== API СТАТЕЙ ======================
+def parse_feed_time(value):
+    """unix-время или ISO 8601 (дата или дата со временем; без зоны — местное время, как в интерфейсе)."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        raise ValueError(f"некорректное время: {value!r}") from None
+
+def feed_query(args, default_limit):
+    """Параметры ленты из query string; ValueError — ответить 400."""
+    cursor = args.get('cursor') or args.get('after')
+    sources = [name for value in args.getlist('source') for name in split_list(value)]
+    limit = args.get('limit', type=int) or default_limit
+    return {
+        'after': decode_cursor(cursor) if cursor else None,
+        'sources': sorted(set(sources)) or None,
+        'since': parse_feed_time(args['since']) if args.get('since') else None,
+        'until': parse_feed_time(args['until']) if args.get('until') else None,
+        'limit': min(max(1, limit), FEED_MAX_PAGE_SIZE) if limit else None,
+    }
+
+def feed_etag(kind, query):
+    """ETag по ревизии базы и параметрам: пока статей не добавилось и не удалилось, клиент получает 304."""
+    key = json.dumps([kind, query, article_store.revision()], sort_keys=True, default=str)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+def feed_article(article):
+    return {**article, 'first_seen': datetime.fromtimestamp(article['first_seen'], timezone.utc).isoformat(timespec='seconds')}
+
+def feed_not_modified(etag):
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def feed_ndjson(query, etag):
+    """Все подходящие статьи строками JSON; у каждой свой cursor — с него клиент продолжит после обрыва."""
+    def generate():
+        after, left = query['after'], query['limit']
+        while left is None or left > 0:
+            batch = min(FEED_STREAM_BATCH, left) if left is not None else FEED_STREAM_BATCH
+            articles = article_store.feed(after, batch, query['sources'], query['since'], query['until'])
+            for article in articles:
+                yield json.dumps(feed_article(article), ensure_ascii=False) + '\n'
+            if len(articles) < batch:
+                return
+            after = (articles[-1]['first_seen'], articles[-1]['id'])
+            if left is not None:
+                left -= len(articles)
+
+    response = Response(generate(), content_type='application/x-ndjson; charset=utf-8')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/articles')
+@app.route('/api/articles.ndjson', endpoint='articles_feed_ndjson')
+def articles_feed():
+    """
+    Собранные статьи в порядке добавления. Страница JSON: ?limit=&cursor=, в ответе next_cursor
+    (при пустой странице — тот же курсор: опрашивать дальше с него). NDJSON (/api/articles.ndjson,
+    ?format=ndjson или Accept: application/x-ndjson) — поток всех статей после курсора.
+    Фильтры: source (можно несколько или через запятую), since/until — unix-время или ISO 8601.
+    """
+    ndjson = (request.endpoint == 'articles_feed_ndjson' or request.args.get('format') == 'ndjson'
+              or request.accept_mimetypes.best == 'application/x-ndjson')
+    try:
+        query = feed_query(request.args, None if ndjson else FEED_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    etag = feed_etag('ndjson' if ndjson else 'page', query)
+    not_modified = feed_not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    if ndjson:
+        return feed_ndjson(query, etag)
+
+    articles = article_store.feed(query['after'], query['limit'] + 1, query['sources'], query['since'], query['until'])
+    has_more = len(articles) > query['limit']
+    articles = articles[:query['limit']]
+    next_cursor = articles[-1]['cursor'] if articles else request.args.get('cursor') or request.args.get('after')
+    response = jsonify({
+        "articles": [feed_article(a) for a in articles],
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    if has_more:
+        args = request.args.to_dict(flat=False)
+        args.pop('after', None)
+        args['cursor'] = [next_cursor]
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args, doseq=True)}>; rel="next"'
+    return response
+
+startup_phase('module')  # Настройки, состояние ресурсов, планировщик, маршруты
 
 if __name__ == '__main__':
+    # Только в главном процессе: воркеры обхода импортируют этот модуль заново и не должны слать «завершается»
+    atexit.register(on_exit)
     logger.info("=== ЗАПУСК ПАРСЕРА (Flask + Async Scheduler) ===")
     asyncio.run(main())
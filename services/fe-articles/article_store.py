@@ -0,0 +1,431 @@
+# article_store.py — хранилище статей в SQLite (WAL) вместо last_results.json
+
+import base64
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('fe_articles.article_store')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    url TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    title TEXT NOT NULL,
+    url TEXT NOT NULL,
+    canonical_url TEXT NOT NULL,
+    first_seen REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_articles_source_canonical ON articles(source_id, canonical_url);
+CREATE INDEX IF NOT EXISTS idx_articles_first_seen ON articles(first_seen);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Полнотекстовый индекс по заголовкам, URL и источникам; триггеры держат его в актуальном состоянии
+# при любой вставке, удалении (срок хранения) и правке статей. FTS_VERSION поднять при смене схемы индекса.
+FTS_VERSION = 1
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, url, source, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, url, source)
+    SELECT new.id, new.title, new.url, name FROM sources WHERE id = new.source_id;
+END;
+CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN
+    DELETE FROM articles_fts WHERE rowid = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS articles_fts_update AFTER UPDATE OF title, url ON articles BEGIN
+    UPDATE articles_fts SET title = new.title, url = new.url WHERE rowid = new.id;
+END;
+"""
+
+# Маркеры подсветки совпадений в заголовке: в HTML превращаются в <mark> уже после экранирования
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+_QUERY_TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def fts_query(text):
+    """
+    Запрос пользователя → выражение MATCH: слова через «и», "фраза" целиком, слово* — по префиксу.
+    Каждый терм берётся в кавычки, поэтому операторы и спецсимволы FTS5 во вводе ничего не ломают.
+    """
+    terms = []
+    for phrase, word in _QUERY_TERM_RE.findall(text or ''):
+        prefix = word.endswith('*')
+        term = (phrase or word.rstrip('*')).strip()
+        if not re.search(r'\w', term):
+            continue  # Один знак препинания — пустая фраза, FTS5 её не примет
+        terms.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def identity_url(source, url):
+    return url
+
+
+def encode_cursor(first_seen, article_id):
+    """Непрозрачный курсор ленты: позиция статьи в порядке добавления (first_seen, id)."""
+    raw = f"{first_seen!r}:{article_id}".encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(first_seen, id) из курсора; ValueError, если курсор испорчен."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        first_seen, article_id = raw.split(':')
+        return float(first_seen), int(article_id)
+    except Exception:
+        raise ValueError(f"некорректный курсор: {cursor!r}") from None
+
+
+class ArticleStore:
+    """
+    Статьи по источникам с уникальным индексом (источник, канонический URL).
+    Соединение одно на процесс, доступ под блокировкой — методы можно звать из потоков.
+    """
+
+    def __init__(self, path, retention_days=0, canonicalize=None):
+        # canonicalize(source, url) -> ключ дедупа; правила могут отличаться по ресурсам
+        self.path = path
+        self.retention_days = retention_days
+        self.canonicalize = canonicalize or identity_url
+        self._conn = None
+        self._lock = threading.RLock()
+        self._source_ids = {}
+        self._new_source_ids = {}  # Вставлены в текущей транзакции — в кэш только после фиксации
+        self._revision = None
+        self._last_seen = 0.0  # Наибольший выданный first_seen — лента не должна получать статьи «в прошлое»
+        self.fts = False  # SQLite без FTS5 — поиск через LIKE
+
+    # ---------- соединение ----------
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._init_fts(conn)
+            self._last_seen = conn.execute("SELECT COALESCE(MAX(first_seen), 0) FROM articles").fetchone()[0]
+            self._conn = conn
+            logger.info(f"Открыта база статей {self.path}")
+        return self._conn
+
+    def _init_fts(self, conn):
+        try:
+            conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 недоступен ({e}) — поиск по статьям будет медленным (LIKE)")
+            return
+        self.fts = True
+        row = conn.execute("SELECT value FROM meta WHERE key = 'fts_version'").fetchone()
+        if row and row[0] == str(FTS_VERSION):
+            return
+        # Первый запуск с индексом: статьи, собранные до него, индексируются одним запросом
+        started = time.perf_counter()
+        with conn:
+            conn.execute("DELETE FROM articles_fts")
+            conn.execute(
+                "INSERT INTO articles_fts (rowid, title, url, source) "
+                "SELECT a.id, a.title, a.url, s.name FROM articles a JOIN sources s ON s.id = a.source_id"
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fts_version', ?)", (str(FTS_VERSION),))
+        logger.info(f"Поисковый индекс построен: {conn.execute('SELECT COUNT(*) FROM articles_fts').fetchone()[0]} статей "
+                    f"за {time.perf_counter() - started:.1f} сек")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self._source_ids.clear()
+                self._new_source_ids.clear()
+                self._revision = None
+                self._last_seen = 0.0
+
+    def _next_seen_at(self, seen_at=None):
+        """
+        first_seen для новой записи (под self._lock): не меньше уже выданного. Иначе статья,
+        вставленная из другого потока чуть позже со старой отметкой (или после перевода часов назад),
+        окажется перед курсором (first_seen, id), который клиент ленты уже получил, и он её не увидит.
+        """
+        self._last_seen = max(seen_at or time.time(), self._last_seen)
+        return self._last_seen
+
+    def _bump_revision(self, conn):
+        # Удаления и правки не меняют MAX(id) — для ETag ленты их отмечает отдельный счётчик
+        conn.execute("INSERT INTO meta (key, value) VALUES ('revision', '1') "
+                     "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+        self._revision = None
+
+    @contextmanager
+    def _transaction(self, conn):
+        """with conn, после которого id новых источников попадают в кэш; при откате — забываются."""
+        try:
+            with conn:
+                yield
+        except BaseException:
+            self._new_source_ids.clear()
+            raise
+        self._source_ids.update(self._new_source_ids)
+        self._new_source_ids.clear()
+
+    def _source_id(self, conn, name, url=None):
+        """Только внутри _transaction: иначе id вставленного источника не попадёт в кэш."""
+        source_id = self._source_ids.get(name) or self._new_source_ids.get(name)
+        if source_id is None:
+            row = conn.execute("SELECT id FROM sources WHERE name = ?", (name,)).fetchone()
+            if row:
+                source_id = self._source_ids[name] = row[0]
+            else:
+                source_id = self._new_source_ids[name] = conn.execute(
+                    "INSERT INTO sources (name, url, created_at) VALUES (?, ?, ?)", (name, url, time.time())
+                ).lastrowid
+        return source_id
+
+    # ---------- дедуп и запись ----------
+    def insert_new(self, source, items, seen_at=None, canonical_urls=None):
+        """
+        Вставляет статьи одной транзакцией и возвращает только реально добавленные —
+        уникальный индекс решает, что новое, без предварительного SELECT.
+        canonical_urls — уже посчитанные ключи дедупа (по одному на статью), чтобы вызывающий
+        и база сравнивали один и тот же URL; без них — self.canonicalize.
+        """
+        if not items:
+            return []
+        if canonical_urls is None:
+            canonical_urls = [self.canonicalize(source, item['url']) for item in items]
+        inserted = []
+        with self._lock:
+            conn = self._connection()
+            seen_at = self._next_seen_at(seen_at)
+            with self._transaction(conn):
+                source_id = self._source_id(conn, source)
+                for item, canonical_url in zip(items, canonical_urls):
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO articles (source_id, title, url, canonical_url, first_seen) VALUES (?, ?, ?, ?, ?)",
+                        (source_id, item['title'], item['url'], canonical_url, seen_at)
+                    )
+                    if cursor.rowcount:
+                        inserted.append(item)
+        return inserted
+
+    def recent_keys(self, limit):
+        """(источник, канонический URL) последних limit статей — для прогрева SeenSet."""
+        with self._lock:
+            conn = self._connection()
+            return conn.execute(
+                "SELECT s.name, a.canonical_url FROM articles a JOIN sources s ON s.id = a.source_id "
+                "ORDER BY a.first_seen DESC LIMIT ?", (limit,)
+            ).fetchall()
+
+    def recanonicalize(self, version):
+        """
+        Пересчитывает canonical_url у сохранённых статей при смене правил канонизации.
+        Если два старых URL сводятся к одному — остаётся более ранний.
+        """
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value FROM meta WHERE key = 'canonical_version'").fetchone()
+            if row and row[0] == str(version):
+                return 0
+            changed = removed = 0
+            with conn:
+                rows = conn.execute(
+                    "SELECT a.id, s.name, a.url, a.canonical_url FROM articles a JOIN sources s ON s.id = a.source_id "
+                    "ORDER BY a.first_seen"
+                ).fetchall()
+                for article_id, name, url, old in rows:
+                    new = self.canonicalize(name, url)
+                    if new == old:
+                        continue
+                    try:
+                        conn.execute("UPDATE articles SET canonical_url = ? WHERE id = ?", (new, article_id))
+                        changed += 1
+                    except sqlite3.IntegrityError:
+                        conn.execute("DELETE FROM articles WHERE id = ?", (article_id,))
+                        removed += 1
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('canonical_version', ?)", (str(version),))
+                if removed:
+                    self._bump_revision(conn)
+            if changed or removed:
+                logger.info(f"Канонизация URL v{version}: обновлено {changed}, удалено дублей {removed}")
+            return changed
+
+    def purge_expired(self):
+        """Удаляет статьи старше retention_days (0 — хранить всё)."""
+        if not self.retention_days:
+            return 0
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                deleted = conn.execute("DELETE FROM articles WHERE first_seen < ?", (cutoff,)).rowcount
+                if deleted:
+                    self._bump_revision(conn)
+        if deleted:
+            logger.info(f"Удалено {deleted} статей старше {self.retention_days} дн.")
+        return deleted
+
+    def count(self, source=None):
+        with self._lock:
+            conn = self._connection()
+            if source is None:
+                return conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            return conn.execute(
+                "SELECT COUNT(*) FROM articles a JOIN sources s ON s.id = a.source_id WHERE s.name = ?", (source,)
+            ).fetchone()[0]
+
+    # ---------- лента для API ----------
+    def feed(self, after=None, limit=100, sources=None, since=None, until=None):
+        """
+        Статьи в порядке добавления (first_seen, id), начиная после курсора after = (first_seen, id).
+        sources — список имён источников, since/until — границы first_seen (unix-время, until не включительно).
+        Возвращает словари id, source, title, url, first_seen, cursor.
+        """
+        where = []
+        params = []
+        if after is not None:
+            where.append("(a.first_seen, a.id) > (?, ?)")
+            params.extend(after)
+        if sources:
+            where.append(f"s.name IN ({', '.join('?' * len(sources))})")
+            params.extend(sources)
+        if since is not None:
+            where.append("a.first_seen >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("a.first_seen < ?")
+            params.append(until)
+        sql = ("SELECT a.id, s.name, a.title, a.url, a.first_seen FROM articles a JOIN sources s ON s.id = a.source_id "
+               + (f"WHERE {' AND '.join(where)} " if where else "")
+               + "ORDER BY a.first_seen, a.id LIMIT ?")
+        params.append(limit)
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+        return [
+            {'id': article_id, 'source': source, 'title': title, 'url': url,
+             'first_seen': first_seen, 'cursor': encode_cursor(first_seen, article_id)}
+            for article_id, source, title, url, first_seen in rows
+        ]
+
+    def revision(self):
+        """(MAX(id), счётчик удалений): меняется при любом изменении содержимого ленты — основа ETag."""
+        with self._lock:
+            conn = self._connection()
+            if self._revision is None:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+                self._revision = int(row[0]) if row else 0
+            max_id = conn.execute("SELECT MAX(id) FROM articles").fetchone()[0] or 0
+            return max_id, self._revision
+
+    # ---------- поиск ----------
+    def search(self, query, limit=50, offset=0, source=None, order='rank'):
+        """
+        Поиск по заголовкам, URL и источникам (синтаксис — fts_query). order: rank — по релевантности
+        (bm25, заголовок весит больше URL), recent — сначала новые. В highlighted — заголовок
+        с совпадениями между HIGHLIGHT_START и HIGHLIGHT_END.
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        with self._lock:
+            self._connection()  # Доступен ли FTS5, выясняется при открытии базы
+        if not self.fts:
+            return self._search_like(query, limit, offset, source)
+        sql = ("SELECT a.id, s.name, a.title, a.url, a.first_seen, "
+               "highlight(articles_fts, 0, ?, ?) FROM articles_fts f "
+               "JOIN articles a ON a.id = f.rowid JOIN sources s ON s.id = a.source_id "
+               "WHERE articles_fts MATCH ?" + (" AND s.name = ?" if source else "")
+               + (" ORDER BY f.rowid DESC" if order == 'recent' else " ORDER BY bm25(articles_fts, 10.0, 1.0, 2.0)")
+               + " LIMIT ? OFFSET ?")
+        params = [HIGHLIGHT_START, HIGHLIGHT_END, match] + ([source] if source else []) + [limit, offset]
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+        return [
+            {'id': article_id, 'source': name, 'title': title, 'url': url, 'first_seen': first_seen, 'highlighted': highlighted}
+            for article_id, name, title, url, first_seen, highlighted in rows
+        ]
+
+    def _search_like(self, query, limit, offset, source):
+        words = [w.strip('"*') for w in query.split() if w.strip('"*')]
+        where = ["(a.title LIKE ? OR a.url LIKE ?)"] * len(words)
+        params = [p for w in words for p in (f"%{w}%", f"%{w}%")]
+        if source:
+            where.append("s.name = ?")
+            params.append(source)
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT a.id, s.name, a.title, a.url, a.first_seen FROM articles a JOIN sources s ON s.id = a.source_id "
+                f"WHERE {' AND '.join(where)} ORDER BY a.id DESC LIMIT ? OFFSET ?", params + [limit, offset]
+            ).fetchall()
+        return [
+            {'id': article_id, 'source': name, 'title': title, 'url': url, 'first_seen': first_seen, 'highlighted': title}
+            for article_id, name, title, url, first_seen in rows
+        ]
+
+    # ---------- миграция ----------
+    def migrate_from_json(self, last_results_file, resources_file):
+        """
+        Одноразовый перенос: источники из resources.json, статьи из last_results.json.
+        Повторный запуск ничего не делает; исходные файлы не удаляются.
+        """
+        with self._lock:
+            conn = self._connection()
+            if conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone():
+                return False
+
+            resources = _read_json(resources_file, [])
+            last_results = _read_json(last_results_file, {})
+            migrated_at = self._next_seen_at()
+            total = 0
+            with self._transaction(conn):
+                for res in resources:
+                    if res.get('name'):
+                        source_id = self._source_id(conn, res['name'], res.get('url'))
+                        conn.execute("UPDATE sources SET url = ? WHERE id = ? AND url IS NULL", (res.get('url'), source_id))
+                for name, articles in last_results.items():
+                    source_id = self._source_id(conn, name)
+                    rows = [
+                        # Порядок в файле = порядок обнаружения; сохраняем его через first_seen
+                        (source_id, art.get('title') or '', art['url'], self.canonicalize(name, art['url']), migrated_at + i * 1e-6)
+                        for i, art in enumerate(articles) if art.get('url')
+                    ]
+                    # rowcount, а не total_changes: тот считает и строки, записанные триггерами поискового индекса
+                    total += conn.executemany(
+                        "INSERT OR IGNORE INTO articles (source_id, title, url, canonical_url, first_seen) VALUES (?, ?, ?, ?, ?)",
+                        rows
+                    ).rowcount
+                    if rows:
+                        self._next_seen_at(rows[-1][-1])
+                conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (str(migrated_at),))
+            logger.info(f"Миграция в SQLite: {len(resources)} ресурсов, {total} статей из {last_results_file}")
+            return True
+
+
+def _read_json(path, default):
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        logger.error(f"Миграция: не удалось прочитать {path}: {e}")
+    return default
@@ -0,0 +1,191 @@
+# extract_bench.py — сравнение движков извлечения (soup vs lxml) на корпусе bench/pages
+#
+# Запуск из services/fe-articles:
+#   python bench/extract_bench.py                       # все страницы из bench/pages
+#   python bench/extract_bench.py --synthetic 2000      # + синтетическая страница на 2000 статей
+#   python bench/extract_bench.py --record habr https://habr.com/ru/articles/ "article" "h2" "h2 a"
+#
+# Перед замером всегда проверяется совпадение заголовков с эталоном на «трудных» строках
+# (TRICKY_TITLES: одиночные < и >, сущности, теги внутри заголовка) — для всех движков.
+#
+# Страница = пара файлов <имя>.html + <имя>.json (url, item_selector, title_selector, link_selector, limit).
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction import EXTRACTORS  # noqa: E402
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+
+def synthetic_page(count):
+    items = "\n".join(
+        f'<article class="post"><div class="meta"><span>{i} мин</span></div>'
+        f'<h2 class="title"><a href="/articles/{i}/">Статья номер {i} &amp; <b>подробности</b></a></h2>'
+        f'<p>{"Текст анонса. " * 20}</p><img src="/img/{i}.png"></article>'
+        for i in range(count)
+    )
+    html = f'<html><head><script>var x = 1;</script></head><body><main>{items}</main></body></html>'
+    config = {
+        "name": f"synthetic-{count}",
+        "url": "https://example.com/blog/",
+        "item_selector": "article.post",
+        "title_selector": "h2.title",
+        "link_selector": "h2.title a",
+        "limit": 20,
+    }
+    return html, config
+
+
+# Заголовки как они записаны в HTML (внутри <a>); в тексте элемента сущности уже раскрыты
+TRICKY_TITLES = (
+    'Если x &lt; 5 и y &gt; 3',
+    '1&lt;2 and 3>2',
+    'a &lt;-- b --&gt; c',
+    'A &amp;lt;b&amp;gt; B',
+    'A &lt;b&gt; B',
+    'Tom &amp; Jerry &amp;amp; <b>co</b>',
+    'C++ &lt;&lt; iostream',
+    'Новое в <code>asyncio</code> &mdash; 3.13',
+    '&lt;!-- TODO --&gt; заметки',
+    'x&lt;y&gt;z',
+)
+
+
+def tricky_titles_page():
+    items = "\n".join(f'<div class="item"><a href="/t/{i}">{title}</a></div>' for i, title in enumerate(TRICKY_TITLES))
+    config = {
+        "name": "tricky-titles",
+        "url": "https://example.com/",
+        "item_selector": "div.item",
+        "title_selector": "a",
+        "link_selector": "a",
+        "limit": len(TRICKY_TITLES),
+    }
+    return f'<html><body>{items}</body></html>', config
+
+
+def check_titles():
+    """Заголовки всех движков против soup; clean_title — ещё и на готовом тексте (путь записей из браузера)."""
+    import html as html_lib
+
+    html, config = tricky_titles_page()
+    reference = EXTRACTORS['soup'].extract(html, config, config['limit'])
+    texts = [html_lib.unescape(title) for title in TRICKY_TITLES]
+    reference_clean = [EXTRACTORS['soup'].clean_title(text) for text in texts]
+    mismatches = 0
+    for name, extractor in EXTRACTORS.items():
+        if name == 'soup':
+            continue
+        result = extractor.extract(html, config, config['limit'])
+        for expected, got in zip(reference, result):
+            if expected != got:
+                mismatches += 1
+                print(f"заголовок {name}: soup {expected['title']!r}, {name} {got['title']!r}")
+        for text, expected in zip(texts, reference_clean):
+            got = extractor.clean_title(text)
+            if expected != got:
+                mismatches += 1
+                print(f"clean_title {name} для {text!r}: soup {expected!r}, {name} {got!r}")
+    print(f"Заголовки против soup ({len(TRICKY_TITLES)} трудных строк): "
+          f"{'совпадают' if not mismatches else f'расхождений {mismatches}'}")
+    return mismatches
+
+
+def load_pages(pages_dir):
+    pages = []
+    if not os.path.isdir(pages_dir):
+        return pages
+    for file_name in sorted(os.listdir(pages_dir)):
+        if not file_name.endswith('.json'):
+            continue
+        base = file_name[:-5]
+        html_path = os.path.join(pages_dir, base + '.html')
+        if not os.path.exists(html_path):
+            continue
+        with open(os.path.join(pages_dir, file_name), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        config.setdefault('name', base)
+        with open(html_path, 'r', encoding='utf-8') as f:
+            pages.append((f.read(), config))
+    return pages
+
+
+def record_page(pages_dir, name, url, item_selector, title_selector, link_selector):
+    import httpx
+    from bs4 import UnicodeDammit
+
+    response = httpx.get(url, follow_redirects=True, timeout=60, headers={
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
+    })
+    response.raise_for_status()
+    html = response.text if response.charset_encoding else UnicodeDammit(response.content, is_html=True).unicode_markup
+    os.makedirs(pages_dir, exist_ok=True)
+    with open(os.path.join(pages_dir, name + '.html'), 'w', encoding='utf-8') as f:
+        f.write(html)
+    with open(os.path.join(pages_dir, name + '.json'), 'w', encoding='utf-8') as f:
+        json.dump({"url": url, "item_selector": item_selector, "title_selector": title_selector,
+                   "link_selector": link_selector, "limit": 20}, f, ensure_ascii=False, indent=2)
+    print(f"Записано: {name} ({len(html)} символов)")
+
+
+def time_engine(extractor, html, config, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = extractor.extract(html, config, config.get('limit', 20))
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк движков извлечения")
+    parser.add_argument('pages_dir', nargs='?', default=PAGES_DIR)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--synthetic', type=int, default=0, help="добавить синтетическую страницу на N статей")
+    parser.add_argument('--record', nargs=5, metavar=('NAME', 'URL', 'ITEM', 'TITLE', 'LINK'),
+                        help="скачать страницу в корпус и выйти")
+    args = parser.parse_args()
+
+    if args.record:
+        record_page(args.pages_dir, *args.record)
+        return
+
+    logging.disable(logging.INFO)
+    title_mismatches = check_titles()
+    pages = load_pages(args.pages_dir)
+    if args.synthetic:
+        pages.append(synthetic_page(args.synthetic))
+    if not pages:
+        print("Нет страниц: запишите их через --record или добавьте --synthetic N")
+        sys.exit(1 if title_mismatches else 0)
+
+    print(f"{'страница':<30} {'KB':>8} {'soup, мс':>10} {'lxml, мс':>10} {'x':>6}  совпадает")
+    mismatches = 0
+    for html, config in pages:
+        soup_ms, soup_result = time_engine(EXTRACTORS['soup'], html, config, args.repeat)
+        lxml_ms, lxml_result = time_engine(EXTRACTORS['lxml'], html, config, args.repeat)
+        same = soup_result == lxml_result
+        mismatches += 0 if same else 1
+        print(f"{config['name'][:30]:<30} {len(html) / 1024:>8.0f} {soup_ms:>10.2f} {lxml_ms:>10.2f} "
+              f"{soup_ms / lxml_ms if lxml_ms else 0:>6.1f}  {'да' if same else 'НЕТ'}")
+        if not same:
+            for a, b in zip(soup_result, lxml_result):
+                if a != b:
+                    print(f"    soup: {a}\n    lxml: {b}")
+                    break
+            else:
+                print(f"    разное число записей: soup {len(soup_result)}, lxml {len(lxml_result)}")
+    sys.exit(1 if mismatches or title_mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+# replay_server.py — локальная замена сайтов для бенчмарков: отдаёт записанные и синтетические страницы
+#
+# Запуск отдельно (для ручных проверок через UI):
+#   python bench/replay_server.py --port 8900 --latency 150 --jitter 50 --pad-kb 200
+#
+# Пути:
+#   /page/<имя>              — страница из корпуса bench/pages
+#   /synthetic/<n>?items=30  — синтетическая лента ресурса n; при bump_epoch() появляются новые статьи
+
+import argparse
+import http.server
+import os
+import random
+import sys
+import threading
+import time
+from email.utils import formatdate
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extract_bench import PAGES_DIR, load_pages  # noqa: E402
+
+SYNTHETIC_CONFIG = {
+    "item_selector": "article.post",
+    "title_selector": "h2.title",
+    "link_selector": "h2.title a",
+}
+
+
+def padding_html(kb):
+    """Тяжёлый, но нейтральный для селекторов блок: раздувает страницу до нужного размера."""
+    if kb <= 0:
+        return ''
+    paragraph = '<p class="bench-pad">' + 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 16 + '</p>\n'
+    return '<div class="bench-pad">' + paragraph * max(1, kb * 1024 // len(paragraph)) + '</div>'
+
+
+def synthetic_feed(resource_id, epoch, items=30, churn=5):
+    """Лента ресурса: каждая эпоха сдвигает окно на churn статей — столько новых в следующем цикле."""
+    start = epoch * churn
+    posts = "\n".join(
+        f'<article class="post"><h2 class="title"><a href="/r{resource_id}/articles/{i}/">'
+        f'Ресурс {resource_id}: статья {i} &amp; <b>детали</b></a></h2><p>{"Анонс. " * 15}</p></article>'
+        for i in range(start + items - 1, start - 1, -1)
+    )
+    return f'<html><head><title>Ресурс {resource_id}</title><script>var t = {time.time()};</script></head><body><main>{posts}</main></body></html>'
+
+
+class ReplayServer:
+    """
+    HTTP-сервер в фоновом потоке. latency_ms ± jitter_ms — задержка перед ответом,
+    pad_kb — сколько КБ добавить в каждую страницу. Last-Modified меняется с эпохой,
+    поэтому условные запросы получают 304, пока ленту не сдвинули.
+    """
+
+    def __init__(self, pages=None, latency_ms=0, jitter_ms=0, pad_kb=0, churn=5, host='127.0.0.1', port=0):
+        self.pages = {config['name']: html for html, config in (pages or [])}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.pad_kb = pad_kb
+        self.churn = churn
+        self.epoch = 0
+        self.epoch_time = time.time()
+        self.requests = 0
+        self.not_modified = 0
+        self._padding = padding_html(pad_kb)
+        self._server = http.server.ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def bump_epoch(self):
+        self.epoch += 1
+        self.epoch_time = time.time() + self.epoch  # Last-Modified обязан измениться даже в пределах секунды
+
+    def _render(self, path, query):
+        parts = [p for p in path.split('/') if p]
+        if len(parts) == 2 and parts[0] == 'page' and parts[1] in self.pages:
+            html = self.pages[parts[1]]
+        elif len(parts) == 2 and parts[0] == 'synthetic' and parts[1].isdigit():
+            items = int(query.get('items', ['30'])[0])
+            html = synthetic_feed(int(parts[1]), self.epoch, items=items, churn=self.churn)
+        else:
+            return None
+        if self._padding:
+            html = html.replace('</body>', self._padding + '</body>', 1) if '</body>' in html else html + self._padding
+        return html
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, как у настоящих сайтов
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests += 1
+                if server.latency_ms or server.jitter_ms:
+                    delay = server.latency_ms + random.uniform(-server.jitter_ms, server.jitter_ms)
+                    time.sleep(max(0.0, delay) / 1000)
+                url = urlsplit(self.path)
+                last_modified = formatdate(server.epoch_time, usegmt=True)
+                if self.headers.get('If-Modified-Since') == last_modified:
+                    server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                html = server._render(url.path, parse_qs(url.query))
+                if html is None:
+                    body = b'not found'
+                    self.send_response(404)
+                    self.send_header('Content-Type', 'text/plain')
+                else:
+                    body = html.encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Last-Modified', last_modified)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Клиент ушёл по таймауту или воркер убит — для бенчмарка это не ошибка сервера
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена сайтов для бенчмарков")
+    parser.add_argument('pages_dir', nargs='?', default=PAGES_DIR)
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0, help="задержка ответа, мс")
+    parser.add_argument('--jitter', type=float, default=0, help="разброс задержки, ± мс")
+    parser.add_argument('--pad-kb', type=int, default=0, help="добавить к каждой странице N КБ")
+    parser.add_argument('--churn', type=int, default=5, help="новых статей в синтетической ленте за эпоху")
+    parser.add_argument('--epoch-seconds', type=float, default=0, help="сдвигать ленты каждые N секунд (0 — никогда)")
+    args = parser.parse_args()
+
+    server = ReplayServer(load_pages(args.pages_dir), args.latency, args.jitter, args.pad_kb, args.churn, port=args.port).start()
+    print(f"Отдаём {len(server.pages)} страниц корпуса и синтетические ленты на {server.base_url}")
+    for name in server.pages:
+        print(f"  {server.base_url}/page/{name}")
+    print(f"  {server.base_url}/synthetic/1  (селекторы: {SYNTHETIC_CONFIG})")
+    try:
+        while True:
+            time.sleep(args.epoch_seconds or 3600)
+            if args.epoch_seconds:
+                server.bump_epoch()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
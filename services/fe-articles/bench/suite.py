@@ -0,0 +1,307 @@
+# suite.py — офлайн-бенчмарки парсера: извлечение, parse_resource и полный цикл на локальной замене сайтов
+#
+# Запуск из services/fe-articles:
+#   python bench/suite.py                                   # всё, сравнить с bench/baseline.json (если есть)
+#   python bench/suite.py --only cycle --resources 200 --latency 80 --jitter 40
+#   python bench/suite.py --pad-kb 500 --save-baseline      # записать текущие цифры как эталон
+#
+# Страницы: корпус bench/pages (см. extract_bench.py --record) + синтетические. Их отдаёт
+# replay_server.ReplayServer с заданной задержкой и размером — реальные сайты не трогаются.
+# Цикл send_new_articles_async идёт в отдельном временном каталоге (своя база, resources.json,
+# логи); Telegram подменяется заглушкой, которая только считает сообщения.
+#
+# Эталон привязан к машине: храните bench/baseline.json рядом с тем, где его сняли, и
+# сравнивайте прогоны на одном хосте. Регрессия — p95 выше или пропускная способность ниже
+# эталона больше чем на --tolerance; тогда код выхода 1.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, SERVICE_DIR)
+
+from extract_bench import PAGES_DIR, load_pages, synthetic_page  # noqa: E402
+from extraction import EXTRACTORS  # noqa: E402
+from replay_server import SYNTHETIC_CONFIG, ReplayServer  # noqa: E402
+
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+BENCHMARKS = ('extract', 'parse', 'cycle')
+
+
+# ====================== СТАТИСТИКА ======================
+def percentile(values, p):
+    """Ближайший ранг: p95 из 20 замеров — 19-й по величине, без интерполяции."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса с начала прогона (монотонно растёт — бенчмарки идут от лёгких к тяжёлым)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(timings_ms, units, wall_seconds, unit_name):
+    return {
+        'runs': len(timings_ms),
+        'p50_ms': round(percentile(timings_ms, 50), 2),
+        'p95_ms': round(percentile(timings_ms, 95), 2),
+        'throughput': round(units / wall_seconds, 2) if wall_seconds else 0.0,
+        'unit': unit_name,
+        'rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+# ====================== БЕНЧМАРКИ ======================
+def bench_extract(pages, repeat):
+    results = {}
+    for html, config in pages:
+        for engine, extractor in EXTRACTORS.items():
+            timings = []
+            started = time.perf_counter()
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                extractor.extract(html, config, config.get('limit', 20))
+                timings.append((time.perf_counter() - t0) * 1000)
+            wall = time.perf_counter() - started
+            results[f"extract:{config['name']}:{engine}"] = summarize(timings, len(html) * repeat / 1024 / 1024, wall, 'MB/s')
+    return results
+
+
+async def bench_parse(parse, pages, server, repeat, concurrency):
+    """parse_resource по HTTP без условных запросов и кэша: загрузка + извлечение + трассировка."""
+    results = {}
+    for html, config in pages:
+        url = f"{server.base_url}/page/{config['name']}"
+        res = dict(config, url=url, fetch_mode='http', extract_in_browser=False)
+        sem = asyncio.Semaphore(concurrency)
+        timings = []
+        errors = []
+
+        async def one():
+            async with sem:
+                t0 = time.perf_counter()
+                data, error = await parse(dict(res), limit=config.get('limit', 20))
+                timings.append((time.perf_counter() - t0) * 1000)
+                if error:
+                    errors.append(error)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(repeat)))
+        wall = time.perf_counter() - started
+        key = f"parse:{config['name']}"
+        results[key] = summarize(timings, repeat, wall, 'стр/с')
+        if errors:
+            results[key]['errors'] = len(errors)
+            print(f"  {key}: {len(errors)} ошибок, первая: {errors[0]}")
+    return results
+
+
+def write_synthetic_resources(server, count, items):
+    resources = [
+        dict(SYNTHETIC_CONFIG, name=f"bench-{i}", url=f"{server.base_url}/synthetic/{i}?items={items}",
+             fetch_mode='http', extract_in_browser=False, paused=False)
+        for i in range(count)
+    ]
+    os.makedirs('data', exist_ok=True)
+    with open('data/resources.json', 'w', encoding='utf-8') as f:
+        json.dump(resources, f, ensure_ascii=False, indent=2)
+
+
+async def bench_cycle(app, server, count, repeat, items):
+    """
+    Полный send_new_articles_async по count синтетическим ресурсам:
+      cold  — первый цикл, все статьи новые (вставка в пустую базу);
+      churn — после сдвига лент: часть статей новая, остальные отсекает дедуп;
+      idle  — ленты не менялись, условные запросы получают 304.
+    """
+    write_synthetic_resources(server, count, items)
+    runs = {'cold': [], 'churn': [], 'idle': []}
+    walls = {k: 0.0 for k in runs}
+
+    async def run(kind):
+        t0 = time.perf_counter()
+        await app.send_new_articles_async()
+        elapsed = time.perf_counter() - t0
+        runs[kind].append(elapsed * 1000)
+        walls[kind] += elapsed
+
+    await run('cold')
+    for _ in range(repeat):
+        server.bump_epoch()
+        await run('churn')
+        await run('idle')
+
+    return {f"cycle:{kind}:{count}": summarize(timings, count * len(timings), walls[kind], 'рес/с')
+            for kind, timings in runs.items()}
+
+
+# ====================== ЭТАЛОН ======================
+def compare(results, baseline, tolerance):
+    """Строки сравнения с эталоном и число регрессий."""
+    regressions = 0
+    lines = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            lines.append((key, current, '', 'новый'))
+            continue
+        notes = []
+        if base['p95_ms'] and current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            notes.append(f"p95 +{(current['p95_ms'] / base['p95_ms'] - 1) * 100:.0f}%")
+        if base['throughput'] and current['throughput'] < base['throughput'] * (1 - tolerance):
+            notes.append(f"пропускная −{(1 - current['throughput'] / base['throughput']) * 100:.0f}%")
+        regressions += 1 if notes else 0
+        delta = f"{(current['p50_ms'] / base['p50_ms'] - 1) * 100:+.0f}%" if base['p50_ms'] else ''
+        lines.append((key, current, delta, 'РЕГРЕССИЯ: ' + ', '.join(notes) if notes else 'ок'))
+    return lines, regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path, results, args):
+    payload = {
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'params': {k: getattr(args, k) for k in ('latency', 'jitter', 'pad_kb', 'resources', 'items', 'repeat', 'concurrency', 'workers')},
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    print(f"Эталон сохранён: {path}")
+
+
+def print_report(lines):
+    print(f"\n{'бенчмарк':<42} {'p50, мс':>9} {'p95, мс':>9} {'пропускная':>16} {'RSS, МБ':>8} {'Δp50':>6}  итог")
+    for key, r, delta, verdict in lines:
+        throughput = f"{r['throughput']:.1f} {r['unit']}"
+        print(f"{key[:42]:<42} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {throughput:>16} {r['rss_mb']:>8.1f} {delta:>6}  {verdict}")
+
+
+# ====================== ЗАПУСК ======================
+def import_app(workdir, concurrency):
+    """
+    Импорт app.py в чистом каталоге: настройки читаются из окружения при импорте, поэтому
+    задаём их до него. Кэш страниц и трассировка выключены, чтобы мерить сам парсинг;
+    все синтетические ресурсы на одном хосте, поэтому лимит на домен поднят до общего.
+    """
+    os.chdir(workdir)
+    os.environ.setdefault('TG_BOT_TOKEN', '0:bench')
+    os.environ.setdefault('TG_CHAT_ID', '0')
+    os.environ['PAGE_CACHE_TTL_SECONDS'] = '0'
+    os.environ['TRACE_ENABLED'] = '0'
+    os.environ['ADAPTIVE_SCHEDULING'] = '0'
+    os.environ['PIPELINE_SUMMARY'] = '0'
+    os.environ.setdefault('CRAWL_CONCURRENCY', str(concurrency))
+    os.environ['CRAWL_PER_HOST_LIMIT'] = os.environ['CRAWL_CONCURRENCY']
+    import app
+
+    sent = []
+
+    async def deliver(text):
+        sent.append(len(text))
+
+    app.deliver_telegram_message = deliver
+    return app, sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарки парсера на локальной замене сайтов")
+    parser.add_argument('pages_dir', nargs='?', default=PAGES_DIR)
+    parser.add_argument('--only', default=','.join(BENCHMARKS), help="через запятую: extract,parse,cycle")
+    parser.add_argument('--repeat', type=int, default=20, help="повторов на страницу / циклов churn+idle")
+    parser.add_argument('--synthetic', type=int, nargs='*', default=[50, 2000], help="синтетические страницы на N статей")
+    parser.add_argument('--latency', type=float, default=50, help="задержка ответа сервера, мс")
+    parser.add_argument('--jitter', type=float, default=20, help="разброс задержки, ± мс")
+    parser.add_argument('--pad-kb', type=int, default=0, help="добавить к каждой странице N КБ")
+    parser.add_argument('--resources', type=int, default=50, help="синтетических ресурсов в цикле")
+    parser.add_argument('--items', type=int, default=30, help="статей в ленте синтетического ресурса")
+    parser.add_argument('--concurrency', type=int, default=4, help="параллельных parse_resource / CRAWL_CONCURRENCY")
+    parser.add_argument('--pipeline', action='store_true', help="цикл в потоковом режиме (PIPELINE_MODE=1)")
+    parser.add_argument('--workers', type=int, default=0, help="parse и cycle в N процессах-воркерах (CRAWL_WORKERS)")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2, help="допустимое ухудшение, доля (0.2 = 20%%)")
+    parser.add_argument('--keep', action='store_true', help="не удалять рабочий каталог (логи, база)")
+    args = parser.parse_args()
+
+    only = [b.strip() for b in args.only.split(',') if b.strip()]
+    unknown = set(only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"неизвестные бенчмарки: {', '.join(sorted(unknown))}")
+
+    baseline_path = os.path.abspath(args.baseline)
+    pages = load_pages(os.path.abspath(args.pages_dir))
+    pages += [synthetic_page(n) for n in args.synthetic]
+    if not pages and ('extract' in only or 'parse' in only):
+        print("Нет страниц: запишите их через extract_bench.py --record или задайте --synthetic N")
+        return
+
+    workdir = tempfile.mkdtemp(prefix='fe-articles-bench-')
+    if args.pipeline:
+        os.environ['PIPELINE_MODE'] = '1'
+    os.environ['CRAWL_WORKERS'] = str(args.workers)
+    app, sent = import_app(workdir, args.concurrency)
+    server = ReplayServer(pages, args.latency, args.jitter, args.pad_kb).start()
+    print(f"Страниц: {len(pages)}, сервер {server.base_url} ({args.latency:.0f}±{args.jitter:.0f} мс, +{args.pad_kb} КБ), "
+          f"каталог {workdir}")
+
+    results = {}
+    if 'extract' in only:
+        results.update(bench_extract(pages, args.repeat))
+
+    async def run_async():
+        await app.crawl_workers.start()
+        while app.crawl_workers.started and app.crawl_workers.stats()['workers_ready'] < args.workers:
+            await asyncio.sleep(0.1)  # Старт воркеров (импорт app, Playwright) в замеры не входит
+        try:
+            if 'parse' in only:
+                parse = app.parse_resource_remote if app.crawl_workers.started else app.parse_resource
+                results.update(await bench_parse(parse, pages, server, args.repeat, args.concurrency))
+            if 'cycle' in only:
+                results.update(await bench_cycle(app, server, args.resources, args.repeat, args.items))
+        finally:
+            await app.crawl_workers.stop()
+            await app.close_http_client()
+
+    if 'parse' in only or 'cycle' in only:
+        asyncio.run(run_async())
+    server.stop()
+    app.article_store.close()
+    logging.shutdown()
+    print(f"Запросов к серверу: {server.requests} (304: {server.not_modified}), сообщений в Telegram: {len(sent)}")
+
+    baseline = load_baseline(baseline_path)
+    lines, regressions = compare(results, (baseline or {}).get('results', {}), args.tolerance)
+    print_report(lines)
+    if baseline:
+        print(f"\nЭталон: {baseline_path} ({baseline.get('created_at')}, {baseline.get('host')}), допуск {args.tolerance:.0%}")
+    if args.save_baseline:
+        save_baseline(baseline_path, results, args)
+    if not args.keep:
+        import shutil
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if regressions and not args.save_baseline else 0)
+
+
+if __name__ == '__main__':
+    main()
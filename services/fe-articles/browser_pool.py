@@ -0,0 +1,210 @@
+# browser_pool.py — долгоживущий пул Chromium для parse_resource / get_page_html
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+import psutil
+
+logger = logging.getLogger('fe_articles.browser_pool')
+
+# Запуск с маскировкой — те же флаги, что раньше были в parse_resource
+DEFAULT_LAUNCH_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-blink-features=AutomationControlled',  # Скрываем автоматизацию
+    '--disable-infobars',  # Убираем панель "Chrome управляется"
+    '--window-size=1920,1080'  # Реалистичный размер окна
+]
+
+
+def process_tree_rss_mb():
+    """RSS текущего процесса + всех потомков (драйвер Playwright и Chromium) в МБ."""
+    try:
+        proc = psutil.Process()
+        total = proc.memory_info().rss
+        for child in proc.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return total / (1024 * 1024)
+    except Exception:
+        return 0.0
+
+
+class _BrowserSlot:
+    """Один браузер пула и его счётчики."""
+
+    def __init__(self, index):
+        self.index = index
+        self.browser = None
+        self.active = 0          # Сколько контекстов сейчас открыто
+        self.pages_served = 0    # Сколько страниц выдано с момента запуска
+        self.retiring = False    # Ждёт закрытия для пересоздания
+        self.crashed = False
+        self.launched_at = None
+
+    def is_alive(self):
+        return self.browser is not None and not self.crashed and self.browser.is_connected()
+
+
+class BrowserPool:
+    """
+    Пул браузеров, который стартует один раз (в main() или при первой запрошенной странице)
+    и раздаёт изолированные контексты/страницы. Браузер пересоздаётся после max_pages страниц, при
+    превышении max_rss_mb по дереву процессов или если он упал.
+    """
+
+    def __init__(self, size=1, contexts_per_browser=2, max_pages=50, max_rss_mb=1024, launch_args=None, on_launch=None):
+        self.size = max(1, size)
+        self.contexts_per_browser = max(1, contexts_per_browser)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.launch_args = launch_args or DEFAULT_LAUNCH_ARGS
+        self.on_launch = on_launch  # on_launch(секунды) — для метрик
+        self.launches = 0
+        self.recycles = 0
+        self.crashes = 0
+        self._playwright = None
+        self._slots = [_BrowserSlot(i) for i in range(self.size)]
+        self._cond = None
+        self._sem = None
+        self._started = False
+        self._start_lock = asyncio.Lock()  # Ленивый старт из нескольких задач сразу — один запуск
+
+    @property
+    def started(self):
+        return self._started
+
+    async def start(self):
+        async with self._start_lock:
+            if not self._started:
+                await self._start()
+
+    async def _start(self):
+        from playwright.async_api import async_playwright  # Импорт ~0.1 сек и десятки МБ — только когда нужен браузер
+        self._cond = asyncio.Condition()
+        self._sem = asyncio.Semaphore(self.size * self.contexts_per_browser)
+        self._playwright = await async_playwright().start()
+        self._started = True
+        self._slots = [_BrowserSlot(i) for i in range(self.size)]
+        # Первый браузер поднимаем сразу, остальные — по требованию
+        async with self._cond:
+            await self._launch(self._slots[0])
+        logger.info(f"Пул браузеров запущен: {self.size} браузер(ов) × {self.contexts_per_browser} контекстов, "
+                    f"пересоздание после {self.max_pages} страниц или {self.max_rss_mb} МБ")
+
+    async def stop(self):
+        if not self._started:
+            return
+        self._started = False
+        for slot in self._slots:
+            await self._close(slot)
+        try:
+            await self._playwright.stop()
+        except Exception as e:
+            logger.warning(f"Ошибка остановки Playwright: {e}")
+        self._playwright = None
+        logger.info("Пул браузеров остановлен")
+
+    def stats(self):
+        return {
+            "browsers_alive": sum(1 for s in self._slots if s.is_alive()),
+            "contexts_active": sum(s.active for s in self._slots),
+            "launches": self.launches,
+            "recycles": self.recycles,
+            "crashes": self.crashes,
+        }
+
+    @asynccontextmanager
+    async def page(self, **context_options):
+        """Выдаёт новую страницу в отдельном контексте; контекст закрывается на выходе."""
+        if not self._started:
+            await self.start()
+        async with self._sem:
+            slot = await self._acquire()
+            try:
+                context = await slot.browser.new_context(**context_options)
+                try:
+                    page = await context.new_page()
+                    yield page
+                finally:
+                    try:
+                        await context.close()
+                    except Exception as e:
+                        logger.warning(f"Не удалось закрыть контекст (браузер #{slot.index}): {e}")
+            finally:
+                await self._release(slot)
+
+    # ---------- внутреннее ----------
+    async def _launch(self, slot):
+        started = time.perf_counter()
+        slot.browser = await self._playwright.chromium.launch(headless=True, args=self.launch_args)
+        slot.browser.on("disconnected", lambda _browser, s=slot: self._on_disconnected(s))
+        slot.pages_served = 0
+        slot.retiring = False
+        slot.crashed = False
+        slot.launched_at = time.time()
+        self.launches += 1
+        elapsed = time.perf_counter() - started
+        logger.info(f"Браузер #{slot.index} запущен за {elapsed:.2f} сек")
+        if self.on_launch:
+            self.on_launch(elapsed)
+
+    def _on_disconnected(self, slot):
+        if slot.browser is not None and not slot.retiring and self._started:
+            slot.crashed = True
+            self.crashes += 1
+            logger.warning(f"Браузер #{slot.index} отключился — будет перезапущен при следующем запросе")
+
+    async def _close(self, slot):
+        browser, slot.browser = slot.browser, None
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.warning(f"Ошибка закрытия браузера #{slot.index}: {e}")
+
+    async def _acquire(self):
+        async with self._cond:
+            while True:
+                candidates = [s for s in self._slots if not s.retiring and s.active < self.contexts_per_browser]
+                if candidates:
+                    # Сначала живые браузеры с минимальной нагрузкой, потом пустые слоты
+                    slot = min(candidates, key=lambda s: (not s.is_alive(), s.active))
+                    if not slot.is_alive():
+                        if slot.active:
+                            # Упал, но ещё есть открытые контексты — дождёмся их завершения
+                            slot.retiring = True
+                            continue
+                        if slot.crashed:
+                            logger.info(f"Перезапуск упавшего браузера #{slot.index}")
+                        await self._close(slot)
+                        await self._launch(slot)
+                    slot.active += 1
+                    slot.pages_served += 1
+                    return slot
+                await self._cond.wait()
+
+    async def _release(self, slot):
+        async with self._cond:
+            slot.active -= 1
+            if not slot.retiring:
+                if not slot.is_alive():
+                    slot.retiring = True
+                elif self.max_pages and slot.pages_served >= self.max_pages:
+                    logger.info(f"Браузер #{slot.index} отработал {slot.pages_served} страниц — пересоздаём")
+                    slot.retiring = True
+                elif self.max_rss_mb:
+                    rss = process_tree_rss_mb()
+                    if rss > self.max_rss_mb:
+                        logger.info(f"Память {rss:.0f} МБ > {self.max_rss_mb} МБ — пересоздаём браузер #{slot.index}")
+                        slot.retiring = True
+            if slot.retiring and slot.active == 0:
+                await self._close(slot)
+                slot.retiring = False
+                slot.crashed = False
+                self.recycles += 1
+            self._cond.notify_all()
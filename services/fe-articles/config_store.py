@@ -0,0 +1,105 @@
+# config_store.py — JSON-файлы настроек, закэшированные в памяти, с атомарной записью
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import stat
+import tempfile
+import threading
+
+logger = logging.getLogger('fe_articles.config_store')
+
+
+class JsonFile:
+    """
+    Содержимое JSON-файла в памяти. load() перечитывает файл, только если у него сменились
+    mtime, inode или размер (правка руками, замена файла), иначе отдаёт копию из памяти;
+    своя запись сразу обновляет кэш. Запись атомарная: временный файл рядом + os.replace,
+    так что читатель никогда не увидит файл наполовину.
+
+    default() — значение, если файла нет или он битый; normalize(data) — доводка после чтения
+    с диска (значения по умолчанию для новых полей); clone(data) — что отдавать вызывающему,
+    чтобы его правки не попадали в кэш (по умолчанию deepcopy).
+    """
+
+    def __init__(self, path, default=dict, normalize=None, clone=copy.deepcopy, label=None):
+        self.path = path
+        self.default = default
+        self.normalize = normalize
+        self.clone = clone
+        self.label = label or os.path.basename(path)
+        self._lock = threading.Lock()
+        self._data = None
+        self._signature = None
+        self.reloads = 0
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
+    def load(self):
+        with self._lock:
+            signature = self._stat_signature()
+            if self._data is None or signature != self._signature:
+                self._data = self._read() if signature is not None else self.default()
+                self._signature = signature
+            return self.clone(self._data)
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки {self.label}: {e}")
+            return self.clone(self._data) if self._data is not None else self.default()
+        if self.normalize is not None:
+            data = self.normalize(data)
+        self.reloads += 1
+        logger.info(f"{self.label}: прочитан с диска")
+        return data
+
+    def dump(self, data):
+        """Сериализация — в вызывающем потоке, пока данные не поменялись (например, на event loop)."""
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+    def write(self, text):
+        """Атомарно записать уже сериализованный text и обновить кэш."""
+        directory = os.path.dirname(self.path) or '.'
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(self.path) + '.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.chmod(tmp_path, self._file_mode())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            data = json.loads(text)
+            self._data = self.normalize(data) if self.normalize is not None else data
+            self._signature = self._stat_signature()
+
+    def _file_mode(self):
+        # mkstemp создаёт файл 0600 — оставляем права, которые были у заменяемого файла
+        try:
+            return stat.S_IMODE(os.stat(self.path).st_mode)
+        except FileNotFoundError:
+            return 0o644
+
+    def save(self, data):
+        self.write(self.dump(data))
+
+    async def save_async(self, data):
+        """Для event loop: сериализация здесь же, запись на диск — в потоке."""
+        await asyncio.to_thread(self.write, self.dump(data))
@@ -0,0 +1,330 @@
+# crawl_workers.py — обход в отдельных процессах: у каждого воркера свой event loop, браузер и HTTP-клиент
+
+import asyncio
+import itertools
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+
+logger = logging.getLogger('fe_articles.crawl_workers')
+
+# Логгеры, чьи записи воркер пересылает родителю: в файлы и их ротацию пишет только он
+FORWARDED_LOGGERS = ('fe_articles', 'fe_articles.trace')
+
+
+class WorkerCrashed(RuntimeError):
+    """Воркер умер (или был убит по таймауту), не вернув результат задачи."""
+
+
+# ====================== ПРОЦЕСС-ВОРКЕР ======================
+def _forward_logs(log_queue):
+    for name in FORWARDED_LOGGERS:
+        target = logging.getLogger(name)
+        for handler in list(target.handlers):
+            target.removeHandler(handler)
+            handler.close()
+        target.addHandler(logging.handlers.QueueHandler(log_queue))
+
+
+def _next_task(tasks, parent):
+    """Блокирующее чтение очереди задач; None — пора выходить (стоп-сигнал или родитель умер)."""
+    while True:
+        try:
+            return tasks.get(timeout=1.0)
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                return None
+
+
+async def _worker_loop(worker_id, runner, teardown, tasks, results):
+    loop = asyncio.get_running_loop()
+    parent = multiprocessing.parent_process()
+    running = set()
+
+    async def run_one(task_id, args):
+        try:
+            result = await runner(*args)
+        except Exception as e:
+            results.put(('done', worker_id, task_id, None, f"{type(e).__name__}: {e}"))
+        else:
+            results.put(('done', worker_id, task_id, result, None))
+
+    while True:
+        message = await loop.run_in_executor(None, _next_task, tasks, parent)
+        if message is None:
+            break
+        task = asyncio.create_task(run_one(*message))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
+    if teardown is not None:
+        try:
+            await teardown()
+        except Exception as e:
+            logger.warning(f"Воркер {worker_id}: ошибка при закрытии: {e}")
+
+
+def _worker_main(worker_id, runner, initializer, teardown, tasks, results, log_queue):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C ловит родитель и сам останавливает воркеров
+    _forward_logs(log_queue)
+    if initializer is not None:
+        initializer(worker_id)
+    logger.info(f"Воркер {worker_id} запущен")
+    results.put(('ready', worker_id, None, None, None))
+    asyncio.run(_worker_loop(worker_id, runner, teardown, tasks, results))
+    results.put(('exit', worker_id, None, None, None))
+
+
+# ====================== ПУЛ В ГЛАВНОМ ПРОЦЕССЕ ======================
+class _LoggerDispatch(logging.Handler):
+    """Запись из воркера отдаётся логгеру с тем же именем — дальше его обычные обработчики."""
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+class _Worker:
+    def __init__(self, worker_id, process, tasks):
+        self.id = worker_id
+        self.process = process
+        self.tasks = tasks
+        self.in_flight = {}      # task_id -> asyncio.Future
+        self.served = 0
+        self.ready = False       # Импорт и initializer позади, слоты выданы
+        self.retiring = False    # Новых задач не получает, выходит после текущих
+        self.started_at = time.time()
+
+
+class CrawlWorkerPool:
+    """
+    processes процессов, в каждом до slots задач одновременно. runner, initializer и teardown —
+    функции уровня модуля (передаются в процесс по имени): async runner(*args) -> результат,
+    initializer(worker_id) — после старта воркера, async teardown() — перед выходом.
+
+    Воркер перезапускается после max_tasks задач; упавший заменяется новым, его незавершённые
+    задачи получают WorkerCrashed. Задача дольше task_timeout секунд считается зависшей —
+    воркер убивается целиком. Подряд падающие воркеры перезапускаются с растущей паузой.
+    """
+
+    def __init__(self, runner, initializer=None, teardown=None, processes=2, slots=2,
+                 max_tasks=200, task_timeout=300, start_method='spawn', on_restart=None):
+        self.runner = runner
+        self.initializer = initializer
+        self.teardown = teardown
+        self.processes = max(0, processes)
+        self.slots = max(1, slots)
+        self.max_tasks = max_tasks
+        self.task_timeout = task_timeout
+        self.start_method = start_method
+        self.on_restart = on_restart  # on_restart(причина: 'recycle' | 'crash') — для метрик
+        self.served = 0
+        self.recycles = 0
+        self.crashes = 0
+        self._ctx = None
+        self._loop = None
+        self._workers = {}
+        self._free = None        # asyncio.Queue с id воркеров — по одному на свободный слот
+        self._results = None
+        self._log_queue = None
+        self._log_listener = None
+        self._reader = None
+        self._monitor = None
+        self._worker_ids = itertools.count(1)
+        self._task_ids = itertools.count(1)
+        self._recent_crashes = 0
+        self._next_spawn_at = 0.0
+        self._started = False
+
+    @property
+    def started(self):
+        return self._started
+
+    async def start(self):
+        if self._started or not self.processes:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._ctx = multiprocessing.get_context(self.start_method)
+        self._results = self._ctx.Queue()
+        self._log_queue = self._ctx.Queue()
+        self._log_listener = logging.handlers.QueueListener(self._log_queue, _LoggerDispatch())
+        self._log_listener.start()
+        self._free = asyncio.Queue()
+        self._reader = threading.Thread(target=self._read_results, name='crawl-workers-results', daemon=True)
+        self._reader.start()
+        for _ in range(self.processes):
+            self._spawn()
+        self._monitor = asyncio.create_task(self._watch())
+        self._started = True
+        logger.info(f"Пул воркеров обхода: {self.processes} процессов × {self.slots} задач")
+
+    async def stop(self, timeout=15):
+        if not self._started:
+            return
+        self._started = False
+        self._monitor.cancel()
+        await asyncio.gather(self._monitor, return_exceptions=True)
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.tasks.put(None)
+
+        def join_all():
+            deadline = time.monotonic() + timeout
+            for worker in workers:
+                worker.process.join(max(0.0, deadline - time.monotonic()))
+                if worker.process.is_alive():
+                    logger.warning(f"Воркер {worker.id} не завершился за {timeout} сек — убиваем")
+                    worker.process.kill()
+                    worker.process.join(5)
+
+        await asyncio.to_thread(join_all)
+        for worker in workers:
+            self._fail(worker, WorkerCrashed("пул воркеров остановлен"))
+        self._workers.clear()
+        self._results.put(None)
+        await asyncio.to_thread(self._reader.join, 5)
+        self._log_listener.stop()
+        logger.info("Пул воркеров обхода остановлен")
+
+    def stats(self):
+        alive = [w for w in self._workers.values() if w.process.is_alive()]
+        return {
+            "workers_alive": len(alive),
+            "workers_ready": sum(1 for w in alive if w.ready),
+            "tasks_in_flight": sum(len(w.in_flight) for w in self._workers.values()),
+            "served": self.served,
+            "recycles": self.recycles,
+            "crashes": self.crashes,
+        }
+
+    async def run(self, *args):
+        """Выполнить runner(*args) в свободном воркере и вернуть его результат."""
+        if not self._started:
+            raise RuntimeError("Пул воркеров не запущен")
+        while True:
+            worker = self._workers.get(await self._free.get())
+            if worker is not None and not worker.retiring:
+                break  # Слоты ушедших воркеров просто выбрасываем
+
+        task_id = next(self._task_ids)
+        future = self._loop.create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())  # Ответ мог прийти уже без ожидающего
+        worker.in_flight[task_id] = future
+        worker.served += 1
+        self.served += 1
+        worker.tasks.put((task_id, args))
+        if self.max_tasks and worker.served >= self.max_tasks:
+            self._retire(worker)
+
+        try:
+            # shield: при отмене снаружи (дедлайн цикла) слот освободится, только когда воркер ответит
+            return await asyncio.wait_for(asyncio.shield(future), self.task_timeout or None)
+        except asyncio.TimeoutError:
+            if not future.done():
+                logger.error(f"Воркер {worker.id}: задача не завершилась за {self.task_timeout} сек — перезапускаем воркер")
+                worker.process.kill()
+            raise WorkerCrashed(f"воркер не ответил за {self.task_timeout} сек") from None
+
+    # ---------- внутреннее ----------
+    def _spawn(self):
+        worker_id = next(self._worker_ids)
+        tasks = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            name=f"crawl-worker-{worker_id}",
+            args=(worker_id, self.runner, self.initializer, self.teardown, tasks, self._results, self._log_queue),
+            daemon=True
+        )
+        process.start()
+        worker = _Worker(worker_id, process, tasks)
+        self._workers[worker_id] = worker
+        logger.info(f"Воркер {worker_id} стартует (pid {process.pid})")
+        return worker
+
+    def _retire(self, worker):
+        worker.retiring = True
+        logger.info(f"Воркер {worker.id}: {worker.served} задач — перезапуск после текущих")
+        if not worker.in_flight:
+            worker.tasks.put(None)
+
+    def _read_results(self):
+        """Поток: результаты из общей очереди — в главный loop."""
+        while True:
+            try:
+                message = self._results.get()
+            except (EOFError, OSError):
+                return
+            if message is None:
+                return
+            try:
+                self._loop.call_soon_threadsafe(self._on_message, *message)
+            except RuntimeError:
+                return  # loop уже закрыт
+
+    def _on_message(self, kind, worker_id, task_id, result, error):
+        worker = self._workers.get(worker_id)
+        if worker is None:
+            return
+        if kind == 'ready':
+            # Слоты появляются только после импорта и инициализации: таймаут задачи не включает старт воркера
+            worker.ready = True
+            for _ in range(self.slots):
+                self._free.put_nowait(worker.id)
+            return
+        if kind != 'done':
+            return
+        self._recent_crashes = 0
+        future = worker.in_flight.pop(task_id, None)
+        if future is not None and not future.done():
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
+        if worker.retiring:
+            if not worker.in_flight:
+                worker.tasks.put(None)
+        else:
+            self._free.put_nowait(worker.id)
+
+    def _fail(self, worker, error):
+        for future in worker.in_flight.values():
+            if not future.done():
+                future.set_exception(error)
+        worker.in_flight.clear()
+
+    async def _watch(self):
+        """Раз в секунду: убрать завершившиеся воркеры и добрать пул до processes."""
+        while True:
+            await asyncio.sleep(1)
+            for worker in list(self._workers.values()):
+                if worker.process.is_alive():
+                    continue
+                worker.process.join(0)
+                code = worker.process.exitcode
+                del self._workers[worker.id]
+                if worker.retiring and code == 0 and not worker.in_flight:
+                    self.recycles += 1
+                    self._recent_crashes = 0
+                    reason = 'recycle'
+                    logger.info(f"Воркер {worker.id} перезапущен после {worker.served} задач")
+                else:
+                    self.crashes += 1
+                    self._recent_crashes += 1
+                    reason = 'crash'
+                    # Подряд падающие воркеры не должны крутиться в цикле: пауза 1, 2, 4… до 60 сек
+                    self._next_spawn_at = time.monotonic() + min(60, 2 ** (self._recent_crashes - 1))
+                    logger.error(f"Воркер {worker.id} завершился с кодом {code}, "
+                                 f"незавершённых задач: {len(worker.in_flight)}")
+                    self._fail(worker, WorkerCrashed(f"воркер завершился с кодом {code}"))
+                if self.on_restart is not None:
+                    self.on_restart(reason)
+
+            active = sum(1 for w in self._workers.values() if not w.retiring)
+            while active < self.processes and time.monotonic() >= self._next_spawn_at:
+                self._spawn()
+                active += 1
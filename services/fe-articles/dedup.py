@@ -0,0 +1,162 @@
+# dedup.py — канонизация URL и компактное множество уже виденных статей
+
+import hashlib
+import threading
+from array import array
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Параметры-метки рекламы/аналитики: на содержимое страницы не влияют ни на одном сайте.
+# Неоднозначные (ref, from, source, share, si...) здесь не место: на части сайтов это параметры
+# содержимого, и разные статьи склеились бы в одну — такие ресурс убирает сам через drop_params.
+TRACKING_PARAMS = frozenset([
+    'fbclid', 'gclid', 'dclid', 'yclid', 'ysclid', 'msclkid', 'mc_cid', 'mc_eid', 'igshid',
+    '_openstat', '_ga', '_gl', 'ref_src', 'spm',
+])
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_', 'vero_')
+
+DEFAULT_CANONICAL_OPTIONS = {
+    'strip_www': True,             # www.example.com → example.com
+    'strip_trailing_slash': True,  # /post/1/ → /post/1
+    'ignore_scheme': True,         # http и https считаются одним адресом
+    'drop_query': False,           # Выкинуть query целиком (для сайтов, где он только мешает)
+    'drop_params': [],             # Дополнительные параметры для удаления (например, ["ref", "from", "share"])
+    'keep_params': [],             # Никогда не удалять эти параметры (даже если похожи на метки)
+}
+
+
+def canonical_options(overrides=None):
+    if not overrides:
+        return DEFAULT_CANONICAL_OPTIONS
+    options = dict(DEFAULT_CANONICAL_OPTIONS)
+    options.update({k: v for k, v in overrides.items() if k in DEFAULT_CANONICAL_OPTIONS})
+    return options
+
+
+def canonicalize_url(url, options=None):
+    """
+    Приводит URL к виду для сравнения: без фрагмента, меток трекинга, www., порта по умолчанию
+    и завершающего слэша; оставшиеся параметры сортируются. Для перехода по ссылке не предназначен.
+    """
+    options = canonical_options(options)
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if options['strip_www'] and host.startswith('www.'):
+        host = host[4:]
+    if (scheme, port) in (('http', 80), ('https', 443)):
+        port = None
+    netloc = f"{host}:{port}" if port else host
+    if options['ignore_scheme'] and scheme in ('http', 'https'):
+        scheme = 'https'
+
+    path = parts.path or '/'
+    if options['strip_trailing_slash'] and len(path) > 1:
+        path = path.rstrip('/') or '/'
+
+    query = ''
+    if parts.query and not options['drop_query']:
+        drop = set(options['drop_params'])
+        keep = set(options['keep_params'])
+        params = [
+            (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if k in keep or not (k in drop or k.lower() in TRACKING_PARAMS or k.lower().startswith(TRACKING_PREFIXES))
+        ]
+        query = urlencode(sorted(params))
+
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def url_fingerprint(source, canonical_url):
+    """64-битный отпечаток (источник, канонический URL); 0 зарезервирован под пустую ячейку."""
+    digest = hashlib.blake2b(f"{source}\x00{canonical_url}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+class _Generation:
+    """Таблица с открытой адресацией на array('Q') + необязательный Bloom-фильтр перед ней."""
+
+    def __init__(self, capacity, bloom_bits_per_item):
+        size = 1
+        while size < capacity * 2:  # Заполненность не выше 50% — короткие цепочки проб
+            size <<= 1
+        self.mask = size - 1
+        self.table = array('Q', bytes(8 * size))
+        self.capacity = capacity
+        self.count = 0
+        self.bloom = None
+        if bloom_bits_per_item:
+            self.bloom_bits = max(64, capacity * bloom_bits_per_item)
+            self.bloom = bytearray((self.bloom_bits + 7) // 8)
+            self.bloom_k = max(1, round(bloom_bits_per_item * 0.69))  # k = m/n · ln2
+
+    def _bloom_positions(self, fp):
+        h1, h2 = fp & 0xFFFFFFFF, (fp >> 32) | 1
+        return ((h1 + i * h2) % self.bloom_bits for i in range(self.bloom_k))
+
+    def __contains__(self, fp):
+        if self.bloom is not None:
+            for pos in self._bloom_positions(fp):
+                if not self.bloom[pos >> 3] & (1 << (pos & 7)):
+                    return False  # Точно не видели — таблицу не трогаем
+        idx = fp & self.mask
+        table = self.table
+        while table[idx]:
+            if table[idx] == fp:
+                return True
+            idx = (idx + 1) & self.mask
+        return False
+
+    def add(self, fp):
+        idx = fp & self.mask
+        table = self.table
+        while table[idx]:
+            if table[idx] == fp:
+                return
+            idx = (idx + 1) & self.mask
+        table[idx] = fp
+        self.count += 1
+        if self.bloom is not None:
+            for pos in self._bloom_positions(fp):
+                self.bloom[pos >> 3] |= 1 << (pos & 7)
+
+
+class SeenSet:
+    """
+    Множество отпечатков фиксированного размера. Два поколения по capacity/2: когда текущее
+    заполнено, предыдущее выбрасывается целиком — память не растёт, забываются самые старые.
+    Забытый URL не станет «новым»: окончательное решение принимает уникальный индекс в SQLite.
+    """
+
+    def __init__(self, capacity=200_000, bloom_bits_per_item=10):
+        self.generation_capacity = max(1024, capacity // 2)
+        self.bloom_bits_per_item = bloom_bits_per_item
+        self._lock = threading.Lock()
+        self._current = _Generation(self.generation_capacity, bloom_bits_per_item)
+        self._previous = None
+        self.rotations = 0
+
+    def __contains__(self, fp):
+        with self._lock:
+            return fp in self._current or (self._previous is not None and fp in self._previous)
+
+    def __len__(self):
+        return self._current.count + (self._previous.count if self._previous else 0)
+
+    def add(self, fp):
+        with self._lock:
+            if self._current.count >= self.generation_capacity:
+                self._previous = self._current
+                self._current = _Generation(self.generation_capacity, self.bloom_bits_per_item)
+                self.rotations += 1
+            self._current.add(fp)
+
+    def memory_bytes(self):
+        total = 0
+        for gen in (self._current, self._previous):
+            if gen is not None:
+                total += gen.table.itemsize * len(gen.table) + (len(gen.bloom) if gen.bloom is not None else 0)
+        return total
@@ -0,0 +1,300 @@
+# extraction.py — движки извлечения статей из HTML (soup — эталон, lxml — быстрый, stream — с ранней остановкой)
+
+import html as html_lib
+import logging
+import re
+import time
+import warnings
+from functools import lru_cache
+from urllib.parse import urljoin
+
+from cssselect import HTMLTranslator, SelectorError
+from lxml import etree
+import lxml.html
+
+logger = logging.getLogger('fe_articles.extraction')
+
+NO_TITLE = "Без заголовка"
+MISSING_TITLE = "—"
+
+
+# ====================== SOUP (эталон) ======================
+def clean_title_text(title):
+    """Эталонная очистка: повторный разбор заголовка через BeautifulSoup."""
+    from bs4 import BeautifulSoup  # bs4 нужен только эталонному движку — не грузим его при старте
+    with warnings.catch_warnings(record=True) as w:
+        clean_title = BeautifulSoup(title, "lxml").get_text(strip=True)
+        for warning in w:
+            msg = str(warning.message)
+            if "strip_cdata" not in msg:
+                logger.warning(f"Предупреждение для заголовка '{title}': {msg} (файл: {warning.filename}, строка: {warning.lineno})")
+    return clean_title or NO_TITLE
+
+
+class SoupExtractor:
+    """Исходный код parse_resource: BeautifulSoup + soupsieve. Медленно, но это эталон."""
+
+    name = 'soup'
+
+    def clean_title(self, title):
+        return clean_title_text(title)
+
+    def extract(self, html, resource, limit=20, stats=None):
+        from bs4 import BeautifulSoup
+
+        started = time.perf_counter()
+        soup = BeautifulSoup(html, 'lxml')
+        parsed = time.perf_counter()
+        items = soup.select(resource['item_selector'])
+        logger.info(f"Найдено {len(items)} элементов, берём первые {limit}")
+        if stats is not None:
+            stats.update(matched=len(items), parse_seconds=parsed - started, select_seconds=time.perf_counter() - parsed)
+
+        data = []
+        for item in items[:limit]:
+            title_tag = item.select_one(resource['title_selector'])
+            link_tag = item.select_one(resource['link_selector'])
+
+            title = title_tag.get_text(strip=True) if title_tag else MISSING_TITLE
+            link = link_tag['href'] if link_tag and link_tag.has_attr('href') else None
+            if link:
+                link = urljoin(resource['url'], link)
+                if not link.startswith('http'):
+                    continue
+
+                data.append({
+                    "title": self.clean_title(title),
+                    "url": link
+                })
+        return data
+
+
+# ====================== LXML (быстрый) ======================
+# Только то, что HTML-парсер эталона сочтёт разметкой: тег (буква после '<') или комментарий.
+# Одиночные '<' и '>' в тексте («x < 5», «<-- назад») — обычные символы и остаются.
+_TAG_RE = re.compile(r'<!--.*?-->|</?[A-Za-z][^>]*>', re.S)
+_SKIP_TEXT_TAGS = frozenset(['script', 'style', 'template'])
+_XML_DECL_RE = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+
+def normalize_title(title):
+    """
+    Дешёвая замена повторного разбора: то же, что BeautifulSoup(title).get_text(strip=True) —
+    куски текста между тегами без сущностей, каждый обрезан, склейка без разделителя.
+    """
+    if '<' in title:
+        parts = (html_lib.unescape(part).strip() for part in _TAG_RE.split(title))
+        title = ''.join(part for part in parts if part)
+    elif '&' in title:
+        title = html_lib.unescape(title)
+    return title.strip() or NO_TITLE
+
+
+def element_text(el):
+    """Аналог Tag.get_text(strip=True): каждый текстовый кусок обрезается, склейка без разделителя."""
+    parts = []
+
+    def walk(node):
+        if isinstance(node.tag, str) and node.tag.lower() not in _SKIP_TEXT_TAGS and node.text:
+            part = node.text.strip()
+            if part:
+                parts.append(part)
+        if isinstance(node.tag, str) and node.tag.lower() in _SKIP_TEXT_TAGS:
+            pass
+        else:
+            for child in node:
+                walk(child)
+                if child.tail:
+                    part = child.tail.strip()
+                    if part:
+                        parts.append(part)
+
+    walk(el)
+    return ''.join(parts)
+
+
+class CompiledSelectors:
+    """Селекторы ресурса, переведённые в XPath один раз."""
+
+    def __init__(self, item_selector, title_selector, link_selector):
+        translator = HTMLTranslator()
+        self.item = etree.XPath(translator.css_to_xpath(item_selector))
+        # select_one() в soupsieve ищет только среди потомков — сам элемент не подходит
+        self.title = etree.XPath(translator.css_to_xpath(title_selector, prefix='descendant::'))
+        self.link = etree.XPath(translator.css_to_xpath(link_selector, prefix='descendant::'))
+
+
+@lru_cache(maxsize=512)
+def compile_selectors(item_selector, title_selector, link_selector):
+    return CompiledSelectors(item_selector, title_selector, link_selector)
+
+
+def parse_document(html):
+    if isinstance(html, str):
+        html = _XML_DECL_RE.sub('', html, count=1)
+    try:
+        return lxml.html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        return None  # Пустой документ
+
+
+class LxmlExtractor:
+    """
+    lxml + cssselect: селекторы компилируются в XPath и кэшируются по ресурсу,
+    заголовок чистится без вложенного парсера. Если cssselect не понимает селектор,
+    ресурс обрабатывается эталонным движком.
+    """
+
+    name = 'lxml'
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback or SoupExtractor()
+
+    def clean_title(self, title):
+        return normalize_title(title)
+
+    def extract(self, html, resource, limit=20, stats=None):
+        """
+        stats (dict) — сюда пишутся matched (сколько элементов нашёл item_selector)
+        и время разбора документа / выборки элементов: parse_seconds, select_seconds.
+        """
+        try:
+            selectors = compile_selectors(resource['item_selector'], resource['title_selector'], resource['link_selector'])
+        except SelectorError as e:
+            logger.info(f"lxml: селектор не поддерживается ({e}) — используем soup для {resource.get('name', resource['url'])}")
+            return self.fallback.extract(html, resource, limit, stats)
+
+        started = time.perf_counter()
+        root = parse_document(html)
+        parsed = time.perf_counter()
+        if root is None:
+            logger.info("Найдено 0 элементов (пустой документ)")
+            if stats is not None:
+                stats['matched'] = 0
+            return []
+        items = selectors.item(root)
+        logger.info(f"Найдено {len(items)} элементов, берём первые {limit}")
+        if stats is not None:
+            stats.update(matched=len(items), parse_seconds=parsed - started, select_seconds=time.perf_counter() - parsed)
+        return self.records(selectors, items[:limit], resource)
+
+    def records(self, selectors, items, resource):
+        data = []
+        for item in items:
+            title_tags = selectors.title(item)
+            link_tags = selectors.link(item)
+
+            title = element_text(title_tags[0]) if title_tags else MISSING_TITLE
+            link = link_tags[0].get('href') if link_tags else None
+            if link:
+                link = urljoin(resource['url'], link)
+                if not link.startswith('http'):
+                    continue
+
+                data.append({
+                    "title": self.clean_title(title),
+                    "url": link
+                })
+        return data
+
+
+# ====================== STREAM (ранняя остановка) ======================
+STREAM_FIRST_CHUNK = 64 * 1024
+
+
+def is_closed(el):
+    """
+    Элемент недостроенного дерева закрыт, если парсер уже ушёл дальше: у него или у предка
+    есть следующий узел. Открыты ровно элементы на пути от корня к текущей позиции.
+    """
+    while el is not None:
+        if el.getnext() is not None:
+            return True
+        el = el.getparent()
+    return False
+
+
+def closed_prefix(items):
+    """Найденные элементы до первого незакрытого: открытый предок идёт в документе раньше потомков."""
+    for i, item in enumerate(items):
+        if not is_closed(item):
+            return items[:i]
+    return items
+
+
+class StreamExtractor(LxmlExtractor):
+    """
+    Те же селекторы, что у lxml, но документ подаётся в HTMLPullParser кусками (64 КБ, дальше
+    вдвое больше) и разбор прекращается, как только первые limit элементов item_selector
+    закрыты. На длинных лентах память и время зависят от limit, а не от размера страницы;
+    результат совпадает с lxml. matched в stats — сколько найдено к моменту остановки.
+    """
+
+    name = 'stream'
+
+    def __init__(self, fallback=None, first_chunk=STREAM_FIRST_CHUNK):
+        super().__init__(fallback)
+        self.first_chunk = first_chunk
+
+    def extract(self, html, resource, limit=20, stats=None):
+        try:
+            selectors = compile_selectors(resource['item_selector'], resource['title_selector'], resource['link_selector'])
+        except SelectorError as e:
+            logger.info(f"stream: селектор не поддерживается ({e}) — используем soup для {resource.get('name', resource['url'])}")
+            return self.fallback.extract(html, resource, limit, stats)
+
+        if isinstance(html, bytes):
+            html = html.decode('utf-8', 'replace')
+        declaration = _XML_DECL_RE.match(html[:512])  # Смотрим только начало — без копии всего документа
+        parser = etree.HTMLPullParser(events=('start',), tag='html')
+        root = None
+        items = []
+        parse_seconds = select_seconds = 0.0
+        pos, chunk, stopped = declaration.end() if declaration else 0, self.first_chunk, False
+        while pos < len(html):
+            started = time.perf_counter()
+            parser.feed(html[pos:pos + chunk])
+            pos += chunk
+            chunk *= 2
+            for _, el in parser.read_events():
+                root = el
+            selected = time.perf_counter()
+            parse_seconds += selected - started
+            if root is None or pos >= len(html):
+                continue
+            items = closed_prefix(selectors.item(root))
+            select_seconds += time.perf_counter() - selected
+            if len(items) >= limit:
+                stopped = True
+                break
+
+        if not stopped:
+            started = time.perf_counter()
+            try:
+                root = parser.close()
+            except etree.XMLSyntaxError:
+                root = None  # Пустой документ
+            selected = time.perf_counter()
+            parse_seconds += selected - started
+            items = selectors.item(root) if root is not None else []
+            select_seconds += time.perf_counter() - selected
+
+        if stopped:
+            logger.info(f"Найдено {len(items)} элементов в первых {pos // 1024} КБ из {len(html) // 1024} КБ, берём первые {limit}")
+        else:
+            logger.info(f"Найдено {len(items)} элементов, берём первые {limit}")
+        if stats is not None:
+            stats.update(matched=len(items), parse_seconds=parse_seconds, select_seconds=select_seconds,
+                         parsed_chars=min(pos, len(html)), stopped_early=stopped)
+        return self.records(selectors, items[:limit], resource)
+
+
+EXTRACTORS = {
+    'soup': SoupExtractor(),
+    'lxml': LxmlExtractor(),
+    'stream': StreamExtractor(),
+}
+
+
+def get_extractor(name):
+    return EXTRACTORS.get(name) or EXTRACTORS['lxml']
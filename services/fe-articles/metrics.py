@@ -0,0 +1,192 @@
+# metrics.py — метрики Prometheus для /metrics (свой реестр, без метрик процесса по умолчанию)
+
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import ProcessCollector
+from prometheus_client.core import GaugeMetricFamily
+
+REGISTRY = CollectorRegistry()
+ProcessCollector(registry=REGISTRY)  # RSS/CPU/файлы самого процесса — для подбора размера хоста
+
+_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 40, 80, 180, 360)
+_BYTES_BUCKETS = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+FETCH_SECONDS = Histogram(
+    'fe_articles_fetch_seconds', 'Время загрузки страницы ресурса (без попаданий в кэш)',
+    ['resource', 'via'], buckets=_LATENCY_BUCKETS, registry=REGISTRY
+)
+HTML_BYTES = Histogram(
+    'fe_articles_html_bytes', 'Размер загруженного HTML в байтах (UTF-8)',
+    ['resource', 'via'], buckets=_BYTES_BUCKETS, registry=REGISTRY
+)
+ITEMS_MATCHED = Histogram(
+    'fe_articles_items_matched', 'Сколько элементов нашёл item_selector',
+    ['resource'], buckets=_COUNT_BUCKETS, registry=REGISTRY
+)
+ITEMS_KEPT = Histogram(
+    'fe_articles_items_kept', 'Сколько статей осталось после лимита и фильтра ссылок',
+    ['resource'], buckets=_COUNT_BUCKETS, registry=REGISTRY
+)
+NEW_ARTICLES = Counter(
+    'fe_articles_new_articles_total', 'Новые статьи после дедупа',
+    ['resource'], registry=REGISTRY
+)
+FETCH_OUTCOMES = Counter(
+    'fe_articles_fetch_outcomes_total', 'Итог проверки ресурса: changed, not_modified, unchanged_hash, error',
+    ['resource', 'outcome'], registry=REGISTRY
+)
+PAGE_CACHE_HITS = Counter(
+    'fe_articles_page_cache_hits_total', 'Страница взята из кэша вместо загрузки',
+    ['resource', 'via'], registry=REGISTRY
+)
+BROWSER_LAUNCH_SECONDS = Histogram(
+    'fe_articles_browser_launch_seconds', 'Время запуска Chromium в пуле',
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 10, 20), registry=REGISTRY
+)
+BROWSER_WAIT_SECONDS = Histogram(
+    'fe_articles_browser_wait_seconds', 'Ожидание готовности страницы после загрузки по политике и исходу',
+    ['policy', 'outcome'], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30), registry=REGISTRY
+)
+BROWSER_GOTO_FAILURES = Counter(
+    'fe_articles_browser_goto_failures_total', 'Неудачные попытки goto по типу ошибки',
+    ['error'], registry=REGISTRY
+)
+REQUESTS_BLOCKED = Counter(
+    'fe_articles_requests_blocked_total', 'Запросы страницы, заблокированные фильтром при рендере в браузере',
+    ['resource', 'type'], registry=REGISTRY
+)
+BLOCKED_BYTES_SAVED = Counter(
+    'fe_articles_blocked_bytes_saved_total', 'Оценка байт, не загруженных из-за фильтра запросов',
+    ['resource'], registry=REGISTRY
+)
+BROWSER_BYTES_RECEIVED = Counter(
+    'fe_articles_browser_bytes_received_total', 'Байт, реально загруженных страницей в браузере (ответы с заголовками)',
+    ['resource'], registry=REGISTRY
+)
+CIRCUIT_SKIPS = Counter(
+    'fe_articles_circuit_skips_total', 'Ресурс пропущен в цикле: отключён после ошибок подряд',
+    ['resource'], registry=REGISTRY
+)
+CYCLE_SECONDS = Histogram(
+    'fe_articles_cycle_seconds', 'Длительность цикла: full — общий, pipeline — потоковый, resource — задача ресурса',
+    ['kind'], buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 3600), registry=REGISTRY
+)
+SCHEDULER_LAG_SECONDS = Histogram(
+    'fe_articles_scheduler_lag_seconds', 'Опоздание запуска задачи относительно запланированного времени',
+    buckets=(0.01, 0.1, 0.5, 1, 5, 15, 60, 300), registry=REGISTRY
+)
+CRAWL_WORKER_RESTARTS = Counter(
+    'fe_articles_crawl_worker_restarts_total', 'Перезапуски воркеров обхода: recycle — по лимиту задач, crash — падение',
+    ['reason'], registry=REGISTRY
+)
+TELEGRAM_SEND_SECONDS = Histogram(
+    'fe_articles_telegram_send_seconds', 'Время одного вызова sendMessage',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30), registry=REGISTRY
+)
+TELEGRAM_SEND_FAILURES = Counter(
+    'fe_articles_telegram_send_failures_total', 'Неудачные вызовы sendMessage по типу ошибки',
+    ['error'], registry=REGISTRY
+)
+
+
+def gauge(name, documentation, func):
+    """Gauge, значение которого читается в момент сбора метрик."""
+    metric = Gauge(name, documentation, registry=REGISTRY)
+    metric.set_function(func)
+    return metric
+
+
+class _LabeledGauge:
+    def __init__(self, name, documentation, labels, func):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.func = func
+
+    def collect(self):
+        family = GaugeMetricFamily(self.name, self.documentation, labels=self.labels)
+        for label_values, value in self.func():
+            family.add_metric(label_values, value)
+        yield family
+
+
+def labeled_gauge(name, documentation, labels, func):
+    """Gauge с метками, читается в момент сбора: func() -> [(значения меток, значение), ...]."""
+    collector = _LabeledGauge(name, documentation, labels, func)
+    REGISTRY.register(collector)
+    return collector
+
+
+def render():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+# ---------- процессы-воркеры обхода ----------
+# /metrics отдаёт только главный процесс. В воркере Counter/Histogram модуля подменяются
+# записью наблюдений; они уходят родителю вместе с результатом задачи и там применяются к настоящим метрикам.
+# Поэтому метрики берутся как metrics.NAME в момент наблюдения — сохранённая заранее ссылка
+# (например, metrics.X.observe в колбэке) писала бы в реестр воркера, который никто не читает.
+_events = None  # Наблюдения вне задачи (фоновые задачи воркера) — уходят с ближайшим результатом
+_task_events = contextvars.ContextVar('fe_articles_metric_events', default=None)
+
+
+class _Recorder:
+    def __init__(self, name, label_values=()):
+        self.name = name
+        self.label_values = label_values
+
+    def labels(self, *label_values):
+        return _Recorder(self.name, label_values)
+
+    def inc(self, amount=1):
+        self._record('inc', amount)
+
+    def observe(self, value):
+        self._record('observe', value)
+
+    def _record(self, method, value):
+        events = _task_events.get()
+        (events if events is not None else _events).append((self.name, self.label_values, method, value))
+
+
+def record_for_parent():
+    """Вызывается в воркере до первой задачи: дальше наблюдения копятся до task_events()/take_events()."""
+    global _events
+    _events = []
+    for name, metric in list(globals().items()):
+        if isinstance(metric, (Counter, Histogram)):
+            globals()[name] = _Recorder(name)
+
+
+@contextmanager
+def task_events():
+    """Свой буфер наблюдений на задачу (и её подзадачи): параллельные задачи воркера не смешиваются."""
+    events = []
+    token = _task_events.set(events)
+    try:
+        yield events
+    finally:
+        _task_events.reset(token)
+
+
+def take_events():
+    """Наблюдения вне задач (и очистка буфера); в главном процессе — пусто."""
+    if not _events:
+        return []
+    events = list(_events)
+    del _events[:len(events)]
+    return events
+
+
+def apply_events(events):
+    """В главном процессе: повторить наблюдения воркера на настоящих метриках."""
+    for name, label_values, method, value in events or ():
+        metric = globals().get(name)
+        if not isinstance(metric, (Counter, Histogram)):
+            continue
+        if label_values:
+            metric = metric.labels(*label_values)
+        getattr(metric, method)(value)
@@ -0,0 +1,225 @@
+# page_cache.py — дисковый кэш загруженных страниц (gzip + метаданные) с TTL и LRU по размеру
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('fe_articles.page_cache')
+
+
+def cache_key(url, via):
+    return hashlib.sha1(f"{via}\x00{url}".encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    """
+    Страницы по ключу (URL, способ загрузки): <key>.html.gz с HTML и <key>.json с метаданными.
+    Записи старше ttl секунд не отдаются; когда сжатый объём превышает max_bytes, удаляются
+    давно не читанные. Индекс держится в памяти и строится по каталогу при первом обращении;
+    если каталог изменил другой процесс (воркеры обхода), индекс перечитывается.
+    ttl = 0 — кэш выключен (get всегда промах, put ничего не пишет).
+    """
+
+    def __init__(self, directory, ttl=300, max_bytes=200 * 1024 * 1024, compress_level=6):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self._index = None  # key -> meta (с полем used_at для LRU)
+        self._dir_mtime = None  # mtime каталога, по которому построен индекс
+        self._meta_mtimes = {}  # key -> mtime файла метаданных: при перечитывании каталога читаем только изменённые
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    # ---------- чтение ----------
+    def get(self, url, via, max_age=None):
+        """(html, meta) свежей записи или None. max_age (сек) строже ttl — для снимков можно больше."""
+        if not self.enabled:
+            return None
+        key = cache_key(url, via)
+        with self._lock:
+            meta = self._load_index().get(key)
+            max_age = self.ttl if max_age is None else max_age
+            if meta is None or time.time() - meta['fetched_at'] > max_age:
+                self.misses += 1
+                return None
+            html = self._read(key)
+            if html is None:
+                self._drop(key)
+                self.misses += 1
+                return None
+            meta['used_at'] = time.time()
+            self.hits += 1
+            return html, dict(meta)
+
+    def latest(self, url):
+        """Последний снимок URL любым способом загрузки, без учёта TTL (для /debug)."""
+        with self._lock:
+            candidates = [m for m in self._load_index().values() if m['url'] == url]
+            for meta in sorted(candidates, key=lambda m: m['fetched_at'], reverse=True):
+                html = self._read(meta['key'])
+                if html is not None:
+                    meta['used_at'] = time.time()
+                    return html, dict(meta)
+        return None
+
+    def snapshots(self, limit=50):
+        with self._lock:
+            entries = sorted(self._load_index().values(), key=lambda m: m['fetched_at'], reverse=True)
+            return [dict(m) for m in entries[:limit]]
+
+    def stats(self):
+        """Последние известные значения, без обращения к диску (читается из /metrics на каждом сборе)."""
+        with self._lock:
+            return {
+                "entries": len(self._index or ()),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    # ---------- запись ----------
+    def put(self, url, via, html, **extra):
+        """Сохраняет страницу; extra (валидаторы, статус и т.п.) попадает в метаданные."""
+        if not self.enabled:
+            return None
+        key = cache_key(url, via)
+        data = gzip.compress(html.encode('utf-8'), compresslevel=self.compress_level)
+        now = time.time()
+        meta = {
+            'key': key,
+            'url': url,
+            'via': via,
+            'fetched_at': now,
+            'used_at': now,
+            'length': len(html),
+            'compressed_bytes': len(data),
+            **extra,
+        }
+        with self._lock:
+            index = self._load_index()
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp = f"{path}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            with open(f"{self._meta_path(key)}.tmp", 'w', encoding='utf-8') as f:
+                json.dump({k: v for k, v in meta.items() if k != 'used_at'}, f, ensure_ascii=False)
+            os.replace(f"{self._meta_path(key)}.tmp", self._meta_path(key))
+            self._meta_mtimes[key] = self._file_mtime(self._meta_path(key))
+            if key in index:
+                self._bytes -= index[key]['compressed_bytes']
+            index[key] = meta
+            self._bytes += len(data)
+            self._evict()
+            self._dir_mtime = self._directory_mtime()  # Свои изменения индекс уже учёл
+        return dict(meta)
+
+    def invalidate(self, url, via=None):
+        with self._lock:
+            index = self._load_index()
+            for key in [k for k, m in index.items() if m['url'] == url and (via is None or m['via'] == via)]:
+                self._drop(key)
+            self._dir_mtime = self._directory_mtime()
+
+    # ---------- внутреннее ----------
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.html.gz")
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return gzip.decompress(f.read()).decode('utf-8')
+        except (OSError, EOFError, UnicodeDecodeError) as e:
+            logger.warning(f"Кэш страниц: не удалось прочитать {key}: {e}")
+            return None
+
+    def _directory_mtime(self):
+        return self._file_mtime(self.directory)
+
+    @staticmethod
+    def _file_mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_index(self):
+        mtime = self._directory_mtime()
+        if self._index is not None and mtime == self._dir_mtime:
+            return self._index
+        reload = self._index is not None
+        previous = self._index or {}
+        previous_mtimes = self._meta_mtimes
+        self._index = {}
+        self._meta_mtimes = {}
+        self._bytes = 0
+        self._dir_mtime = mtime
+        if os.path.isdir(self.directory):
+            # Каталог меняется при каждой записи (в том числе воркерами): заново читаются только
+            # новые и переписанные метаданные, остальные берутся из прежнего индекса по mtime файла
+            names = set(os.listdir(self.directory))
+            for name in names:
+                if not name.endswith('.json'):
+                    continue
+                key = name[:-5]
+                if f"{key}.html.gz" not in names:
+                    continue
+                meta_mtime = self._file_mtime(os.path.join(self.directory, name))
+                known = previous.get(key)
+                if known is not None and meta_mtime is not None and previous_mtimes.get(key) == meta_mtime:
+                    meta = known
+                else:
+                    try:
+                        with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                            meta = json.load(f)
+                        meta['used_at'] = known['used_at'] if known else os.path.getatime(self._path(meta['key']))
+                    except (OSError, ValueError, KeyError):
+                        continue
+                self._index[meta['key']] = meta
+                self._meta_mtimes[meta['key']] = meta_mtime
+                self._bytes += meta.get('compressed_bytes', 0)
+            if not reload:
+                logger.info(f"Кэш страниц: {len(self._index)} записей, {self._bytes // 1024} КБ")
+        return self._index
+
+    def _drop(self, key):
+        meta = self._index.pop(key, None)
+        self._meta_mtimes.pop(key, None)
+        if meta:
+            self._bytes -= meta.get('compressed_bytes', 0)
+        for path in (self._path(key), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        now = time.time()
+        # Сначала протухшие (снимки для /debug держим до 10×TTL), затем давно не читанные
+        for key in [k for k, m in self._index.items() if now - m['fetched_at'] > self.ttl * 10]:
+            self._drop(key)
+            self.evictions += 1
+        if self._bytes <= self.max_bytes:
+            return
+        for meta in sorted(self._index.values(), key=lambda m: m['used_at']):
+            if self._bytes <= self.max_bytes:
+                break
+            self._drop(meta['key'])
+            self.evictions += 1
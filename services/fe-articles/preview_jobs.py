@@ -0,0 +1,110 @@
+# preview_jobs.py — фоновые задачи «Спарсить сейчас» для веб-интерфейса с кэшем результатов
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger('fe_articles.preview_jobs')
+
+# Поля ресурса, от которых зависит результат парсинга (имя и пауза не влияют)
+PREVIEW_KEY_FIELDS = (
+    'url', 'item_selector', 'title_selector', 'link_selector', 'fetch_mode', 'allow_url_patterns',
+    'block_requests', 'block_resource_types', 'block_url_patterns', 'extract_in_browser', 'extract_engine',
+    'wait_policy', 'wait_min_items', 'wait_timeout_seconds', 'wait_delay_seconds',
+)
+
+
+def preview_key(resource):
+    payload = json.dumps({f: resource.get(f) for f in PREVIEW_KEY_FIELDS}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class PreviewJobs:
+    """
+    Задачи предпросмотра на главном event loop. Запрос из Flask только ставит задачу и сразу
+    получает её id. Одинаковые определения ресурса (см. PREVIEW_KEY_FIELDS) не запускают второй
+    парсинг: пока задача идёт — возвращается она же, после — её результат в течение ttl секунд.
+    """
+
+    def __init__(self, runner, ttl=120, max_jobs=100):
+        self._runner = runner  # async runner(resource, force_refresh) -> (data, error)
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs = {}
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+    def submit(self, resource, loop, force=False):
+        """
+        Вызывается из потока Flask; loop — главный event loop приложения.
+        force — не брать готовый результат из кэша (идущая задача всё равно переиспользуется).
+        """
+        key = preview_key(resource)
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(self._by_key.get(key))
+            if job is not None and force and job['status'] != 'pending':
+                job = None
+            if job is not None:
+                logger.info(f"Предпросмотр {resource.get('url')}: используем задачу {job['id']} ({job['status']})")
+                return job['id']
+            job = {
+                'id': uuid.uuid4().hex[:12],
+                'key': key,
+                'resource': dict(resource),
+                'status': 'pending',
+                'data': None,
+                'error': None,
+                'created_at': time.time(),
+                'finished_at': None,
+            }
+            self._jobs[job['id']] = job
+            self._by_key[key] = job['id']
+
+        future = asyncio.run_coroutine_threadsafe(self._runner(dict(resource), force), loop)
+        future.add_done_callback(lambda f: self._finish(job, f))
+        logger.info(f"Предпросмотр {resource.get('url')}: задача {job['id']} поставлена")
+        return job['id']
+
+    def get(self, job_id):
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    # ---------- внутреннее ----------
+    def _finish(self, job, future):
+        try:
+            data, error = future.result()
+        except Exception as e:
+            data, error = None, str(e)
+        with self._lock:
+            job.update(
+                status='error' if error else 'done',
+                data=data,
+                error=error,
+                finished_at=time.time()
+            )
+            if error and self._by_key.get(job['key']) == job['id']:
+                # Ошибку не кэшируем: следующий клик пробует заново
+                del self._by_key[job['key']]
+        logger.info(f"Предпросмотр {job['id']}: {job['status']}, статей {len(data or [])}")
+
+    def _expire(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job['finished_at'] and now - job['finished_at'] > self.ttl:
+                self._forget(job_id)
+        # Защита от разрастания: выкидываем самые старые завершённые
+        finished = sorted((j for j in self._jobs.values() if j['finished_at']), key=lambda j: j['finished_at'])
+        while len(self._jobs) > self.max_jobs and finished:
+            self._forget(finished.pop(0)['id'])
+
+    def _forget(self, job_id):
+        job = self._jobs.pop(job_id)
+        if self._by_key.get(job['key']) == job_id:
+            del self._by_key[job['key']]
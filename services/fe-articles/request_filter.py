@@ -0,0 +1,132 @@
+# request_filter.py — блокировка лишних запросов (картинки, шрифты, аналитика) при рендере в браузере
+
+import asyncio
+import logging
+
+logger = logging.getLogger('fe_articles.request_filter')
+
+# Примерный вес заблокированного запроса по типу (байты) — начальная оценка. Реальный размер
+# у отменённого запроса неизвестен, поэтому каждый фильтр уточняет свою копию средним
+# по незаблокированным ответам той же страницы.
+_ESTIMATED_BYTES = {
+    'image': 30_000,
+    'media': 200_000,
+    'font': 40_000,
+    'stylesheet': 15_000,
+    'script': 25_000,
+    'xhr': 5_000,
+    'fetch': 5_000,
+    'other': 5_000,
+}
+
+
+def split_list(value):
+    """'a, b,c' или ['a', 'b'] → ['a', 'b', 'c'] (пустые элементы отбрасываются)."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [v.strip() for v in value if v and v.strip()]
+
+
+class RequestFilter:
+    """
+    Фильтр запросов на контексте Playwright: блокирует типы ресурсов и URL по подстроке.
+    allow_patterns имеют приоритет над блокировками (для сайтов, которым нужен свой JS).
+    Основной документ не блокируется никогда.
+    """
+
+    def __init__(self, block_types=(), block_patterns=(), allow_patterns=()):
+        self.block_types = set(block_types)
+        self.block_patterns = list(block_patterns)
+        self.allow_patterns = list(allow_patterns)
+        self.blocked = 0
+        self.blocked_by_type = {}
+        self.bytes_saved_estimate = 0
+        self.bytes_received = 0
+        self._estimated_bytes = dict(_ESTIMATED_BYTES)
+        self._pending = []
+
+    @classmethod
+    def for_resource(cls, resource, default_types, default_patterns):
+        """
+        Настройки ресурса (все необязательные):
+          block_requests: false      — не фильтровать вовсе (вернёт None);
+          block_resource_types       — заменить глобальный список типов;
+          block_url_patterns         — добавить к глобальным шаблонам URL;
+          allow_url_patterns         — никогда не блокировать такие URL.
+        """
+        if resource.get('block_requests') is False:
+            return None
+        types = resource.get('block_resource_types')
+        return cls(
+            block_types=split_list(types) if types is not None else default_types,
+            block_patterns=list(default_patterns) + split_list(resource.get('block_url_patterns')),
+            allow_patterns=split_list(resource.get('allow_url_patterns'))
+        )
+
+    def should_block(self, url, resource_type):
+        if resource_type == 'document':
+            return False
+        if any(p in url for p in self.allow_patterns):
+            return False
+        if resource_type in self.block_types:
+            return True
+        return any(p in url for p in self.block_patterns)
+
+    async def install(self, page):
+        await page.context.route("**/*", self._handle)
+        page.on("requestfinished", self._on_finished)
+
+    async def finish(self):
+        """Дождаться подсчёта размеров завершённых запросов."""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+            self._pending.clear()
+
+    def summary(self):
+        """Итог по странице — для метрик (fe_articles_requests_blocked_total и соседних)."""
+        return {
+            "blocked": self.blocked,
+            "blocked_by_type": dict(self.blocked_by_type),
+            "bytes_saved_estimate": self.bytes_saved_estimate,
+            "bytes_received": self.bytes_received,
+        }
+
+    def describe(self):
+        by_type = ", ".join(f"{t}: {n}" for t, n in sorted(self.blocked_by_type.items()))
+        return (f"заблокировано {self.blocked} запросов ({by_type or '—'}), "
+                f"≈ сэкономлено {self.bytes_saved_estimate // 1024} КБ, загружено {self.bytes_received // 1024} КБ")
+
+    # ---------- внутреннее ----------
+    async def _handle(self, route):
+        request = route.request
+        resource_type = request.resource_type
+        if self.should_block(request.url, resource_type):
+            self.blocked += 1
+            self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+            self.bytes_saved_estimate += self._estimated_bytes.get(resource_type, self._estimated_bytes['other'])
+            try:
+                await route.abort()
+            except Exception:
+                pass  # Страница уже закрыта
+            return
+        try:
+            await route.continue_()
+        except Exception:
+            pass
+
+    def _on_finished(self, request):
+        self._pending.append(asyncio.ensure_future(self._account(request)))
+
+    async def _account(self, request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        body = sizes.get('responseBodySize', 0) or 0
+        self.bytes_received += body + (sizes.get('responseHeadersSize', 0) or 0)
+        # Уточняем оценку веса для типа по реально загруженным ответам
+        resource_type = request.resource_type
+        if body > 0 and resource_type in self._estimated_bytes:
+            self._estimated_bytes[resource_type] = int(self._estimated_bytes[resource_type] * 0.9 + body * 0.1)
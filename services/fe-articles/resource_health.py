@@ -0,0 +1,99 @@
+# resource_health.py — здоровье ресурсов: ошибки подряд, последний успех и отключение падающих источников
+
+import random
+import re
+import time
+
+# Класс ошибки по тексту (сюда доходит уже строка из parse_resource); первое совпадение побеждает
+ERROR_CLASSES = (
+    ('deadline', re.compile(r'лимит цикла')),
+    ('no_articles', re.compile(r'селекторы не найдены|нет статей')),
+    ('worker', re.compile(r'воркер', re.I)),
+    ('http_4xx', re.compile(r"Client error '4\d\d|\bHTTP 4\d\d\b|ERR_HTTP_RESPONSE_CODE_FAILURE", re.I)),
+    ('http_5xx', re.compile(r"Server error '5\d\d|\bHTTP 5\d\d\b", re.I)),
+    ('timeout', re.compile(r'timeout|timed out|таймаут', re.I)),
+    ('dns', re.compile(r'NAME_NOT_RESOLVED|Name or service not known|nodename nor servname|getaddrinfo', re.I)),
+    ('tls', re.compile(r'CERT|SSL', re.I)),
+    ('connection', re.compile(r'connect|refused|reset|ERR_ADDRESS|ERR_NETWORK|ERR_EMPTY_RESPONSE|RemoteProtocolError', re.I)),
+)
+
+
+def classify_error(error_msg):
+    for error_class, pattern in ERROR_CLASSES:
+        if pattern.search(error_msg or ''):
+            return error_class
+    return 'other'
+
+
+class CircuitBreaker:
+    """
+    Состояние здоровья хранится в state['health'] ресурса (сохраняется вместе с resource_state.json):
+      consecutive_failures, last_success_at, last_failure_at, error_class, last_error, retry_at.
+    После failure_threshold ошибок подряд ресурс отключается до retry_at: пауза base_delay,
+    дальше удваивается с каждой ошибкой до max_delay (±jitter). Когда retry_at наступил,
+    ресурс пробуется один раз; успех сбрасывает счётчик, ошибка — отключает на следующую паузу.
+    """
+
+    def __init__(self, failure_threshold=3, base_delay=600, max_delay=21600, jitter=0.1):
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_delay = base_delay
+        self.max_delay = max(base_delay, max_delay)
+        self.jitter = jitter
+
+    @staticmethod
+    def health(state):
+        return state.setdefault('health', {'consecutive_failures': 0})
+
+    def record_success(self, state, now=None):
+        """Возвращает 'recovered', если до этого были ошибки (стоит сообщить), иначе None."""
+        health = self.health(state)
+        failures = health.get('consecutive_failures', 0)
+        health.update(consecutive_failures=0, last_success_at=now or time.time(), retry_at=None)
+        if failures:
+            health['recovered_after'] = failures
+            return 'recovered'
+        return None
+
+    def record_failure(self, state, error_msg, now=None):
+        """
+        Возвращает событие, о котором стоит сообщить: 'failing' — первая ошибка, 'open' — ресурс
+        отключён, 'changed' — ошибка сменила класс; None — повтор уже известной ошибки.
+        """
+        now = now or time.time()
+        health = self.health(state)
+        failures = health.get('consecutive_failures', 0) + 1
+        error_class = classify_error(error_msg)
+        previous_class = health.get('error_class') if failures > 1 else None
+        health.update(consecutive_failures=failures, last_failure_at=now,
+                      error_class=error_class, last_error=(error_msg or '')[:300])
+        health.pop('recovered_after', None)
+
+        if failures >= self.failure_threshold:
+            delay = min(self.max_delay, self.base_delay * 2 ** (failures - self.failure_threshold))
+            health['retry_at'] = now + delay * (1 + random.uniform(-self.jitter, self.jitter))
+        if failures == self.failure_threshold:
+            return 'open'
+        if failures == 1:
+            return 'failing'
+        if error_class != previous_class:
+            return 'changed'
+        return None
+
+    def allows(self, state, now=None):
+        """Можно ли сейчас обращаться к ресурсу (отключение не действует или его срок вышел)."""
+        retry_at = (state or {}).get('health', {}).get('retry_at')
+        return not retry_at or (now or time.time()) >= retry_at
+
+    def retry_delay(self, state, now=None):
+        """Сколько секунд ресурс ещё отключён (0 — не отключён)."""
+        retry_at = (state or {}).get('health', {}).get('retry_at')
+        return max(0.0, retry_at - (now or time.time())) if retry_at else 0.0
+
+    def status(self, state, now=None):
+        """ok / failing (ошибки, но не отключён) / open (отключён) / probing (срок вышел, ждёт попытки)."""
+        health = (state or {}).get('health', {})
+        if not health.get('consecutive_failures'):
+            return 'ok'
+        if not health.get('retry_at'):
+            return 'failing'
+        return 'probing' if self.allows(state, now) else 'open'
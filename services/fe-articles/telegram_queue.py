@@ -0,0 +1,199 @@
+# telegram_queue.py — очередь исходящих сообщений в Telegram: нарезка, лимиты, RetryAfter
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+
+logger = logging.getLogger('fe_articles.telegram_queue')
+
+TELEGRAM_MAX_LENGTH = 4096
+
+
+def split_message(text, limit=TELEGRAM_MAX_LENGTH):
+    """
+    Режет текст на куски не длиннее limit по границам строк. Строка дайджеста — это одна
+    статья или заголовок источника, так что теги <a>/<b> не разрываются. Заголовок источника
+    не остаётся последней строкой куска — он переносится вместе со своими статьями.
+    """
+    if len(text) <= limit:
+        return [text]
+
+    chunks = []
+    current = []
+    size = 0
+    for line in text.split('\n'):
+        # Строка длиннее лимита (например, трейсбек) — режем как есть
+        while len(line) > limit:
+            if current:
+                chunks.append('\n'.join(current))
+                current, size = [], 0
+            chunks.append(line[:limit])
+            line = line[limit:]
+        extra = len(line) + (1 if current else 0)
+        if current and size + extra > limit:
+            # Не оставляем «📍 Источник» (и пустые строки перед ним) в конце куска без статей
+            tail = []
+            while current and (not current[-1].strip() or current[-1].startswith('<b>📍')):
+                tail.insert(0, current.pop())
+            if current:
+                chunks.append('\n'.join(current))
+            current = tail
+            size = len('\n'.join(current))
+            extra = len(line) + (1 if current else 0)
+        current.append(line)
+        size += extra
+    if current and '\n'.join(current).strip():
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def _retry_after_seconds(error):
+    value = error.retry_after
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+class TelegramQueue:
+    """
+    Асинхронная очередь отправки в один чат. Парсинг только кладёт текст в очередь, отдельная
+    задача отправляет: не чаще min_interval секунд и не больше per_minute сообщений в минуту,
+    мелкие сообщения, пришедшие почти одновременно, склеивает, на RetryAfter ждёт сколько
+    сказал Telegram.
+    """
+
+    def __init__(self, send, per_minute=20, min_interval=1.0, batch_seconds=2.0, max_retries=5, maxsize=1000):
+        self._send = send  # async send(text)
+        self.per_minute = per_minute
+        self.min_interval = min_interval
+        self.batch_seconds = batch_seconds
+        self.max_retries = max_retries
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._sent_at = deque()
+        self._task = None
+        self.sent = 0
+        self.failed = 0
+        self.retry_after_waits = 0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._worker(), name='telegram_queue')
+
+    async def stop(self, timeout=10):
+        """Пытается дослать очередь за timeout секунд, затем останавливает задачу."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Очередь Telegram не успела опустеть: осталось {self._queue.qsize()} сообщений")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def put(self, text):
+        """Не ждёт отправки: режет текст и кладёт куски в очередь."""
+        for chunk in split_message(text):
+            try:
+                self._queue.put_nowait(chunk)
+            except asyncio.QueueFull:
+                self.failed += 1
+                logger.error("Очередь Telegram переполнена — сообщение отброшено")
+
+    # ---------- внутреннее ----------
+    async def _worker(self):
+        while True:
+            chunk = await self._queue.get()
+            taken = 1
+            try:
+                chunk, extra = await self._batch(chunk)
+                taken += extra
+                await self._deliver(chunk)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка отправки из очереди Telegram: {e}")
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+
+    async def _batch(self, chunk):
+        """Подбирает сообщения, пришедшие за batch_seconds, пока склейка влезает в лимит."""
+        extra = 0
+        if not self.batch_seconds:
+            return chunk, extra
+        deadline = time.monotonic() + self.batch_seconds
+        while True:
+            try:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 and self._queue.empty():
+                    break
+                following = self._queue.get_nowait() if not self._queue.empty() else \
+                    await asyncio.wait_for(self._queue.get(), timeout)
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            extra += 1
+            merged = f"{chunk}\n\n{following}"
+            if len(merged) > TELEGRAM_MAX_LENGTH:
+                # Не влезает — отправляем накопленное и начинаем новую склейку со следующего
+                await self._deliver(chunk)
+                chunk = following
+                deadline = time.monotonic() + self.batch_seconds
+            else:
+                chunk = merged
+        return chunk, extra
+
+    async def _wait_for_slot(self):
+        now = time.monotonic()
+        while self._sent_at and now - self._sent_at[0] > 60:
+            self._sent_at.popleft()
+        delay = 0.0
+        if self._sent_at:
+            delay = max(delay, self._sent_at[-1] + self.min_interval - now)
+        if self.per_minute and len(self._sent_at) >= self.per_minute:
+            delay = max(delay, self._sent_at[0] + 60 - now)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _deliver(self, chunk):
+        # telegram тянет весь пакет с моделями Bot API — импорт при первой отправке, а не при старте
+        from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+        for attempt in range(self.max_retries):
+            await self._wait_for_slot()
+            try:
+                await self._send(chunk)
+                self._sent_at.append(time.monotonic())
+                self.sent += 1
+                return True
+            except RetryAfter as e:
+                wait = _retry_after_seconds(e) + 1
+                self.retry_after_waits += 1
+                logger.warning(f"Telegram RetryAfter: ждём {wait:.0f} сек (попытка {attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(wait)
+            except (BadRequest, Forbidden) as e:
+                # Постоянные ошибки (разметка, длина, бот удалён из канала): повтор не поможет, а очередь ждёт.
+                # BadRequest — подкласс NetworkError, поэтому ловим его раньше ветки с повторами
+                self.failed += 1
+                logger.error(f"Telegram отклонил сообщение ({type(e).__name__}: {e}) — пропускаем без повторов")
+                return False
+            except (TimedOut, NetworkError) as e:
+                wait = min(60, 2 ** attempt)
+                logger.warning(f"Сетевая ошибка Telegram: {e}, повтор через {wait} сек")
+                await asyncio.sleep(wait)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"НЕ УДАЛОСЬ отправить сообщение в Telegram: {e}")
+                return False
+        self.failed += 1
+        logger.error(f"НЕ УДАЛОСЬ отправить сообщение в Telegram после {self.max_retries} попыток")
+        return False
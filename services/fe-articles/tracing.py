@@ -0,0 +1,223 @@
+# tracing.py — спаны этапов парсинга в JSON Lines и профилирование выбранного ресурса
+
+import contextvars
+import cProfile
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from logging.handlers import TimedRotatingFileHandler
+
+logger = logging.getLogger('fe_articles.tracing')
+trace_logger = logging.getLogger('fe_articles.trace')
+trace_logger.propagate = False  # Спаны только в свой файл, не в parser.log
+
+_cycle_id = contextvars.ContextVar('trace_cycle_id', default=None)
+_resource = contextvars.ContextVar('trace_resource', default=None)
+_parent = contextvars.ContextVar('trace_parent', default=None)
+_span_ids = itertools.count(1)
+
+_process_attrs = {}  # Добавляются в каждую запись (в воркерах обхода — номер воркера)
+_enabled = False
+_profile_resource = None
+_profile_engine = 'cprofile'
+_profile_dir = 'logs'
+
+
+def setup(path='logs/trace.jsonl', enabled=True, profile_resource=None, profile_engine='cprofile', backup_count=7):
+    """Включает запись спанов в path (ротация в полночь) и профилирование ресурса profile_resource."""
+    global _enabled, _profile_resource, _profile_engine, _profile_dir
+    _enabled = enabled
+    _profile_resource = profile_resource or None
+    _profile_engine = profile_engine
+    _profile_dir = os.path.dirname(path) or '.'
+    if enabled and not trace_logger.handlers:
+        os.makedirs(_profile_dir, exist_ok=True)
+        handler = TimedRotatingFileHandler(filename=path, when='midnight', interval=1,
+                                           backupCount=backup_count, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        trace_logger.addHandler(handler)
+        trace_logger.setLevel(logging.INFO)
+
+
+def new_cycle_id():
+    return uuid.uuid4().hex[:8]
+
+
+def current_cycle():
+    return _cycle_id.get()
+
+
+def set_process(**attrs):
+    """Метки процесса: id спанов уникальны только внутри процесса, с меткой — во всём файле."""
+    _process_attrs.update(attrs)
+
+
+@contextmanager
+def join_cycle(cycle_id):
+    """Продолжить цикл, начатый в другом процессе: спаны получают его id, новый спан cycle не пишется."""
+    token = _cycle_id.set(cycle_id)
+    try:
+        yield
+    finally:
+        _cycle_id.reset(token)
+
+
+@contextmanager
+def cycle(kind, cycle_id=None, **attrs):
+    """Всё, что запущено внутри (включая задачи asyncio и to_thread), получает один cycle id."""
+    token = _cycle_id.set(cycle_id or new_cycle_id())
+    try:
+        with span('cycle', kind=kind, **attrs):
+            yield _cycle_id.get()
+    finally:
+        _cycle_id.reset(token)
+
+
+@contextmanager
+def resource(name):
+    token = _resource.set(name)
+    try:
+        yield
+    finally:
+        _resource.reset(token)
+
+
+class Span:
+    """Интервал этапа; пишется одной JSON-строкой при end(). Вложенность — через parent."""
+
+    __slots__ = ('name', 'attrs', 'span_id', 'parent_id', 'started', 'wall', '_token')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(_span_ids)
+        self.parent_id = _parent.get()
+        self.started = time.perf_counter()
+        self.wall = time.time()
+        self._token = _parent.set(self.span_id)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, error=None):
+        if self._token is None:
+            return
+        try:
+            _parent.reset(self._token)
+        except ValueError:
+            _parent.set(self.parent_id)  # Закрыт в другом контексте
+        self._token = None
+        if error is not None:
+            self.attrs['error'] = f"{type(error).__name__}: {error}"
+        emit(self.name, time.perf_counter() - self.started, self.wall, self.span_id, self.parent_id, self.attrs)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def end(self, error=None):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def start_span(name, **attrs):
+    """Спан с ручным end() — когда этап не ложится в один блок with."""
+    return Span(name, attrs) if _enabled else _NOOP
+
+
+@contextmanager
+def span(name, **attrs):
+    sp = start_span(name, **attrs)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.end(error=e)
+        raise
+    else:
+        sp.end()
+
+
+def record(name, seconds, **attrs):
+    """Готовая длительность (например, замеренная внутри экстрактора) как дочерний спан текущего."""
+    if _enabled:
+        emit(name, seconds, time.time() - seconds, next(_span_ids), _parent.get(), attrs)
+
+
+def emit(name, seconds, wall, span_id, parent_id, attrs):
+    entry = {
+        'ts': round(wall, 3),
+        'cycle': _cycle_id.get(),
+        'resource': _resource.get(),
+        'span': name,
+        'ms': round(seconds * 1000, 2),
+        'id': span_id,
+        'parent': parent_id,
+    }
+    if _process_attrs:
+        entry.update(_process_attrs)
+    if attrs:
+        entry.update(attrs)
+    trace_logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+# ====================== ПРОФИЛИРОВАНИЕ ======================
+def _profile_path(name, suffix):
+    safe = re.sub(r'[^\w.-]+', '_', name)[:60] or 'resource'
+    return os.path.join(_profile_dir, f"profile-{safe}{suffix}")
+
+
+@contextmanager
+def maybe_profile(name):
+    """
+    Профилирует блок, если name — выбранный ресурс. Профиль снимается со всего потока event loop:
+    пока ресурс ждёт сеть, в него попадают и другие задачи, поэтому точнее всего при CRAWL_CONCURRENCY=1
+    или через «Парсить сейчас». cProfile пишет .prof (для snakeviz/pstats) и топ-30 в .txt,
+    pyinstrument (если установлен) — .html.
+    """
+    if not _profile_resource or name != _profile_resource:
+        yield
+        return
+
+    if _profile_engine == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("pyinstrument не установлен — профилируем через cProfile")
+        else:
+            profiler = Profiler(async_mode='enabled')
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                path = _profile_path(name, '.html')
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(profiler.output_html())
+                logger.info(f"Профиль {name} сохранён: {path}")
+            return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path = _profile_path(name, '.prof')
+        profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(30)
+        with open(_profile_path(name, '.txt'), 'w', encoding='utf-8') as f:
+            f.write(out.getvalue())
+        logger.info(f"Профиль {name} сохранён: {path}")